@@ -5,5 +5,6 @@ from .predict import FastSAMPredictor
 from .prompt import FastSAMPrompt
 # from .val import FastSAMValidator
 from .decoder import FastSAMDecoder
+from .registry import ModelRegistry
 
-__all__ = 'FastSAMPredictor', 'FastSAM', 'FastSAMPrompt', 'FastSAMDecoder'
+__all__ = 'FastSAMPredictor', 'FastSAM', 'FastSAMPrompt', 'FastSAMDecoder', 'ModelRegistry'
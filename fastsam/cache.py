@@ -0,0 +1,282 @@
+"""
+Content-addressed cache of inference results.
+
+Results are keyed by a hash of the image content plus the model and the inference arguments that change the output,
+so re-submitting the same image (under any file name) with the same settings skips the forward pass entirely. Prompts
+in `FastSAMPrompt` only post-process `Results.masks`, so every later point/box/text prompt on a cached image is cheap.
+
+Usage:
+    from fastsam import FastSAM
+    from fastsam.cache import ResultCache
+
+    model = FastSAM('FastSAM-x.pt')
+    model.result_cache = ResultCache(max_bytes=2 * 1024 ** 3)
+    results = model('image.tif', imgsz=1024, conf=0.4, iou=0.9)  # runs the network
+    results = model('copy_of_image.tif', imgsz=1024, conf=0.4, iou=0.9)  # served from the cache
+
+Usage - Reuse tiles across tiled raster jobs:
+    from fastsam.cache import TileCache
+
+    model.tile_cache = TileCache('~/.cache/fastsam/tiles', max_bytes=10 * 1024 ** 3)
+    result = model.predict_tiled('orthomosaic.tif', conf=0.4, iou=0.9)  # later runs only predict new tiles
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+from ultralytics.yolo.utils import LOGGER
+
+# Inference arguments that change the predicted masks and therefore belong in the cache key.
+RESULT_ARGS = ('imgsz', 'conf', 'iou', 'retina_masks', 'max_det', 'agnostic_nms', 'classes', 'augment', 'half', 'device')
+
+
+def _file_digest(path, chunk_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _array_digest(array):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str((array.shape, array.dtype.str)).encode())
+    h.update(np.ascontiguousarray(array).data)
+    return h.hexdigest()
+
+
+def results_nbytes(results):
+    """Approximate the memory held by a list of Results: original images, masks and boxes."""
+    total = 0
+    for r in results:
+        for x in (r.orig_img, r.masks, r.boxes):
+            if hasattr(x, 'nbytes') and not isinstance(x, np.ndarray):  # e.g. LazyMasks, without materializing
+                total += x.nbytes
+                continue
+            data = x if isinstance(x, np.ndarray) else getattr(x, 'data', x)  # ndarray.data is a memoryview
+            if isinstance(data, torch.Tensor):
+                total += data.numel() * data.element_size()
+            elif isinstance(data, np.ndarray):
+                total += data.nbytes
+    return total
+
+
+class ResultCache:
+    """
+    Thread-safe in-memory LRU cache of `Results` lists, bounded by total size in bytes.
+
+    Cached Results are shared between callers and must be treated as read-only.
+
+    Args:
+        max_bytes (int): Upper bound for the summed size of all cached results, see `results_nbytes`.
+    """
+
+    def __init__(self, max_bytes=2 * 1024 ** 3):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # key -> (results, nbytes), most recently used last
+        self._digests = {}  # (path, size, mtime) -> content digest, avoids re-hashing unchanged files
+        self._lock = threading.Lock()
+
+    def image_digest(self, source):
+        """Return a content hash for a single-image source, or None if the source cannot be cached (streams, dirs)."""
+        if isinstance(source, (str, Path)) and os.path.isfile(source):
+            st = os.stat(source)
+            stamp = (os.path.abspath(source), st.st_size, st.st_mtime_ns)
+            with self._lock:
+                digest = self._digests.get(stamp)
+            if digest is None:
+                digest = _file_digest(source)  # hashed outside the lock, other threads keep using the cache
+                with self._lock:
+                    if len(self._digests) > 4096:
+                        self._digests.clear()
+                    self._digests[stamp] = digest
+            return digest
+        if isinstance(source, Image.Image):
+            source = np.asarray(source)
+        if isinstance(source, np.ndarray):
+            return _array_digest(source)
+        if isinstance(source, torch.Tensor):
+            return _array_digest(source.detach().cpu().numpy())
+        return None
+
+    def key(self, source, model, args):
+        """
+        Build the cache key for `source` predicted by `model` with inference arguments `args`.
+
+        Args:
+            source: Image path, PIL image, numpy array or tensor.
+            model (str): Identifier of the weights, e.g. the checkpoint path.
+            args (dict): Inference arguments; only RESULT_ARGS are used.
+
+        Returns:
+            (str | None): The key, or None if `source` is not cacheable.
+        """
+        digest = self.image_digest(source)
+        if digest is None:
+            return None
+        params = repr([(k, str(args.get(k))) for k in RESULT_ARGS])
+        return hashlib.blake2b(f'{digest}|{model}|{params}'.encode(), digest_size=16).hexdigest()
+
+    def get(self, key):
+        """Return the cached results for `key`, or None."""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, results):
+        """Store `results` under `key`, evicting least recently used entries to stay within `max_bytes`."""
+        nbytes = results_nbytes(results)
+        if nbytes > self.max_bytes:
+            LOGGER.warning(f'WARNING ⚠️ ResultCache: results of {nbytes / 1E6:.1f} MB exceed the cache size, not cached.')
+            return
+        with self._lock:
+            if key in self._items:
+                self.nbytes -= self._items.pop(key)[1]
+            self._items[key] = (results, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, n) = self._items.popitem(last=False)
+                self.nbytes -= n
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+
+def _rle_encode(mask):
+    """Run lengths of a flattened bool mask, starting with a (possibly empty) run of zeros."""
+    flat = mask.ravel()
+    if not flat.size:
+        return np.zeros(0, dtype=np.uint32)
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate([[0], change, [flat.size]]))
+    return np.concatenate([[0], counts] if flat[0] else [counts]).astype(np.uint32)
+
+
+def _rle_decode(counts, shape):
+    return np.repeat(np.arange(len(counts)) % 2 == 1, counts).reshape(shape)
+
+
+class TileCache:
+    """
+    On-disk LRU cache of per-tile results for tiled raster jobs, bounded by total size in bytes.
+
+    Tiles are keyed by a hash of their pixels plus the model and the inference arguments, so re-runs, previews and
+    overlapping extents that produce the same tile reuse its result whatever raster it came from. Each entry holds a
+    tile's masks as run-length encoded crops with their boxes, scores and classes (see `fastsam.tiling`), in one
+    `.npz` file. Files are written atomically, so several processes may share a directory; the size limit is
+    enforced on the entries this process knows about, and recency is tracked through file modification times.
+
+    Args:
+        root (str | Path): Cache directory, created if missing.
+        max_bytes (int): Upper bound for the summed size of the cache files.
+    """
+
+    def __init__(self, root, max_bytes=10 * 1024 ** 3):
+        self.root = Path(root).expanduser()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        files = sorted(((p.stat().st_mtime_ns, p) for p in self.root.glob('*/*.npz')), key=lambda x: x[0])
+        self._items = OrderedDict((p.stem, p.stat().st_size) for _, p in files)  # key -> bytes, most recent last
+        self.nbytes = sum(self._items.values())
+
+    def key(self, image, model, args):
+        """
+        Build the cache key of a tile.
+
+        Args:
+            image (np.ndarray): The tile pixels as fed to the model.
+            model (str): Identifier of the weights, e.g. the checkpoint path.
+            args (dict): Inference arguments; only RESULT_ARGS are used.
+        """
+        params = repr([(k, str(args.get(k))) for k in RESULT_ARGS])
+        return hashlib.blake2b(f'{_array_digest(image)}|{model}|{params}'.encode(), digest_size=16).hexdigest()
+
+    def _path(self, key):
+        return self.root / key[:2] / f'{key}.npz'
+
+    def get(self, key):
+        """Return the cached tile `(packed, rois, boxes)` for `key`, or None."""
+        path = self._path(key)
+        try:
+            with np.load(path) as f:
+                rois, boxes, counts, lengths = f['rois'].astype(np.int64), f['boxes'], f['counts'], f['lengths']
+            os.utime(path)  # recency for other processes sharing the directory
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        packed, start = [], 0
+        for (x1, y1, x2, y2), n in zip(rois, lengths):
+            packed.append(np.packbits(_rle_decode(counts[start:start + n], (y2 - y1, x2 - x1))))
+            start += n
+        with self._lock:
+            self.hits += 1
+            if key not in self._items:
+                self._items[key] = path.stat().st_size
+                self.nbytes += self._items[key]
+            self._items.move_to_end(key)
+        return packed, rois, boxes
+
+    def put(self, key, tile):
+        """Store the tile `(packed, rois, boxes)` under `key`, evicting the least recently used entries."""
+        packed, rois, boxes = tile
+        rois = np.asarray(rois, dtype=np.int64).reshape(-1, 4)
+        runs = [_rle_encode(np.unpackbits(p, count=(y2 - y1) * (x2 - x1)).view(bool))
+                for p, (x1, y1, x2, y2) in zip(packed, rois)]
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp = path.with_name(f'{key}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp, 'wb') as f:
+            np.savez(f,
+                     rois=rois.astype(np.int32),
+                     boxes=np.asarray(boxes, dtype=np.float32).reshape(-1, 6),
+                     counts=np.concatenate(runs) if runs else np.zeros(0, dtype=np.uint32),
+                     lengths=np.array([len(r) for r in runs], dtype=np.int64))
+        os.replace(tmp, path)
+        nbytes = path.stat().st_size
+        with self._lock:
+            self.nbytes += nbytes - self._items.pop(key, 0)
+            self._items[key] = nbytes
+            while self.nbytes > self.max_bytes and len(self._items) > 1:
+                old, n = self._items.popitem(last=False)
+                self.nbytes -= n
+                self._path(old).unlink(missing_ok=True)
+
+    def clear(self):
+        with self._lock:
+            for key in self._items:
+                self._path(key).unlink(missing_ok=True)
+            self._items.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
@@ -0,0 +1,111 @@
+"""
+Cloud-Optimized GeoTIFF writer for mask and label rasters.
+
+Rasters are written block by block into a tiled scratch GeoTIFF next to the output, overviews are built on it with a
+categorical resampling (labels are ids, averaging them would invent instances), and GDAL's COG driver then lays the
+file out with the overviews and tile index up front. Viewers can fetch only the tiles and zoom levels in view with
+HTTP range requests, and the full-size raster is never held in memory.
+
+Usage:
+    from fastsam.cog import to_cog, write_cog
+
+    write_cog('labels.tif', (h, w), lambda window: paint(window), transform=src.transform, crs=src.crs)
+    to_cog('./output/everything_segmentation1.tif')  # rewrite an existing raster in place
+"""
+
+import os
+
+import numpy as np
+import rasterio
+import rasterio.shutil
+from rasterio.enums import Resampling
+from rasterio.windows import Window
+
+BLOCK_SIZE = 512
+COG_OPTIONS = dict(compress='deflate', predictor='YES', level=6)  # horizontal differencing turns label runs into zeros
+
+
+def write_cog(path,
+              shape,
+              blocks,
+              transform=None,
+              crs=None,
+              dtype='uint16',
+              nodata=0,
+              block_size=2048,
+              resampling='mode',
+              **options):
+    """
+    Write a single-band COG whose pixels are produced window by window.
+
+    Args:
+        path (str): Output file.
+        shape (tuple): Raster size (height, width).
+        blocks (callable): `blocks(window) -> np.ndarray` returning the (window.height, window.width) pixels.
+        transform (affine.Affine, optional): Pixel to CRS transform.
+        crs (rasterio.crs.CRS, optional): Raster CRS.
+        dtype (str): Pixel type, e.g. 'uint8' for masks or 'uint16'/'uint32' for label maps.
+        nodata (int, optional): Nodata value, 0 (background) by default.
+        block_size (int): Height and width of the windows requested from `blocks`; a multiple of the 512 px tiles.
+        resampling (str): Overview resampling, 'mode' or 'nearest' (both keep valid ids).
+        **options: Overrides of the COG creation options (compress, predictor, level, ...).
+
+    Returns:
+        (str): `path`.
+    """
+    h, w = shape
+    tmp = f'{path}.tmp.tif'
+    profile = dict(driver='GTiff', height=h, width=w, count=1, dtype=dtype, nodata=nodata, crs=crs,
+                   transform=transform, tiled=True, blockxsize=BLOCK_SIZE, blockysize=BLOCK_SIZE, compress='deflate',
+                   predictor=2, BIGTIFF='IF_SAFER')
+    try:
+        with rasterio.open(tmp, 'w', **profile) as dst:
+            for row in range(0, h, block_size):
+                for col in range(0, w, block_size):
+                    window = Window(col, row, min(block_size, w - col), min(block_size, h - row))
+                    dst.write(np.asarray(blocks(window), dtype=dtype), 1, window=window)
+        _finish(tmp, path, resampling, options)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+def to_cog(src, dst=None, resampling='mode', **options):
+    """
+    Rewrite a raster (e.g. a mask GeoTIFF written by SamGeo) as a COG, streaming through GDAL.
+
+    Args:
+        src (str): Input raster.
+        dst (str, optional): Output file, defaults to replacing `src`.
+        resampling (str): Overview resampling, 'mode' or 'nearest'.
+        **options: Overrides of the COG creation options.
+
+    Returns:
+        (str): The output path.
+    """
+    dst = dst or src
+    tmp, out = f'{dst}.tmp.tif', f'{dst}.cog.tif'
+    try:
+        rasterio.shutil.copy(src, tmp, driver='GTiff', tiled=True, blockxsize=BLOCK_SIZE, blockysize=BLOCK_SIZE,
+                             compress='deflate', BIGTIFF='IF_SAFER')
+        _finish(tmp, out, resampling, options)
+        os.replace(out, dst)  # readers never see a half-written file, even when rewriting in place
+    finally:
+        for path in (tmp, out):
+            if os.path.exists(path):
+                os.remove(path)
+    return dst
+
+
+def _finish(tmp, path, resampling, options):
+    """Build overviews on the tiled scratch file and copy it into COG layout at `path`."""
+    with rasterio.open(tmp, 'r+') as ds:
+        factors, size = [], max(ds.width, ds.height)
+        while size > BLOCK_SIZE:
+            factors.append(2 ** (len(factors) + 1))
+            size //= 2
+        if factors:
+            ds.build_overviews(factors, Resampling[resampling])
+    rasterio.shutil.copy(tmp, path, driver='COG', blocksize=BLOCK_SIZE, overviews='FORCE_USE_EXISTING',
+                         BIGTIFF='IF_SAFER', **{**COG_OPTIONS, **options})
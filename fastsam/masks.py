@@ -0,0 +1,671 @@
+"""
+Alternative containers for FastSAM masks.
+
+`LazyMasks` keeps the mask coefficients, prototypes and boxes produced by the segmentation head instead of dense
+full-resolution masks. Prompt queries (point membership, box IoU, areas) are answered from the prototypes, and
+full-resolution masks are only built for the indices a prompt actually selects.
+
+`CompactMasks` stores finished masks bit-packed inside their bounding boxes and answers the same queries exactly.
+
+`LabelMap` flattens everything-mode output into one instance-id raster with a side table of per-instance attributes.
+
+`BoxIndex` holds a summed-area table per mask so that box prompts cost O(n) lookups regardless of box size.
+
+`contained_masks` finds masks that are mostly covered by a larger one (the duplicate filter of `filter_masks`).
+"""
+
+from multiprocessing.pool import ThreadPool
+
+import cv2
+import numpy as np
+import torch
+
+from ultralytics.yolo.engine.results import Masks
+from ultralytics.yolo.utils import NUM_THREADS, ops
+
+
+class LazyMasks(Masks):
+    """
+    Drop-in replacement for `Masks` (retina resolution) that materializes masks on demand.
+
+    Args:
+        protos (torch.Tensor): Mask prototypes of one image, shape (c, mh, mw).
+        coeffs (torch.Tensor): Mask coefficients, shape (n, c).
+        boxes (torch.Tensor): Boxes in original image pixels (xyxy), shape (n, 4).
+        orig_shape (tuple): Original image size (h, w).
+
+    Attributes:
+        data (torch.Tensor): All masks at full resolution, materialized (and kept) on first access.
+    """
+
+    def __init__(self, protos, coeffs, boxes, orig_shape) -> None:
+        self.protos = protos
+        self.coeffs = coeffs
+        self.boxes = boxes
+        self.orig_shape = tuple(orig_shape)
+        self._data = None
+        self._low_res = None
+        self._xy = None
+
+    @property
+    def data(self):
+        """Return all masks at full resolution (n, h, w); prefer `materialize` for a subset."""
+        if self._data is None:
+            self._data = self.materialize()
+        return self._data
+
+    @property
+    def shape(self):
+        return (len(self), *self.orig_shape)
+
+    @property
+    def nbytes(self):
+        """Bytes held by this container (excluding the shared prototypes' owner)."""
+        tensors = [self.protos, self.coeffs, self.boxes, self._data, self._low_res]
+        return sum(t.numel() * t.element_size() for t in tensors if t is not None)
+
+    def __len__(self):
+        return len(self.coeffs)
+
+    def __getitem__(self, idx):
+        return LazyMasks(self.protos, self.coeffs[idx], self.boxes[idx], self.orig_shape)
+
+    def cpu(self):
+        return self.to('cpu')
+
+    def cuda(self):
+        return self.to('cuda')
+
+    def to(self, *args, **kwargs):
+        return LazyMasks(self.protos.to(*args, **kwargs), self.coeffs.to(*args, **kwargs),
+                         self.boxes.to(*args, **kwargs), self.orig_shape)
+
+    def numpy(self):
+        return Masks(self.data.cpu().numpy(), self.orig_shape)
+
+    def materialize(self, idx=None):
+        """
+        Build full-resolution binary masks.
+
+        Args:
+            idx (int | list | torch.Tensor, optional): Indices of the masks to build. Defaults to all masks.
+
+        Returns:
+            (torch.Tensor): Float masks of shape (k, h, w) with values 0/1, as in `Masks.data`.
+        """
+        if idx is None:
+            coeffs, boxes = self.coeffs, self.boxes
+        else:
+            idx = torch.as_tensor(idx, dtype=torch.long, device=self.coeffs.device).view(-1)
+            coeffs, boxes = self.coeffs[idx], self.boxes[idx]
+        if not len(coeffs):
+            return torch.zeros((0, *self.orig_shape), device=self.coeffs.device)
+        return ops.process_mask_native(self.protos, coeffs, boxes, self.orig_shape)
+
+    def compact(self, idx=None):
+        """Build masks `idx` (default all) straight into a `CompactMasks`, never allocating full-size arrays."""
+        coeffs, boxes = self.coeffs, self.boxes
+        if idx is not None:
+            idx = torch.as_tensor(idx, dtype=torch.long, device=self.coeffs.device).view(-1)
+            coeffs, boxes = coeffs[idx], boxes[idx]
+        crops, rois = ops.process_mask_roi(self.protos, coeffs, boxes, self.orig_shape)
+        return CompactMasks.from_crops(crops, rois, self.orig_shape)
+
+    def _crop_window(self):
+        """The (top, left, bottom, right) region of the prototype grid that maps onto the original image."""
+        _, mh, mw = self.protos.shape
+        h, w = self.orig_shape
+        gain = min(mh / h, mw / w)
+        pad = (mw - w * gain) / 2, (mh - h * gain) / 2
+        return int(pad[1]), int(pad[0]), int(mh - pad[1]), int(mw - pad[0])
+
+    def low_res(self):
+        """Binary masks at prototype resolution (n, ph, pw), cropped to their boxes. Cached."""
+        if self._low_res is None:
+            c, mh, mw = self.protos.shape
+            top, left, bottom, right = self._crop_window()
+            masks = (self.coeffs @ self.protos.float().view(c, -1)).view(-1, mh, mw)[:, top:bottom, left:right]
+            ph, pw = masks.shape[1:]
+            h, w = self.orig_shape
+            boxes = self.boxes.clone().float()
+            boxes[:, [0, 2]] *= pw / w
+            boxes[:, [1, 3]] *= ph / h
+            self._low_res = ops.crop_mask(masks, boxes).gt_(0).bool()
+        return self._low_res
+
+    def areas(self):
+        """Approximate mask areas in original image pixels, estimated at prototype resolution."""
+        low = self.low_res()
+        ph, pw = low.shape[1:]
+        h, w = self.orig_shape
+        return low.sum((1, 2)).float() * (h * w) / (ph * pw)
+
+    def contains(self, points):
+        """
+        Exact point membership without building full-resolution masks.
+
+        The mask logits are bilinearly sampled from the prototypes at each point, which is what
+        `ops.process_mask_native` computes for that pixel after upsampling.
+
+        Args:
+            points (array-like): (k, 2) pixel coordinates (x, y) in the original image.
+
+        Returns:
+            (torch.Tensor): Boolean tensor of shape (n, k), True where point j lies inside mask i.
+        """
+        device = self.coeffs.device
+        pts = torch.as_tensor(points, dtype=torch.float32, device=device).view(-1, 2)
+        c, mh, mw = self.protos.shape
+        top, left, bottom, right = self._crop_window()
+        protos = self.protos.float()[:, top:bottom, left:right]
+        ph, pw = protos.shape[1:]
+        h, w = self.orig_shape
+        px, py = pts[:, 0].floor(), pts[:, 1].floor()  # pixel indices, as in the dense mask lookup mask[y, x]
+        # source coordinates of F.interpolate(mode='bilinear', align_corners=False)
+        sx = ((px + 0.5) * pw / w - 0.5).clamp(min=0)
+        sy = ((py + 0.5) * ph / h - 0.5).clamp(min=0)
+        x0, y0 = sx.floor().long().clamp(max=pw - 1), sy.floor().long().clamp(max=ph - 1)
+        x1, y1 = (x0 + 1).clamp(max=pw - 1), (y0 + 1).clamp(max=ph - 1)
+        wx, wy = sx - x0, sy - y0
+        values = (protos[:, y0, x0] * (1 - wx) * (1 - wy) + protos[:, y0, x1] * wx * (1 - wy) +
+                  protos[:, y1, x0] * (1 - wx) * wy + protos[:, y1, x1] * wx * wy)  # (c, k)
+        logits = self.coeffs.float() @ values  # (n, k)
+        b = self.boxes[:, :, None].float()
+        inside = (px >= b[:, 0]) & (px < b[:, 2]) & (py >= b[:, 1]) & (py < b[:, 3])
+        return (logits > 0) & inside
+
+    def box_iou(self, bbox):
+        """
+        Approximate IoU between a box (xyxy, original pixels) and every mask, computed at prototype resolution.
+
+        Returns:
+            (torch.Tensor): IoU per mask, shape (n,).
+        """
+        low = self.low_res()
+        ph, pw = low.shape[1:]
+        h, w = self.orig_shape
+        x1, x2 = int(round(bbox[0] * pw / w)), int(round(bbox[2] * pw / w))
+        y1, y2 = int(round(bbox[1] * ph / h)), int(round(bbox[3] * ph / h))
+        inter = low[:, max(y1, 0):y2, max(x1, 0):x2].sum((1, 2)).float()
+        area = low.sum((1, 2)).float()
+        box_area = max(x2 - x1, 0) * max(y2 - y1, 0)
+        return inter / (box_area + area - inter).clamp(min=1)
+
+    @property
+    def xy(self):
+        """Return segments (pixels), traced on bounding-box crops without materializing full-size masks."""
+        if self._xy is None:
+            self._xy = self.compact().xy
+        return self._xy
+
+
+class CompactMasks(Masks):
+    """
+    Bit-packed mask container: every mask is stored as its tight bounding-box crop, packed 8 pixels per byte.
+
+    A 5000x5000 image with 200 small masks takes kilobytes to megabytes instead of gigabytes of float. Areas, boxes,
+    pixel lookups and IoUs are computed from the packed crops; full-size arrays are only decoded on request.
+
+    Args:
+        packed (List[np.ndarray]): np.packbits of each crop, flattened in C order.
+        rois (np.ndarray): (n, 4) int windows (x1, y1, x2, y2) of the crops in image pixels, x2/y2 exclusive.
+        orig_shape (tuple): Original image size (h, w).
+    """
+
+    def __init__(self, packed, rois, orig_shape) -> None:
+        self.packed = list(packed)
+        self.rois = np.asarray(rois, dtype=np.int64).reshape(-1, 4)
+        self.orig_shape = tuple(orig_shape)
+        self._areas = None
+        self._xy = None
+        self._flat = None  # all packed crops in one buffer plus their byte offsets, for vectorized pixel lookups
+
+    @classmethod
+    def from_crops(cls, crops, rois, orig_shape):
+        """Build from `ops.process_mask_roi` output, shrinking every window to the mask's tight bounds."""
+        rois = torch.as_tensor(rois).cpu().numpy().reshape(-1, 4)
+        packed, tight = [], []
+        for crop, (x1, y1, x2, y2) in zip(crops, rois):
+            crop = crop.cpu().numpy() if isinstance(crop, torch.Tensor) else np.asarray(crop)
+            crop = crop.astype(bool)
+            ys, xs = np.nonzero(crop.any(1))[0], np.nonzero(crop.any(0))[0]
+            if not len(ys):
+                packed.append(np.zeros(0, dtype=np.uint8))
+                tight.append((x1, y1, x1, y1))
+                continue
+            crop = crop[ys[0]:ys[-1] + 1, xs[0]:xs[-1] + 1]
+            packed.append(np.packbits(crop))
+            tight.append((x1 + xs[0], y1 + ys[0], x1 + xs[-1] + 1, y1 + ys[-1] + 1))
+        return cls(packed, tight, orig_shape)
+
+    @classmethod
+    def from_dense(cls, masks, orig_shape=None):
+        """Build from a dense (n, h, w) mask tensor or array."""
+        masks = masks.cpu().numpy() if isinstance(masks, torch.Tensor) else np.asarray(masks)
+        masks = masks.astype(bool)
+        h, w = masks.shape[1:]
+        return cls.from_crops(list(masks), np.tile([0, 0, w, h], (len(masks), 1)), orig_shape or (h, w))
+
+    @property
+    def data(self):
+        """Return all masks decoded to a dense float tensor (n, h, w), as `Masks.data` does."""
+        return self.materialize()
+
+    @property
+    def shape(self):
+        return (len(self), *self.orig_shape)
+
+    @property
+    def nbytes(self):
+        return sum(p.nbytes for p in self.packed) + self.rois.nbytes
+
+    @property
+    def bboxes(self):
+        """Tight (x1, y1, x2, y2) boxes of the masks, x2/y2 exclusive; zeros-width for empty masks."""
+        return self.rois.copy()
+
+    def __len__(self):
+        return len(self.packed)
+
+    def __getitem__(self, idx):
+        idx = np.arange(len(self))[idx].reshape(-1)
+        return CompactMasks([self.packed[i] for i in idx], self.rois[idx], self.orig_shape)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self
+
+    def to(self, *args, **kwargs):
+        return self
+
+    def crop(self, i):
+        """Decode mask `i` inside its bounding box, returns a bool array of shape (y2 - y1, x2 - x1)."""
+        x1, y1, x2, y2 = self.rois[i]
+        h, w = y2 - y1, x2 - x1
+        return np.unpackbits(self.packed[i], count=h * w).reshape(h, w).astype(bool)
+
+    def decode(self, idx=None):
+        """Decode the masks `idx` (default all) to a dense bool array (k, h, w)."""
+        idx = range(len(self)) if idx is None else np.asarray(idx, dtype=np.int64).reshape(-1)
+        out = np.zeros((len(idx), *self.orig_shape), dtype=bool)
+        for k, i in enumerate(idx):
+            x1, y1, x2, y2 = self.rois[i]
+            out[k, y1:y2, x1:x2] = self.crop(i)
+        return out
+
+    def materialize(self, idx=None):
+        """Decode masks `idx` (default all) to a float tensor with values 0/1, the `Masks.data` format."""
+        return torch.from_numpy(self.decode(idx)).float()
+
+    def areas(self):
+        """Exact mask areas in pixels, shape (n,)."""
+        if self._areas is None:
+            self._areas = np.array([int(np.unpackbits(p).sum()) for p in self.packed], dtype=np.int64)
+        return torch.from_numpy(self._areas)
+
+    def contains(self, points):
+        """
+        Args:
+            points (array-like): (k, 2) pixel coordinates (x, y).
+
+        Returns:
+            (torch.Tensor): Boolean tensor of shape (n, k), True where point j lies inside mask i.
+        """
+        pts = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        x, y = pts[:, 0], pts[:, 1]
+        r = self.rois
+        inside = (x >= r[:, :1]) & (x < r[:, 2:3]) & (y >= r[:, 1:2]) & (y < r[:, 3:4])  # (n, k)
+        i, j = np.nonzero(inside)
+        if len(i):
+            if self._flat is None:
+                sizes = [len(p) for p in self.packed]
+                self._flat = (np.concatenate(self.packed) if sum(sizes) else np.zeros(1, dtype=np.uint8),
+                              np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64))
+            flat, offsets = self._flat
+            bit = (y[j] - r[i, 1]) * (r[i, 2] - r[i, 0]) + (x[j] - r[i, 0])
+            inside[i, j] = (flat[offsets[i] + (bit >> 3)] >> (7 - (bit & 7))) & 1
+        return torch.from_numpy(inside)
+
+    def box_iou(self, bbox):
+        """Exact IoU between a box (xyxy pixels) and every mask, shape (n,)."""
+        bx1, by1, bx2, by2 = (int(round(v)) for v in bbox[:4])
+        r = self.rois
+        inter = np.zeros(len(self), dtype=np.float64)
+        overlap = (r[:, 0] < bx2) & (r[:, 2] > bx1) & (r[:, 1] < by2) & (r[:, 3] > by1)
+        for i in np.nonzero(overlap)[0]:
+            x1, y1 = r[i, :2]
+            inter[i] = self.crop(i)[max(by1 - y1, 0):max(by2 - y1, 0), max(bx1 - x1, 0):max(bx2 - x1, 0)].sum()
+        area = self.areas().numpy()
+        box_area = max(bx2 - bx1, 0) * max(by2 - by1, 0)
+        return torch.from_numpy(inter / np.maximum(box_area + area - inter, 1))
+
+    def intersection(self, i, j):
+        """Number of pixels shared by masks `i` and `j`."""
+        a, b = self.rois[i], self.rois[j]
+        x1, y1, x2, y2 = max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])
+        if x2 <= x1 or y2 <= y1:
+            return 0
+        ca = self.crop(i)[y1 - a[1]:y2 - a[1], x1 - a[0]:x2 - a[0]]
+        cb = self.crop(j)[y1 - b[1]:y2 - b[1], x1 - b[0]:x2 - b[0]]
+        return int((ca & cb).sum())
+
+    def iou(self, i, j):
+        """Mask IoU of masks `i` and `j`."""
+        inter = self.intersection(i, j)
+        area = self.areas()
+        return inter / max(int(area[i]) + int(area[j]) - inter, 1)
+
+    def to_rle(self, idx=None):
+        """Encode masks `idx` (default all) as uncompressed COCO RLEs, one mask decoded at a time."""
+        from ultralytics.vit.sam.amg import mask_to_rle_pytorch
+        idx = range(len(self)) if idx is None else np.asarray(idx, dtype=np.int64).reshape(-1)
+        return [mask_to_rle_pytorch(torch.from_numpy(self.decode([i])))[0] for i in idx]
+
+    @property
+    def xy(self):
+        """Return segments (pixels), traced on the crops instead of full-size masks, in a thread pool."""
+        if self._xy is None:
+            self._xy = self.segments_xy()
+        return self._xy
+
+    def segments_xy(self, strategy='largest', epsilon=0.0, holes=False, workers=NUM_THREADS):
+        """Trace the masks like `ops.masks2segments` (same options), on the crops."""
+        mode = cv2.RETR_CCOMP if holes else cv2.RETR_EXTERNAL
+
+        def trace(i):
+            x1, y1 = self.rois[i, :2]
+            return cv2.findContours(self.crop(i).view(np.uint8), mode, cv2.CHAIN_APPROX_SIMPLE,
+                                    offset=(int(x1), int(y1)))
+
+        with ThreadPool(max(1, min(workers, len(self)))) as pool:
+            traced = pool.map(trace, range(len(self)))
+        segments = []
+        for c, hierarchy in traced:
+            if epsilon > 0:
+                c = [cv2.approxPolyDP(x, epsilon, True) for x in c]
+            if holes:
+                segments.append(ops.rings_from_contours(c, hierarchy, strategy))
+            elif not c:
+                segments.append(np.zeros((0, 2), dtype='float32'))
+            elif strategy == 'concat':
+                segments.append(np.concatenate([x.reshape(-1, 2) for x in c]).astype('float32'))
+            else:
+                segments.append(np.array(c[np.array([len(x) for x in c]).argmax()]).reshape(-1, 2).astype('float32'))
+        return segments
+
+    @property
+    def xyn(self):
+        """Return segments (normalized)."""
+        h, w = self.orig_shape
+        return [s / np.array([w, h], dtype='float32') for s in self.xy]
+
+
+class LabelMap:
+    """
+    Single-raster instance representation of a set of (possibly overlapping) masks.
+
+    `labels[y, x]` holds the 1-based instance number visible at that pixel (0 is background). Overlaps are resolved
+    like `FastSAMPrompt.fast_show_mask`: smaller masks are painted on top of larger ones. Per-instance attributes are
+    kept in the `instances` table, a dict of numpy columns indexed by `instance number - 1`.
+
+    Args:
+        labels (np.ndarray): (h, w) uint16 or uint32 instance-id raster.
+        instances (dict): Columns 'index' (mask index in the source Results), 'area' (full mask area), 'visible_area',
+            'bbox' (n, 4 xyxy) and optionally 'score' and 'cls'.
+    """
+
+    def __init__(self, labels, instances):
+        self.labels = labels
+        self.instances = instances
+
+    @classmethod
+    def from_masks(cls, masks, scores=None, classes=None):
+        """
+        Build a label map from a dense (n, h, w) stack, `CompactMasks` or `LazyMasks`.
+
+        Args:
+            masks (torch.Tensor | np.ndarray | CompactMasks | LazyMasks): The masks to combine.
+            scores (array-like, optional): Per-mask confidence, stored in the side table.
+            classes (array-like, optional): Per-mask class, stored in the side table.
+        """
+        if isinstance(masks, LazyMasks):
+            masks = masks.compact()
+        elif not isinstance(masks, CompactMasks):
+            masks = CompactMasks.from_dense(masks.data if isinstance(masks, Masks) else masks)
+        n = len(masks)
+        labels = np.zeros(masks.orig_shape, dtype=np.uint16 if n < np.iinfo(np.uint16).max else np.uint32)
+        areas = masks.areas().numpy()
+        for i in np.argsort(-areas, kind='stable'):  # largest first, so smaller masks end up on top
+            x1, y1, x2, y2 = masks.rois[i]
+            labels[y1:y2, x1:x2][masks.crop(i)] = i + 1
+        instances = {
+            'index': np.arange(n),
+            'area': areas,
+            'visible_area': np.bincount(labels.ravel(), minlength=n + 1)[1:],
+            'bbox': masks.bboxes}
+        if scores is not None:
+            instances['score'] = _to_numpy(scores)
+        if classes is not None:
+            instances['cls'] = _to_numpy(classes)
+        return cls(labels, instances)
+
+    @classmethod
+    def from_results(cls, result):
+        """Build a label map from one `Results` object (its masks, confidences and classes)."""
+        boxes = result.boxes
+        return cls.from_masks(result.masks,
+                              scores=None if boxes is None else boxes.conf,
+                              classes=None if boxes is None else boxes.cls)
+
+    @property
+    def shape(self):
+        return self.labels.shape
+
+    @property
+    def nbytes(self):
+        return self.labels.nbytes + sum(v.nbytes for v in self.instances.values())
+
+    def __len__(self):
+        return len(self.instances['index'])
+
+    def lookup(self, points):
+        """Return the 1-based instance number at each (x, y) point (0 for background)."""
+        pts = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        return self.labels[pts[:, 1], pts[:, 0]]
+
+    def mask(self, label):
+        """Visible pixels of instance `label` (1-based) as a full-size bool array."""
+        return self.labels == label
+
+    def colorize(self, colors, alpha=0.6):
+        """
+        Render the label map as an RGBA float image with one lookup-table pass.
+
+        Args:
+            colors (np.ndarray): (n, 3) RGB colors in [0, 1] for instances 1..n.
+            alpha (float): Opacity of instance pixels; background is fully transparent.
+        """
+        lut = np.zeros((len(self) + 1, 4), dtype=np.float32)
+        lut[1:, :3] = colors
+        lut[1:, 3] = alpha
+        return lut[self.labels]
+
+    def boundaries(self):
+        """Bool (h, w) array marking pixels that have a 4-neighbour with a different label (instance outlines)."""
+        edges = np.zeros(self.labels.shape, dtype=bool)
+        diff_x = self.labels[:, 1:] != self.labels[:, :-1]
+        diff_y = self.labels[1:, :] != self.labels[:-1, :]
+        edges[:, :-1] |= diff_x
+        edges[:, 1:] |= diff_x
+        edges[:-1, :] |= diff_y
+        edges[1:, :] |= diff_y
+        return edges
+
+    def to_raster(self, path, transform=None, crs=None, **options):
+        """
+        Write the label raster as a single-band Cloud-Optimized GeoTIFF.
+
+        Args:
+            path (str): Output file.
+            transform (affine.Affine, optional): Pixel to CRS transform of the source image.
+            crs (rasterio.crs.CRS, optional): CRS of the source image.
+            **options: Overrides of the COG creation options, see `fastsam.cog.write_cog`.
+        """
+        from .cog import write_cog  # rasterio is only needed for geospatial output
+
+        return write_cog(path,
+                         self.shape,
+                         lambda window: self.labels[window.toslices()],
+                         transform=transform,
+                         crs=crs,
+                         dtype=self.labels.dtype.name,
+                         **options)
+
+
+class BoxIndex:
+    """
+    Summed-area tables of a set of masks, each restricted to the mask's bounding box.
+
+    The pixel count of any mask inside any box is four table lookups, so the IoU of m boxes against n masks is a
+    handful of (m, n) array operations whatever the box sizes. Tables take 4 bytes per bounding-box pixel.
+
+    Args:
+        masks (CompactMasks): The masks to index.
+    """
+
+    def __init__(self, masks):
+        self.orig_shape = masks.orig_shape
+        self.rois = masks.rois.copy()
+        self.areas = masks.areas().numpy()
+        tables, offsets, size = [], [], 0
+        for i in range(len(masks)):
+            crop = masks.crop(i)
+            sat = np.zeros((crop.shape[0] + 1, crop.shape[1] + 1), dtype=np.int32)
+            crop.cumsum(0, dtype=np.int32, out=sat[1:, 1:])
+            sat[1:, 1:].cumsum(1, out=sat[1:, 1:])
+            tables.append(sat.ravel())
+            offsets.append(size)
+            size += sat.size
+        self.tables = np.concatenate(tables) if tables else np.zeros(0, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_masks(cls, masks):
+        """Build from a dense (n, h, w) stack, `Masks`, `CompactMasks` or `LazyMasks`."""
+        if isinstance(masks, LazyMasks):
+            masks = masks.compact()
+        elif not isinstance(masks, CompactMasks):
+            masks = CompactMasks.from_dense(masks.data if isinstance(masks, Masks) else masks)
+        return cls(masks)
+
+    @property
+    def shape(self):
+        return self.orig_shape
+
+    @property
+    def nbytes(self):
+        return self.tables.nbytes + self.offsets.nbytes + self.rois.nbytes + self.areas.nbytes
+
+    def __len__(self):
+        return len(self.rois)
+
+    def _clip(self, bboxes):
+        """Round (m, 4) xyxy boxes to pixels and clip them to the image, as the dense box prompt does."""
+        b = np.round(np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)).astype(np.int64)
+        h, w = self.orig_shape
+        b[:, :2] = np.maximum(b[:, :2], 0)
+        b[:, 2] = np.minimum(b[:, 2], w)
+        b[:, 3] = np.minimum(b[:, 3], h)
+        return b
+
+    def intersections(self, bboxes):
+        """
+        Args:
+            bboxes (array-like): (m, 4) boxes xyxy in pixels of `orig_shape`.
+
+        Returns:
+            (np.ndarray): (m, n) int64 number of pixels of mask j inside box i.
+        """
+        b = self._clip(bboxes)[:, None, :]  # (m, 1, 4)
+        r = self.rois[None]  # (1, n, 4)
+        x1 = np.clip(b[..., 0], r[..., 0], r[..., 2]) - r[..., 0]  # box edges in crop coordinates, (m, n)
+        x2 = np.clip(b[..., 2], r[..., 0], r[..., 2]) - r[..., 0]
+        y1 = np.clip(b[..., 1], r[..., 1], r[..., 3]) - r[..., 1]
+        y2 = np.clip(b[..., 3], r[..., 1], r[..., 3]) - r[..., 1]
+        x2, y2 = np.maximum(x2, x1), np.maximum(y2, y1)
+        stride = r[..., 2] - r[..., 0] + 1
+        base = self.offsets[None]
+        t = self.tables
+        return (t[base + y2 * stride + x2].astype(np.int64) - t[base + y1 * stride + x2] -
+                t[base + y2 * stride + x1] + t[base + y1 * stride + x1])
+
+    def iou(self, bboxes):
+        """IoU of every box against every mask, (m, n) float."""
+        b = self._clip(bboxes)
+        inter = self.intersections(b)
+        box_area = ((b[:, 3] - b[:, 1]) * (b[:, 2] - b[:, 0]))[:, None]
+        return inter / (box_area + self.areas[None] - inter)
+
+    def match(self, bboxes):
+        """Index of the best-matching mask for every box and its IoU, two (m,) arrays."""
+        ious = self.iou(bboxes)
+        idx = ious.argmax(1)
+        return idx, ious[np.arange(len(idx)), idx]
+
+
+def contained_masks(masks, areas=None, thresh=0.8):
+    """
+    Flag every mask that lies mostly inside a larger mask.
+
+    Mask j is flagged when a mask with a strictly larger area covers more than `thresh` of it, the criterion of
+    `FastSAMPrompt.filter_masks`. Pairs are pruned first: only pairs whose bounding-box overlap could hold that much
+    of the smaller mask are intersected, on the bit-packed crops. Dense CUDA tensors instead take one matrix product
+    of the flattened masks.
+
+    Args:
+        masks (CompactMasks | LazyMasks | torch.Tensor | np.ndarray | List[np.ndarray]): n masks of the same size.
+        areas (array-like, optional): Mask areas, computed from the masks if omitted.
+        thresh (float): Covered fraction above which the smaller mask is flagged.
+
+    Returns:
+        (np.ndarray): Bool array (n,), True for the masks to drop.
+    """
+    if isinstance(masks, torch.Tensor) and masks.is_cuda:
+        flat = (masks != 0).flatten(1).float()
+        area = flat.sum(1) if areas is None else torch.as_tensor(areas, dtype=torch.float32, device=masks.device)
+        inter = flat @ flat.T
+        cover = (area[:, None] > area[None]) & (inter > thresh * area[None]) & (area[None] > 0)
+        return cover.any(0).cpu().numpy()
+    if isinstance(masks, LazyMasks):
+        masks = masks.compact()
+    elif isinstance(masks, list):
+        h, w = masks[0].shape
+        masks = CompactMasks.from_crops(masks, np.tile([0, 0, w, h], (len(masks), 1)), (h, w))
+    elif not isinstance(masks, CompactMasks):
+        masks = CompactMasks.from_dense(masks)
+    area = masks.areas().numpy() if areas is None else np.asarray(areas, dtype=np.float64).reshape(-1)
+    r = masks.rois
+    ow = np.minimum(r[:, None, 2], r[None, :, 2]) - np.maximum(r[:, None, 0], r[None, :, 0])
+    oh = np.minimum(r[:, None, 3], r[None, :, 3]) - np.maximum(r[:, None, 1], r[None, :, 1])
+    overlap = np.clip(ow, 0, None) * np.clip(oh, 0, None)  # upper bound of every pairwise intersection
+    candidates = (area[:, None] > area[None]) & (overlap > thresh * area[None]) & (area[None] > 0)
+    flagged = np.zeros(len(masks), dtype=bool)
+    crops = {}
+    for i, j in zip(*np.nonzero(candidates)):
+        if flagged[j]:
+            continue
+        for k in (i, j):
+            if k not in crops:
+                crops[k] = masks.crop(k)
+        x1, y1 = max(r[i, 0], r[j, 0]), max(r[i, 1], r[j, 1])
+        x2, y2 = min(r[i, 2], r[j, 2]), min(r[i, 3], r[j, 3])
+        a = crops[i][y1 - r[i, 1]:y2 - r[i, 1], x1 - r[i, 0]:x2 - r[i, 0]]
+        b = crops[j][y1 - r[j, 1]:y2 - r[j, 1], x1 - r[j, 0]:x2 - r[j, 0]]
+        flagged[j] = np.count_nonzero(a & b) > thresh * area[j]
+    return flagged
+
+
+def _to_numpy(x):
+    return x.cpu().numpy() if isinstance(x, torch.Tensor) else np.asarray(x)
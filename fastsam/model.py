@@ -7,22 +7,60 @@ Usage - Predict:
 
     model = FastSAM('last.pt')
     results = model.predict('ultralytics/assets/bus.jpg')
+
+Usage - Predict many images with one warmed-up predictor:
+    model = FastSAM('last.pt', cache_predictor=True)
+    for path in paths:
+        results = model.predict(path, conf=0.4, iou=0.9)  # conf/iou/imgsz/retina_masks may change per call
+
+Usage - Predict a large GeoTIFF in overlapping tiles:
+    result = model.predict_tiled('orthomosaic.tif', tile_size=1024, overlap=128, conf=0.4, iou=0.9)
+    result.to_raster('masks.tif')
 """
 
 from ultralytics.yolo.cfg import get_cfg
 from ultralytics.yolo.engine.exporter import Exporter
 from ultralytics.yolo.engine.model import YOLO
-from ultralytics.yolo.utils import DEFAULT_CFG, LOGGER, ROOT, is_git_dir
+from ultralytics.yolo.utils import DEFAULT_CFG, DEFAULT_CFG_DICT, LOGGER, ROOT, is_git_dir
 from ultralytics.yolo.utils.checks import check_imgsz
 
 from ultralytics.yolo.utils.torch_utils import model_info, smart_inference_mode
+from .masks import CompactMasks, LazyMasks
 from .predict import FastSAMPredictor
 
 
+# Arguments a cached predictor applies per call; changing any other argument (device, half, ...) rebuilds it.
+PER_CALL_ARGS = ('conf', 'iou', 'imgsz', 'retina_masks', 'max_det', 'agnostic_nms', 'classes', 'augment', 'verbose')
+
+
 class FastSAM(YOLO):
 
+    def __init__(self, model='FastSAM-x.pt', task=None, cache_predictor=False, result_cache=None, tile_cache=None):
+        """
+        Args:
+            model (str | Path): Path to the FastSAM weights.
+            task (str, optional): Task type. Defaults to the task stored in the checkpoint.
+            cache_predictor (bool): Keep the configured predictor and its warmed-up backend between `predict` calls
+                instead of rebuilding it every time.
+            result_cache (fastsam.cache.ResultCache, optional): Serve repeated predictions on identical image content
+                and arguments from this cache instead of running the network.
+            tile_cache (fastsam.cache.TileCache, optional): Reuse per-tile results across `predict_tiled` jobs.
+        """
+        self.cache_predictor = cache_predictor
+        self.result_cache = result_cache
+        self.tile_cache = tile_cache
+        self._predictor_cfg = None  # overrides the cached predictor was built with, minus PER_CALL_ARGS
+        super().__init__(model, task)
+
     @smart_inference_mode()
-    def predict(self, source=None, stream=False, **kwargs):
+    def predict(self,
+                source=None,
+                stream=False,
+                keep_raw=False,
+                lazy_masks=False,
+                compact_masks=False,
+                raise_errors=False,
+                **kwargs):
         """
         Perform prediction using the YOLO model.
 
@@ -30,6 +68,11 @@ class FastSAM(YOLO):
             source (str | int | PIL | np.ndarray): The source of the image to make predictions on.
                           Accepts all source types accepted by the YOLO model.
             stream (bool): Whether to stream the predictions or not. Defaults to False.
+            keep_raw (bool): Keep the pre-NMS head outputs on each result so `rethreshold` can be used.
+            lazy_masks (bool): With retina_masks, return `fastsam.masks.LazyMasks` that only upsample the masks a
+                prompt selects, instead of building every mask at full resolution.
+            compact_masks (bool): With retina_masks, return bit-packed `fastsam.masks.CompactMasks`.
+            raise_errors (bool): Raise inference errors instead of returning None.
             **kwargs : Additional keyword arguments passed to the predictor.
                        Check the 'configuration' section in the documentation for all available options.
 
@@ -45,13 +88,73 @@ class FastSAM(YOLO):
         overrides['mode'] = kwargs.get('mode', 'predict')
         assert overrides['mode'] in ['track', 'predict']
         overrides['save'] = kwargs.get('save', False)  # do not save by default if called in Python
-        self.predictor = FastSAMPredictor(overrides=overrides)
-        self.predictor.setup_model(model=self.model, verbose=False)
+        cache_key = None
+        if self.result_cache is not None and not stream:
+            cache_key = self.result_cache.key(source, self.ckpt_path or self.cfg, overrides)
+            results = self.result_cache.get(cache_key) if cache_key else None
+            if results is not None and (not keep_raw or getattr(results[0], 'raw', None) is not None) and \
+                    lazy_masks == isinstance(results[0].masks, LazyMasks) and \
+                    compact_masks == isinstance(results[0].masks, CompactMasks):
+                return results
+        predictor_cfg = {k: v for k, v in overrides.items() if k not in PER_CALL_ARGS}
+        if self.cache_predictor and self.predictor is not None and predictor_cfg == self._predictor_cfg:
+            # Reuse the backend: apply per-call args directly instead of re-running get_cfg/setup_model/warmup
+            for k in PER_CALL_ARGS:
+                setattr(self.predictor.args, k, overrides.get(k, DEFAULT_CFG_DICT[k]))
+        else:
+            self.predictor = FastSAMPredictor(overrides=overrides)
+            self.predictor.setup_model(model=self.model, verbose=False)
+            self._predictor_cfg = predictor_cfg
+        self.predictor.keep_raw = keep_raw
+        self.predictor.lazy_masks = lazy_masks
+        self.predictor.compact_masks = compact_masks
         try:
-            return self.predictor(source, stream=stream)
+            results = self.predictor(source, stream=stream)
+            if cache_key and results:
+                self.result_cache.put(cache_key, results)
+            return results
         except Exception as e:
+            if raise_errors:
+                raise
             return None
 
+    def predict_tiled(self, source, tile_size=1024, overlap=128, batch=4, merge_iou=0.5, **kwargs):
+        """
+        Predict a raster larger than the network input tile by tile, see `fastsam.tiling.tiled_predict`.
+
+        Args:
+            source (str | os.PathLike | rasterio.DatasetReader): Path of the raster (e.g. a GeoTIFF), or an open
+                dataset.
+            tile_size (int): Tile height and width in raster pixels.
+            overlap (int): Minimum overlap between neighbouring tiles in pixels.
+            batch (int): Tiles per forward pass.
+            merge_iou (float): IoU, on the area two tiles share, above which their masks are merged into one.
+            **kwargs : Pipeline sizing (readers, workers, prefetch) and keyword arguments passed to `predict` for every
+                batch of tiles.
+
+        Returns:
+            (fastsam.tiling.TiledResult): Merged masks and boxes in raster pixel coordinates.
+        """
+        from .tiling import tiled_predict
+        return tiled_predict(self, source, tile_size, overlap, batch, merge_iou, **kwargs)
+
+    @smart_inference_mode()
+    def rethreshold(self, results, conf=None, iou=None):
+        """
+        Re-run NMS and mask assembly on results predicted with `keep_raw=True`, skipping the forward pass.
+
+        Args:
+            results (List[Results]): Results of a previous `predict(..., keep_raw=True)` call.
+            conf (float, optional): New confidence threshold.
+            iou (float, optional): New NMS IoU threshold.
+
+        Returns:
+            (List[Results]): The re-thresholded results.
+        """
+        if self.predictor is None:
+            raise RuntimeError('rethreshold() needs a predictor, call predict(..., keep_raw=True) first.')
+        return self.predictor.rethreshold(results, conf=conf, iou=iou)
+
     def train(self, **kwargs):
         """Function trains models but raises an error as FastSAM models do not support training."""
         raise NotImplementedError("Currently, the training codes are on the way.")
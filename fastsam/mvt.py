@@ -0,0 +1,332 @@
+"""
+Mapbox Vector Tile pyramids of segmentation polygons.
+
+Features from `fastsam.vector` are reprojected to Web Mercator, simplified once per zoom level, clipped to every
+z/x/y tile they touch (with a small buffer so strokes do not show seams) and encoded as MVT 2.1 protobuf. Tiles go
+to a `{z}/{x}/{y}.pbf` directory that any static file server can serve, or to a single MBTiles (SQLite) file, so a
+web map only loads the tiles in view instead of one GeoJSON document for the whole image.
+
+Usage:
+    import rasterio
+    from fastsam.mvt import MBTilesStore, write_tiles
+    from fastsam.vector import iter_mask_features
+
+    with rasterio.open('orthophoto.tif') as src:
+        features = iter_mask_features(result, transform=src.transform)
+        with MBTilesStore('masks.mbtiles') as store:
+            write_tiles(features, store, crs=src.crs, minzoom=12, maxzoom=19)
+    tile = MBTilesStore('masks.mbtiles').get(19, 274312, 183080)  # gzipped MVT bytes, or None
+"""
+
+import gzip
+import json
+import math
+import sqlite3
+import struct
+import threading
+from pathlib import Path
+
+import numpy as np
+from rasterio.crs import CRS
+from rasterio.warp import transform, transform_geom
+
+from .vector import WEB_MERCATOR_RESOLUTION, zoom_tolerance
+
+ORIGIN = math.pi * 6378137  # half the Web Mercator world width, in metres
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+POLYGON = 3
+
+
+class DirectoryTileStore:
+    """
+    Tiles as `{root}/{z}/{x}/{y}.pbf` files (uncompressed, XYZ rows) plus a TileJSON-like `metadata.json`.
+
+    Args:
+        root (str | Path): Output directory, created if missing.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def put(self, z, x, y, data):
+        path = self.root / str(z) / str(x) / f'{y}.pbf'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    def get(self, z, x, y):
+        """Return the MVT bytes of tile z/x/y, or None if it holds no features."""
+        path = self.root / str(z) / str(x) / f'{y}.pbf'
+        return path.read_bytes() if path.is_file() else None
+
+    def set_metadata(self, metadata):
+        (self.root / 'metadata.json').write_text(json.dumps(metadata))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class MBTilesStore:
+    """
+    Tiles in a single MBTiles 1.3 file: an SQLite database with gzipped tiles in TMS row order.
+
+    Reads are safe from several threads; each thread uses its own connection.
+
+    Args:
+        path (str | Path): The .mbtiles file; an existing file is opened and extended.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        db = self._db()
+        db.execute('CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT)')
+        db.execute('CREATE TABLE IF NOT EXISTS tiles '
+                   '(zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)')
+        db.execute('CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row)')
+        db.commit()
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path)
+        return db
+
+    def put(self, z, x, y, data):
+        self._db().execute('INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)',
+                           (z, x, (1 << z) - 1 - y, gzip.compress(data)))
+
+    def get(self, z, x, y):
+        """Return the gzipped MVT bytes of tile z/x/y (XYZ row), or None if it holds no features."""
+        row = self._db().execute('SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?',
+                                 (z, x, (1 << z) - 1 - y)).fetchone()
+        return row[0] if row else None
+
+    def set_metadata(self, metadata):
+        db = self._db()
+        db.execute('DELETE FROM metadata')
+        db.executemany('INSERT INTO metadata VALUES (?, ?)',
+                       [(k, v if isinstance(v, str) else json.dumps(v)) for k, v in metadata.items()])
+
+    def close(self):
+        db = getattr(self._local, 'db', None)
+        if db is not None:
+            db.commit()
+            db.close()
+            self._local.db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def auto_maxzoom(resolution):
+    """Smallest zoom whose 256 px tile pixels are at least as fine as `resolution` (EPSG:3857 units), at most 22."""
+    return int(min(22, max(0, math.ceil(math.log2(WEB_MERCATOR_RESOLUTION / resolution)))))
+
+
+def write_tiles(features,
+                store,
+                crs=None,
+                minzoom=None,
+                maxzoom=None,
+                resolution=None,
+                layer='masks',
+                extent=4096,
+                buffer=64,
+                tolerance=0.5):
+    """
+    Build an MVT pyramid of polygon features into `store`.
+
+    Args:
+        features (Iterable[dict]): GeoJSON Polygon/MultiPolygon features, e.g. from `iter_mask_features`.
+        store (DirectoryTileStore | MBTilesStore): Where the tiles go.
+        crs (rasterio.crs.CRS | str, optional): CRS of the feature coordinates. Defaults to EPSG:3857.
+        minzoom (int, optional): Lowest zoom level; defaults to 6 levels below `maxzoom`.
+        maxzoom (int, optional): Highest zoom level; defaults to the level whose tile pixels match `resolution`.
+        resolution (float, optional): Source pixel size in EPSG:3857 units; estimated from the shortest polygon
+            edge (one raster pixel on any staircase outline) if not given.
+        layer (str): Name of the vector tile layer.
+        extent (int): Tile coordinate range of the MVT layer.
+        buffer (int): Extra margin clipped around each tile, in tile coordinates.
+        tolerance (float): Simplification tolerance per zoom level, in screen pixels (see `zoom_tolerance`).
+
+    Returns:
+        (dict): The metadata written to the store (bounds, center, zooms, tile count, vector_layers).
+    """
+    from shapely import clip_by_rect
+    from shapely.geometry import shape
+
+    web_mercator = CRS.from_epsg(3857)
+    crs = CRS.from_user_input(crs) if crs else web_mercator
+    reproject = crs != web_mercator
+    geometries, properties, fields = [], [], {}
+    for feature in features:
+        geometry = feature['geometry']
+        if reproject:
+            geometry = transform_geom(crs, web_mercator, geometry)
+        geometries.append(shape(geometry))
+        properties.append(feature.get('properties') or {})
+        for k, v in properties[-1].items():
+            fields[k] = 'Number' if isinstance(v, (int, float)) else 'String'
+    if maxzoom is None:
+        maxzoom = auto_maxzoom(resolution or _pixel_size(geometries)) if geometries else 0
+    minzoom = max(0, maxzoom - 6) if minzoom is None else minzoom
+
+    count = 0
+    for z in range(minzoom, maxzoom + 1):
+        size = 2 * ORIGIN / (1 << z)  # tile width in metres
+        margin = size * buffer / extent
+        tiles = {}
+        for i, geometry in enumerate(geometries):
+            simple = geometry.simplify(zoom_tolerance(z, tolerance), preserve_topology=True)
+            if simple.is_empty:
+                continue
+            minx, miny, maxx, maxy = simple.bounds
+            x0, x1 = _tile_index(minx - margin, size), _tile_index(maxx + margin, size)
+            y0, y1 = _tile_index(-(maxy + margin), size), _tile_index(-(miny - margin), size)
+            for x in range(max(x0, 0), min(x1, (1 << z) - 1) + 1):
+                for y in range(max(y0, 0), min(y1, (1 << z) - 1) + 1):
+                    left, top = x * size - ORIGIN, ORIGIN - y * size
+                    part = clip_by_rect(simple, left - margin, top - size - margin, left + size + margin, top + margin)
+                    commands = _encode_geometry(part, left, top, extent / size)
+                    if commands:
+                        tiles.setdefault((x, y), []).append((i, commands))
+        for (x, y), items in tiles.items():
+            store.put(z, x, y, _encode_tile(layer, extent, items, properties))
+        count += len(tiles)
+
+    metadata = _metadata(geometries, layer, fields, minzoom, maxzoom, count)
+    store.set_metadata(metadata)
+    return metadata
+
+
+def _pixel_size(geometries):
+    """Shortest exterior edge of (a sample of) the polygons, which is one raster pixel on traced outlines."""
+    lengths = []
+    for g in geometries[:256]:
+        for polygon in getattr(g, 'geoms', [g]):
+            xy = np.asarray(polygon.exterior.coords)
+            lengths.append(np.hypot(*np.diff(xy, axis=0).T))
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0)
+    lengths = lengths[lengths > 0]
+    return float(lengths.min()) if lengths.size else 1.0
+
+
+def _tile_index(v, size):
+    return int(math.floor((v + ORIGIN) / size))
+
+
+def _metadata(geometries, layer, fields, minzoom, maxzoom, count):
+    if geometries:
+        bounds = np.array([g.bounds for g in geometries])
+        (west, east), (south, north) = transform('EPSG:3857', 'EPSG:4326', [bounds[:, 0].min(), bounds[:, 2].max()],
+                                                 [bounds[:, 1].min(), bounds[:, 3].max()])
+    else:
+        west = south = east = north = 0.0
+    return {
+        'name': layer,
+        'format': 'pbf',
+        'type': 'overlay',
+        'minzoom': minzoom,
+        'maxzoom': maxzoom,
+        'bounds': f'{west},{south},{east},{north}',
+        'center': f'{(west + east) / 2},{(south + north) / 2},{maxzoom}',
+        'tiles': count,
+        'json': json.dumps({'vector_layers': [{'id': layer, 'fields': fields, 'minzoom': minzoom,
+                                               'maxzoom': maxzoom}]})}
+
+
+def _encode_geometry(geometry, left, top, scale):
+    """MVT command stream of a clipped (multi)polygon in tile coordinates; empty if nothing survives rounding."""
+    if geometry.is_empty:
+        return []
+    commands, cursor = [], np.zeros(2, dtype=np.int64)
+    for polygon in getattr(geometry, 'geoms', [geometry]):
+        if polygon.geom_type != 'Polygon':  # clipping can leave lines or points on the buffer edge
+            continue
+        rings = [(polygon.exterior, 1)] + [(r, -1) for r in polygon.interiors]
+        encoded = []
+        for ring, orientation in rings:
+            xy = np.asarray(ring.coords)[:-1]
+            xy = np.round(np.column_stack(((xy[:, 0] - left) * scale, (top - xy[:, 1]) * scale))).astype(np.int64)
+            xy = xy[np.r_[True, (xy[1:] != xy[:-1]).any(1)]]
+            if len(xy) > 1 and (xy[0] == xy[-1]).all():
+                xy = xy[:-1]
+            area = _signed_area(xy)
+            if len(xy) < 3 or area == 0:
+                if orientation == 1:
+                    break  # the exterior vanished, drop the polygon with its holes
+                continue
+            if np.sign(area) != orientation:  # exterior clockwise (positive with y down), holes counter-clockwise
+                xy = xy[::-1]
+            encoded.append(xy)
+        else:
+            for xy in encoded:
+                deltas = np.diff(xy, axis=0, prepend=cursor[None])
+                cursor = xy[-1]
+                zz = (deltas << 1) ^ (deltas >> 63)
+                commands += [MOVE_TO | 1 << 3, *zz[0].tolist(), LINE_TO | (len(xy) - 1) << 3]
+                commands += zz[1:].ravel().tolist() + [CLOSE_PATH | 1 << 3]
+    return commands
+
+
+def _signed_area(xy):
+    x, y = xy[:, 0], xy[:, 1]
+    return int((x * np.roll(y, -1) - np.roll(x, -1) * y).sum())
+
+
+def _encode_tile(layer, extent, items, properties):
+    """Serialize one MVT layer (version 2) holding `items` = [(feature index, geometry commands)]."""
+    keys, values, features = {}, {}, []
+    for i, commands in items:
+        tags = []
+        for k, v in properties[i].items():
+            if v is None:
+                continue
+            tags += [keys.setdefault(k, len(keys)), values.setdefault((type(v).__name__, v), len(values))]
+        features.append(_field(1, _varint(i + 1), 0) + _field(2, _packed(tags)) + _field(3, _varint(POLYGON), 0) +
+                        _field(4, _packed(commands)))
+    body = [_field(15, _varint(2), 0), _field(1, layer.encode())]
+    body += [_field(2, f) for f in features]
+    body += [_field(3, k.encode()) for k in keys]
+    body += [_field(4, _value(v)) for _, v in values]
+    body.append(_field(5, _varint(extent), 0))
+    return _field(3, b''.join(body))
+
+
+def _value(v):
+    if isinstance(v, bool):
+        return _field(7, _varint(int(v)), 0)
+    if isinstance(v, int):
+        return _field(6, _varint((v << 1) ^ (v >> 63)), 0) if v < 0 else _field(5, _varint(v), 0)
+    if isinstance(v, float):
+        return _field(3, struct.pack('<d', v), 1)
+    return _field(1, str(v).encode())
+
+
+def _field(number, payload, wire=2):
+    """Protobuf field: key, then the length for length-delimited payloads (wire type 2)."""
+    key = _varint(number << 3 | wire)
+    return key + (_varint(len(payload)) + payload if wire == 2 else payload)
+
+
+def _packed(values):
+    return b''.join(_varint(v) for v in values)
+
+
+def _varint(v):
+    out = bytearray()
+    while v > 0x7F:
+        out.append(v & 0x7F | 0x80)
+        v >>= 7
+    out.append(v)
+    return bytes(out)
@@ -3,6 +3,7 @@ import torch
 from ultralytics.yolo.engine.results import Results
 from ultralytics.yolo.utils import DEFAULT_CFG, ops
 from ultralytics.yolo.v8.detect.predict import DetectionPredictor
+from .masks import CompactMasks, LazyMasks
 from .utils import bbox_iou
 
 class FastSAMPredictor(DetectionPredictor):
@@ -10,47 +11,96 @@ class FastSAMPredictor(DetectionPredictor):
     def __init__(self, cfg=DEFAULT_CFG, overrides=None, _callbacks=None):
         super().__init__(cfg, overrides, _callbacks)
         self.args.task = 'segment'
+        self.keep_raw = False  # attach the pre-NMS head outputs to each Results as `raw` for `rethreshold`
+        self.lazy_masks = False  # with retina_masks, return LazyMasks instead of dense full-resolution masks
+        self.compact_masks = False  # with retina_masks, return bit-packed CompactMasks
 
     def postprocess(self, preds, img, orig_imgs):
         """TODO: filter by classes."""
-        p = ops.non_max_suppression(preds[0],
-                                    self.args.conf,
-                                    self.args.iou,
-                                    agnostic=self.args.agnostic_nms,
-                                    max_det=self.args.max_det,
-                                    nc=len(self.model.names),
-                                    classes=self.args.classes)
+        p = self.nms(preds[0])
 
         results = []
-        if len(p) == 0 or len(p[0]) == 0:
+        if len(p) == 0 or all(len(x) == 0 for x in p):  # keep one result per image while any image has detections
             print("No object detected.")
             return results
 
-        full_box = torch.zeros_like(p[0][0])
-        full_box[2], full_box[3], full_box[4], full_box[6:] = img.shape[3], img.shape[2], 1.0, 1.0
-        full_box = full_box.view(1, -1)
-        critical_iou_index = bbox_iou(full_box[0][:4], p[0][:, :4], iou_thres=0.9, image_shape=img.shape[2:])
-        if critical_iou_index.numel() != 0:
-            full_box[0][4] = p[0][critical_iou_index][:,4]
-            full_box[0][6:] = p[0][critical_iou_index][:,6:]
-            p[0][critical_iou_index] = full_box
-        
         proto = preds[1][-1] if len(preds[1]) == 3 else preds[1]  # second output is len 3 if pt, but only 1 if exported
         for i, pred in enumerate(p):
             orig_img = orig_imgs[i] if isinstance(orig_imgs, list) else orig_imgs
             path = self.batch[0]
             img_path = path[i] if isinstance(path, list) else path
-            if not len(pred):  # save empty boxes
-                results.append(Results(orig_img=orig_img, path=img_path, names=self.model.names, boxes=pred[:, :6]))
-                continue
+            raw = None
+            if self.keep_raw:
+                raw = dict(preds=preds[0][i:i + 1], proto=proto[i], img_shape=img.shape[2:],
+                           scale_boxes=not isinstance(orig_imgs, torch.Tensor))
+            results.append(self.assemble(pred, proto[i], img.shape[2:], orig_img, img_path,
+                                         scale_boxes=not isinstance(orig_imgs, torch.Tensor), raw=raw))
+        return results
+
+    def nms(self, preds, conf=None, iou=None):
+        """Run NMS over the raw box candidates with the given (or configured) thresholds."""
+        return ops.non_max_suppression(preds,
+                                       self.args.conf if conf is None else conf,
+                                       self.args.iou if iou is None else iou,
+                                       agnostic=self.args.agnostic_nms,
+                                       max_det=self.args.max_det,
+                                       nc=len(self.model.names),
+                                       classes=self.args.classes)
+
+    def assemble(self, pred, proto, img_shape, orig_img, img_path, scale_boxes=True, raw=None):
+        """Build the Results of one image from its post-NMS detections and mask prototypes."""
+        if len(pred):
+            full_box = torch.zeros_like(pred[0])
+            full_box[2], full_box[3], full_box[4], full_box[6:] = img_shape[1], img_shape[0], 1.0, 1.0
+            full_box = full_box.view(1, -1)
+            critical_iou_index = bbox_iou(full_box[0][:4], pred[:, :4], iou_thres=0.9, image_shape=img_shape)
+            if critical_iou_index.numel() != 0:
+                full_box[0][4] = pred[critical_iou_index][:,4]
+                full_box[0][6:] = pred[critical_iou_index][:,6:]
+                pred[critical_iou_index] = full_box
+
+        if not len(pred):  # save empty boxes
+            result = Results(orig_img=orig_img, path=img_path, names=self.model.names, boxes=pred[:, :6])
+        else:
+            masks = sparse = None
             if self.args.retina_masks:
-                if not isinstance(orig_imgs, torch.Tensor):
-                    pred[:, :4] = ops.scale_boxes(img.shape[2:], pred[:, :4], orig_img.shape)
-                masks = ops.process_mask_native(proto[i], pred[:, 6:], pred[:, :4], orig_img.shape[:2])  # HWC
+                if scale_boxes:
+                    pred[:, :4] = ops.scale_boxes(img_shape, pred[:, :4], orig_img.shape)
+                if self.lazy_masks:
+                    sparse = LazyMasks(proto, pred[:, 6:], pred[:, :4], orig_img.shape[:2])
+                elif self.compact_masks:
+                    crops, rois = ops.process_mask_roi(proto, pred[:, 6:], pred[:, :4], orig_img.shape[:2])
+                    sparse = CompactMasks.from_crops(crops, rois, orig_img.shape[:2])
+                else:
+                    masks = ops.process_mask_native(proto, pred[:, 6:], pred[:, :4], orig_img.shape[:2])  # HWC
             else:
-                masks = ops.process_mask(proto[i], pred[:, 6:], pred[:, :4], img.shape[2:], upsample=True)  # HWC
-                if not isinstance(orig_imgs, torch.Tensor):
-                    pred[:, :4] = ops.scale_boxes(img.shape[2:], pred[:, :4], orig_img.shape)
-            results.append(
-                Results(orig_img=orig_img, path=img_path, names=self.model.names, boxes=pred[:, :6], masks=masks))
-        return results
+                masks = ops.process_mask(proto, pred[:, 6:], pred[:, :4], img_shape, upsample=True)  # HWC
+                if scale_boxes:
+                    pred[:, :4] = ops.scale_boxes(img_shape, pred[:, :4], orig_img.shape)
+            result = Results(orig_img=orig_img, path=img_path, names=self.model.names, boxes=pred[:, :6], masks=masks)
+            if sparse is not None:
+                result.masks = sparse
+        result.raw = raw
+        return result
+
+    def rethreshold(self, results, conf=None, iou=None):
+        """
+        Re-run NMS and mask assembly with new thresholds, without running the network again.
+
+        Args:
+            results (List[Results]): Results predicted with `keep_raw=True`.
+            conf (float, optional): New confidence threshold. Defaults to the configured `conf`.
+            iou (float, optional): New NMS IoU threshold. Defaults to the configured `iou`.
+
+        Returns:
+            (List[Results]): New results; the input results are left untouched.
+        """
+        out = []
+        for r in results:
+            raw = getattr(r, 'raw', None)
+            if raw is None:
+                raise ValueError('Results carry no raw head outputs, predict with keep_raw=True to rethreshold.')
+            pred = self.nms(raw['preds'], conf, iou)[0]
+            out.append(self.assemble(pred, raw['proto'], raw['img_shape'], r.orig_img, r.path,
+                                     scale_boxes=raw['scale_boxes'], raw=raw))
+        return out
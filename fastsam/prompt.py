@@ -1,5 +1,7 @@
 from PIL import Image
-from .utils import image_to_np_ndarray
+from .masks import BoxIndex, CompactMasks, LabelMap, LazyMasks, contained_masks
+from .render import render_masks
+from .utils import image_to_np_ndarray, load_clip
 import torch
 import numpy as np
 import matplotlib.pyplot as plt
@@ -9,6 +11,10 @@ import cv2
 import matplotlib
 matplotlib.use('Agg')  # Use non-GUI backend
 import clip
+from torchvision.ops import roi_align
+
+CLIP_MEAN = torch.tensor([0.48145466, 0.4578275, 0.40821073]).view(1, 3, 1, 1)
+CLIP_STD = torch.tensor([0.26862954, 0.26130258, 0.27577711]).view(1, 3, 1, 1)
 
 
 class FastSAMPrompt:
@@ -19,35 +25,30 @@ class FastSAMPrompt:
         self.device = device
         self.results = results
         self.img = image
+        self._label_map = None
+        self._point_index = None
+        self._box_index = None
+        self._clip_index = {}  # CLIP model name -> (normalized mask embeddings, mask indices)
 
     def _segment_image(self, image, bbox):
-        if isinstance(image, Image.Image):
-            image_array = np.array(image)
-        else:
-            image_array = image
-        segmented_image_array = np.zeros_like(image_array)
-        x1, y1, x2, y2 = bbox
-        segmented_image_array[y1:y2, x1:x2] = image_array[y1:y2, x1:x2]
-        segmented_image = Image.fromarray(segmented_image_array)
-        black_image = Image.new('RGB', image.size, (255, 255, 255))
-        # transparency_mask = np.zeros_like((), dtype=np.uint8)
-        transparency_mask = np.zeros((image_array.shape[0], image_array.shape[1]), dtype=np.uint8)
-        transparency_mask[y1:y2, x1:x2] = 255
-        transparency_mask_image = Image.fromarray(transparency_mask, mode='L')
-        black_image.paste(segmented_image, mask=transparency_mask_image)
-        return black_image
+        if not isinstance(image, Image.Image):
+            image = Image.fromarray(image)
+        return image.crop(tuple(bbox))
 
     def _format_results(self, result, filter=0):
         annotations = []
-        n = len(result.masks.data)
+        n = len(result.masks)
         for i in range(n):
             annotation = {}
-            mask = result.masks.data[i] == 1.0
+            if isinstance(result.masks, CompactMasks):
+                mask = result.masks.decode([i])[0]  # one mask at a time, never the whole stack
+            else:
+                mask = (result.masks.data[i] == 1.0).cpu().numpy()
 
-            if torch.sum(mask) < filter:
+            if mask.sum() < filter:
                 continue
             annotation['id'] = i
-            annotation['segmentation'] = mask.cpu().numpy()
+            annotation['segmentation'] = mask
             annotation['bbox'] = result.boxes.data[i]
             annotation['score'] = result.boxes.conf[i]
             annotation['area'] = annotation['segmentation'].sum()
@@ -56,17 +57,10 @@ class FastSAMPrompt:
 
     def filter_masks(annotations):  # filte the overlap mask
         annotations.sort(key=lambda x: x['area'], reverse=True)
-        to_remove = set()
-        for i in range(0, len(annotations)):
-            a = annotations[i]
-            for j in range(i + 1, len(annotations)):
-                b = annotations[j]
-                if i != j and j not in to_remove:
-                    # check if
-                    if b['area'] < a['area']:
-                        if (a['segmentation'] & b['segmentation']).sum() / b['segmentation'].sum() > 0.8:
-                            to_remove.add(j)
-
+        if not annotations:
+            return annotations, set()
+        flagged = contained_masks([a['segmentation'] for a in annotations], [a['area'] for a in annotations])
+        to_remove = set(np.nonzero(flagged)[0].tolist())
         return [a for i, a in enumerate(annotations) if i not in to_remove], to_remove
 
     def _get_bbox_from_mask(self, mask):
@@ -95,93 +89,21 @@ class FastSAMPrompt:
                        better_quality=True,
                        retina=False,
                        withContours=True) -> np.ndarray:
-        if isinstance(annotations[0], dict):
+        if not isinstance(annotations, (LabelMap, CompactMasks, LazyMasks)) and isinstance(annotations[0], dict):
             annotations = [annotation['segmentation'] for annotation in annotations]
-        image = self.img
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        original_h = image.shape[0]
-        original_w = image.shape[1]
-        # comment this out.
-        # if sys.platform == "darwin":
-        #     plt.switch_backend("TkAgg")
-        plt.figure(figsize=(original_w / 100, original_h / 100))
-        # Add subplot with no margin.
-        plt.subplots_adjust(top=1, bottom=0, right=1, left=0, hspace=0, wspace=0)
-        plt.margins(0, 0)
-        plt.gca().xaxis.set_major_locator(plt.NullLocator())
-        plt.gca().yaxis.set_major_locator(plt.NullLocator())
-
-        plt.imshow(image)
-        if better_quality:
-            if isinstance(annotations[0], torch.Tensor):
-                annotations = np.array(annotations.cpu())
-            for i, mask in enumerate(annotations):
-                mask = cv2.morphologyEx(mask.astype(np.uint8), cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8))
-                annotations[i] = cv2.morphologyEx(mask.astype(np.uint8), cv2.MORPH_OPEN, np.ones((8, 8), np.uint8))
-        if self.device == 'cpu':
-            annotations = np.array(annotations)
-            self.fast_show_mask(
-                annotations,
-                plt.gca(),
-                random_color=mask_random_color,
-                bboxes=bboxes,
-                points=points,
-                pointlabel=point_label,
-                retinamask=retina,
-                target_height=original_h,
-                target_width=original_w,
-            )
-        else:
-            if isinstance(annotations[0], np.ndarray):
-                annotations = torch.from_numpy(annotations)
-            self.fast_show_mask_gpu(
-                annotations,
-                plt.gca(),
-                random_color=mask_random_color,
-                bboxes=bboxes,
-                points=points,
-                pointlabel=point_label,
-                retinamask=retina,
-                target_height=original_h,
-                target_width=original_w,
-            )
-        if isinstance(annotations, torch.Tensor):
-            annotations = annotations.cpu().numpy()
-        if withContours:
-            contour_all = []
-            temp = np.zeros((original_h, original_w, 1))
-            for i, mask in enumerate(annotations):
-                if type(mask) == dict:
-                    mask = mask['segmentation']
-                annotation = mask.astype(np.uint8)
-                if not retina:
-                    annotation = cv2.resize(
-                        annotation,
-                        (original_w, original_h),
-                        interpolation=cv2.INTER_NEAREST,
-                    )
-                contours, hierarchy = cv2.findContours(annotation, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-                for contour in contours:
-                    contour_all.append(contour)
-            cv2.drawContours(temp, contour_all, -1, (255, 255, 255), 2)
-            color = np.array([0 / 255, 0 / 255, 255 / 255, 0.8])
-            contour_mask = temp / 255 * color.reshape(1, 1, -1)
-            plt.imshow(contour_mask)
-
-        plt.axis('off')
-        fig = plt.gcf()
-        plt.draw()
-
-        try:
-            buf = fig.canvas.tostring_rgb()
-        except AttributeError:
-            fig.canvas.draw()
-            buf = fig.canvas.tostring_rgb()
-        cols, rows = fig.canvas.get_width_height()
-        img_array = np.frombuffer(buf, dtype=np.uint8).reshape(rows, cols, 3)
-        result = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-        plt.close()
-        return result
+        image = cv2.cvtColor(self.img, cv2.COLOR_BGR2RGB)
+        result = render_masks(
+            image,
+            annotations,
+            bboxes=bboxes,
+            points=points,
+            point_label=point_label,
+            random_color=mask_random_color,
+            better_quality=better_quality,
+            retina=retina,
+            contours=withContours,
+        )
+        return cv2.cvtColor(result, cv2.COLOR_RGB2BGR)
 
     # Remark for refactoring: IMO a function should do one thing only, storing the image and plotting should be seperated and do not necessarily need to be class functions but standalone utility functions that the user can chain in his scripts to have more fine-grained control.
     def plot(self,
@@ -226,28 +148,32 @@ class FastSAMPrompt:
         target_height=960,
         target_width=960,
     ):
-        msak_sum = annotation.shape[0]
-        height = annotation.shape[1]
-        weight = annotation.shape[2]
-        # Sort annotations based on area.
-        areas = np.sum(annotation, axis=(1, 2))
-        sorted_indices = np.argsort(areas)
-        annotation = annotation[sorted_indices]
-
-        index = (annotation != 0).argmax(axis=0)
+        msak_sum = len(annotation)
         if random_color:
             color = np.random.random((msak_sum, 1, 1, 3))
         else:
             color = np.ones((msak_sum, 1, 1, 3)) * np.array([30 / 255, 144 / 255, 255 / 255])
-        transparency = np.ones((msak_sum, 1, 1, 1)) * 0.6
-        visual = np.concatenate([color, transparency], axis=-1)
-        mask_image = np.expand_dims(annotation, -1) * visual
-
-        show = np.zeros((height, weight, 4))
-        h_indices, w_indices = np.meshgrid(np.arange(height), np.arange(weight), indexing='ij')
-        indices = (index[h_indices, w_indices], h_indices, w_indices, slice(None))
-        # Use vectorized indexing to update the values of 'show'.
-        show[h_indices, w_indices, :] = mask_image[indices]
+        if isinstance(annotation, LabelMap):
+            # overlaps are already resolved smallest-on-top, so colouring is a single lookup
+            show = annotation.colorize(color[:, 0, 0])
+        else:
+            height = annotation.shape[1]
+            weight = annotation.shape[2]
+            # Sort annotations based on area.
+            areas = np.sum(annotation, axis=(1, 2))
+            sorted_indices = np.argsort(areas)
+            annotation = annotation[sorted_indices]
+
+            index = (annotation != 0).argmax(axis=0)
+            transparency = np.ones((msak_sum, 1, 1, 1)) * 0.6
+            visual = np.concatenate([color, transparency], axis=-1)
+            mask_image = np.expand_dims(annotation, -1) * visual
+
+            show = np.zeros((height, weight, 4))
+            h_indices, w_indices = np.meshgrid(np.arange(height), np.arange(weight), indexing='ij')
+            indices = (index[h_indices, w_indices], h_indices, w_indices, slice(None))
+            # Use vectorized indexing to update the values of 'show'.
+            show[h_indices, w_indices, :] = mask_image[indices]
         if bboxes is not None:
             for bbox in bboxes:
                 x1, y1, x2, y2 = bbox
@@ -384,75 +310,220 @@ class FastSAMPrompt:
         assert bbox or bboxes
         if bboxes is None:
             bboxes = [bbox]
-        max_iou_index = []
         for bbox in bboxes:
             assert (bbox[2] != 0 and bbox[3] != 0)
-            masks = self.results[0].masks.data
-            target_height = self.img.shape[0]
-            target_width = self.img.shape[1]
-            h = masks.shape[1]
-            w = masks.shape[2]
-            if h != target_height or w != target_width:
-                bbox = [
-                    int(bbox[0] * w / target_width),
-                    int(bbox[1] * h / target_height),
-                    int(bbox[2] * w / target_width),
-                    int(bbox[3] * h / target_height), ]
-            bbox[0] = round(bbox[0]) if round(bbox[0]) > 0 else 0
-            bbox[1] = round(bbox[1]) if round(bbox[1]) > 0 else 0
-            bbox[2] = round(bbox[2]) if round(bbox[2]) < w else w
-            bbox[3] = round(bbox[3]) if round(bbox[3]) < h else h
-
-            # IoUs = torch.zeros(len(masks), dtype=torch.float32)
-            bbox_area = (bbox[3] - bbox[1]) * (bbox[2] - bbox[0])
-
-            masks_area = torch.sum(masks[:, bbox[1]:bbox[3], bbox[0]:bbox[2]], dim=(1, 2))
-            orig_masks_area = torch.sum(masks, dim=(1, 2))
-
-            union = bbox_area + orig_masks_area - masks_area
-            IoUs = masks_area / union
-            max_iou_index.append(int(torch.argmax(IoUs)))
-        max_iou_index = list(set(max_iou_index))
-        return np.array(masks[max_iou_index].cpu().numpy())
+        max_iou_index, _ = self.box_match(bboxes)
+        max_iou_index = list(set(max_iou_index.tolist()))
+        masks = self.results[0].masks
+        if isinstance(masks, (LazyMasks, CompactMasks)):
+            return np.array(masks.materialize(max_iou_index).cpu().numpy())
+        return np.array(masks.data[max_iou_index].cpu().numpy())
+
+    def box_match(self, bboxes):
+        """
+        Find the best-matching mask for every box in one batched call.
+
+        Args:
+            bboxes (array-like): (m, 4) boxes xyxy in original image pixels.
+
+        Returns:
+            (Tuple[np.ndarray, np.ndarray]): Index of the best mask and its IoU for every box, each of shape (m,).
+        """
+        bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        masks = self.results[0].masks
+        if isinstance(masks, LazyMasks):  # approximate, at prototype resolution, to keep the masks lazy
+            ious = torch.stack([masks.box_iou(bbox) for bbox in bboxes]).cpu().numpy()
+            idx = ious.argmax(1)
+            return idx, ious[np.arange(len(idx)), idx]
+        index = self.box_index()
+        h, w = index.shape
+        target_height, target_width = self.img.shape[:2]
+        if h != target_height or w != target_width:
+            bboxes = np.trunc(bboxes * [w / target_width, h / target_height, w / target_width, h / target_height])
+        return index.match(bboxes)
+
+    def box_index(self):
+        """Return the summed-area-table `BoxIndex` of the result masks, built once and cached."""
+        if self._box_index is None:
+            self._box_index = BoxIndex.from_masks(self.results[0].masks)
+        return self._box_index
 
     def point_prompt(self, points, pointlabel):  # numpy
         if self.results == None:
             return []
-        masks = self._format_results(self.results[0], 0)
-        target_height = self.img.shape[0]
-        target_width = self.img.shape[1]
-        h = masks[0]['segmentation'].shape[0]
-        w = masks[0]['segmentation'].shape[1]
-        if h != target_height or w != target_width:
-            points = [[int(point[0] * w / target_width), int(point[1] * h / target_height)] for point in points]
-        onemask = np.zeros((h, w))
-        masks = sorted(masks, key=lambda x: x['area'], reverse=True)
-        for i, annotation in enumerate(masks):
-            if type(annotation) == dict:
-                mask = annotation['segmentation']
-            else:
-                mask = annotation
-            for i, point in enumerate(points):
-                if mask[point[1], point[0]] == 1 and pointlabel[i] == 1:
-                    onemask[mask] = 1
-                if mask[point[1], point[0]] == 1 and pointlabel[i] == 0:
-                    onemask[mask] = 0
-        onemask = onemask >= 1
+        masks = self.point_index()
+        h, w = masks.orig_shape
+        if h != self.img.shape[0] or w != self.img.shape[1]:
+            points = [[int(point[0] * w / self.img.shape[1]), int(point[1] * h / self.img.shape[0])] for point in points]
+        pointlabel = np.asarray(pointlabel).reshape(-1)
+        inside = masks.contains(points).cpu().numpy()  # (n, k), all points against all masks in one step
+        keep = (pointlabel == 0) | (pointlabel == 1)  # other labels (e.g. -1) never touched the mask
+        inside, pointlabel = inside[:, keep], pointlabel[keep]
+        onemask = np.zeros((h, w), dtype=bool)
+        hit = np.nonzero(inside.any(1))[0]
+        if not len(hit):
+            return np.array([onemask])
+        # A mask hit by several points takes the label of the last of them; hit masks are then painted largest
+        # first, so where they overlap the smallest one decides, exactly as the original per-point loop did.
+        last = inside.shape[1] - 1 - inside[hit, ::-1].argmax(1)
+        value = pointlabel[last] == 1
+        if isinstance(masks, LazyMasks):
+            masks, hit = masks.compact(hit), np.arange(len(hit))
+        for k in np.argsort(-masks.areas().numpy()[hit], kind='stable'):
+            x1, y1, x2, y2 = masks.rois[hit[k]]
+            onemask[y1:y2, x1:x2][masks.crop(hit[k])] = value[k]
         return np.array([onemask])
 
-    def text_prompt(self, text):
+    def point_index(self):
+        """
+        Return the per-result index used for point lookups, built once and cached.
+
+        Sparse mask containers answer point queries themselves; a dense mask stack is packed into `CompactMasks`, so
+        each later click costs a few bit lookups plus bounding-box sized writes instead of a pass over every mask.
+        """
+        if self._point_index is None:
+            masks = self.results[0].masks
+            self._point_index = masks if isinstance(masks, (LazyMasks, CompactMasks)) else \
+                CompactMasks.from_dense(masks.data)
+        return self._point_index
+
+    def text_prompt(self, text, clip_model='ViT-B/32'):
+        if self.results == None:
+            return []
+        return self.text_prompts([text], top_k=1, clip_model=clip_model)[0]
+
+    def text_prompts(self, texts, top_k=1, clip_model='ViT-B/32', blend=False):
+        """
+        Match several text queries against the masks, reusing the cached mask embeddings.
+
+        Args:
+            texts (List[str]): Text queries.
+            top_k (int): Number of masks to return per query.
+            clip_model (str): CLIP model name.
+            blend (bool): Whiten the pixels outside each mask in its crop, see `clip_index`.
+
+        Returns:
+            (List[np.ndarray]): For every query, the best `top_k` masks as a bool array (k, h, w), best first.
+        """
         if self.results == None:
             return []
-        format_results = self._format_results(self.results[0], 0)
-        cropped_boxes, cropped_images, not_crop, filter_id, annotations = self._crop_image(format_results)
-        clip_model, preprocess = clip.load('ViT-B/32', device=self.device)
-        scores = self.retrieve(clip_model, preprocess, cropped_boxes, text, device=self.device)
-        max_idx = scores.argsort()
-        max_idx = max_idx[-1]
-        max_idx += sum(np.array(filter_id) <= int(max_idx))
-        return np.array([annotations[max_idx]['segmentation']])
-
-    def everything_prompt(self):
+        scores, ids = self.text_scores(texts, clip_model, blend)
+        if not len(ids):
+            return [self._mask_array([]) for _ in texts]
+        top = scores.topk(min(top_k, len(ids)), dim=1).indices.cpu().numpy()
+        return [self._mask_array(ids[t]) for t in top]
+
+    def text_scores(self, texts, clip_model='ViT-B/32', blend=False):
+        """
+        Score every indexed mask against every query: one text encode and one matrix product.
+
+        Returns:
+            (Tuple[torch.Tensor, np.ndarray]): (q, m) softmax scores over the masks for each query, and the (m,) mask
+                indices the columns refer to. Masks of 100 pixels or less are not indexed.
+        """
+        model, _ = load_clip(clip_model, device=self.device)
+        features, ids = self.clip_index(clip_model, blend=blend)
+        if not len(ids):  # no mask is large enough to be indexed, nothing to score
+            return torch.zeros((len(texts), 0), device=self.device), ids
+        with torch.no_grad():
+            text_features = model.encode_text(clip.tokenize(list(texts)).to(self.device)).float()
+        text_features /= text_features.norm(dim=-1, keepdim=True)
+        return (100.0 * text_features @ features.T).softmax(dim=1), ids
+
+    def clip_index(self, clip_model='ViT-B/32', batch_size=64, blend=False):
+        """
+        Return the CLIP embeddings of all mask crops of this result, encoding them on first use only.
+
+        Every mask is cut out of the image as its bounding box padded to a white square, and a whole batch is cropped,
+        resized and normalized in one `roi_align` call instead of going through a full-image canvas per mask.
+
+        Args:
+            clip_model (str): CLIP model name.
+            batch_size (int): Crops encoded per forward pass.
+            blend (bool): Also whiten the pixels of each crop that lie outside its mask.
+
+        Returns:
+            (Tuple[torch.Tensor, np.ndarray]): (m, d) normalized image embeddings and the (m,) mask indices.
+        """
+        if (clip_model, blend) not in self._clip_index:
+            model, _ = load_clip(clip_model, device=self.device)
+            size = getattr(getattr(model, 'visual', None), 'input_resolution', 224)
+            masks = self.results[0].masks
+            if isinstance(masks, LazyMasks):
+                masks = masks.compact()
+            boxes, areas = self._mask_boxes(masks)
+            ids = np.nonzero(areas > 100)[0]
+            image = cv2.cvtColor(self.img, cv2.COLOR_BGR2RGB)
+            mask_h, mask_w = masks.shape[1:]
+            if image.shape[:2] != (mask_h, mask_w):
+                image = cv2.resize(image, (mask_w, mask_h))
+            image = torch.from_numpy(image).to(self.device).permute(2, 0, 1)[None].float() / 255
+            features = [
+                self._encode_images(model, self._clip_crops(image, masks, boxes, ids[i:i + batch_size], size, blend))
+                for i in range(0, len(ids), batch_size)]
+            features = torch.cat(features) if features else torch.zeros((0, 1), device=self.device)
+            self._clip_index[(clip_model, blend)] = features, ids
+        return self._clip_index[(clip_model, blend)]
+
+    def _encode_images(self, model, images):
+        with torch.no_grad():
+            features = model.encode_image(images.to(self.device)).float()
+        return features / features.norm(dim=-1, keepdim=True)
+
+    @staticmethod
+    def _mask_boxes(masks):
+        """Tight (n, 4) xyxy boxes (x2/y2 exclusive) and (n,) areas of all masks, computed in one batched pass."""
+        if isinstance(masks, CompactMasks):
+            return masks.bboxes, masks.areas().numpy()
+        from ultralytics.vit.sam.amg import batched_mask_to_box
+        data = masks.data > 0.5
+        boxes = batched_mask_to_box(data)
+        boxes[:, 2:] += 1
+        return boxes.cpu().numpy().astype(np.int64), data.sum((1, 2)).cpu().numpy()
+
+    @staticmethod
+    def _clip_crops(image, masks, boxes, idx, size, blend=False):
+        """Crop boxes `idx` of `image` (1, 3, h, w) as white-padded squares, resized and normalized for CLIP."""
+        b = torch.as_tensor(boxes[idx], dtype=torch.float32, device=image.device)
+        center, half = (b[:, :2] + b[:, 2:]) / 2, (b[:, 2:] - b[:, :2]).max(1, keepdim=True).values / 2
+        rois = torch.cat([torch.zeros_like(half), center - half, center + half], 1)  # (k, 5), batch index first
+        crops = roi_align(image - 1, rois, size, aligned=True) + 1
+        # keep only the box itself: the square padding around it is white
+        grid = (torch.arange(size, device=image.device) + 0.5) / size
+        x = rois[:, 1:2] + grid * (rois[:, 3:4] - rois[:, 1:2])
+        y = rois[:, 2:3] + grid * (rois[:, 4:5] - rois[:, 2:3])
+        inside = ((y >= b[:, 1:2]) & (y < b[:, 3:4]))[:, :, None] & ((x >= b[:, 0:1]) & (x < b[:, 2:3]))[:, None, :]
+        crops = torch.where(inside[:, None], crops, torch.ones_like(crops))
+        if blend:
+            for k, i in enumerate(idx):
+                x1, y1, x2, y2 = boxes[i]
+                if isinstance(masks, CompactMasks):
+                    mask = torch.from_numpy(masks.crop(i)).to(image.device)
+                else:
+                    mask = masks.data[i, y1:y2, x1:x2].to(image.device)
+                roi = rois[k:k + 1] - rois.new_tensor([0, x1, y1, x1, y1])
+                alpha = roi_align(mask[None, None].float(), roi, size, aligned=True)[0]
+                crops[k] = crops[k] * alpha + (1 - alpha)
+        return (crops - CLIP_MEAN.to(crops.device)) / CLIP_STD.to(crops.device)
+
+    def _mask_array(self, idx):
+        """Masks `idx` of the result as a bool array (k, h, w), whatever the mask container."""
+        masks = self.results[0].masks
+        if isinstance(masks, CompactMasks):
+            return masks.decode(idx)
+        if isinstance(masks, LazyMasks):
+            return masks.materialize(idx).cpu().numpy().astype(bool)
+        return (masks.data[list(idx)] == 1.0).cpu().numpy()
+
+    def label_map(self):
+        """Return the everything-mode result as a `LabelMap` (built once and cached)."""
+        if self._label_map is None:
+            self._label_map = LabelMap.from_results(self.results[0])
+        return self._label_map
+
+    def everything_prompt(self, label_map=False):
         if self.results == None:
             return []
+        if label_map:
+            return self.label_map()
         return self.results[0].masks.data
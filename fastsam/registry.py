@@ -0,0 +1,195 @@
+"""
+Process-wide registry of resident models.
+
+Loading FastSAM weights costs more than running them, so long-running services should load each model once and hand
+the same instance to every request. Models are loaded lazily (or eagerly with `preload`), warmed up once, and evicted
+least-recently-used first when the resident set exceeds the memory budget.
+
+Usage:
+    from fastsam.registry import ModelRegistry
+
+    registry = ModelRegistry(memory_budget=4 * 1024 ** 3)
+    registry.register('FastSAM-x', lambda: FastSAM('FastSAM-x.pt'), warmup=warmup_fastsam, preload=True)
+    with registry.acquire('FastSAM-x') as model:
+        results = model('image.jpg')
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+
+from ultralytics.yolo.utils import LOGGER
+
+
+def model_nbytes(model):
+    """
+    Estimate the resident size of a model object in bytes.
+
+    Sums the parameters and buffers of every torch module reachable from `model` (the object itself or its direct
+    attributes, e.g. `FastSAM.model` or the sub-networks of LangSAM). Shared tensors are only counted once.
+    """
+    modules = [model] if isinstance(model, torch.nn.Module) else []
+    modules += [v for v in getattr(model, '__dict__', {}).values() if isinstance(v, torch.nn.Module)]
+    seen, total = set(), 0
+    for m in modules:
+        for t in list(m.parameters()) + list(m.buffers()):
+            if t.data_ptr() in seen:
+                continue
+            seen.add(t.data_ptr())
+            total += t.numel() * t.element_size()
+    return total
+
+
+def warmup_fastsam(model, imgsz=1024, device=None, **kwargs):
+    """Run one prediction on a blank image so that fusing, device transfer and kernel selection happen at load time."""
+    model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, device=device, verbose=False, **kwargs)
+
+
+class _Entry:
+    """A registered model together with its loader, lock and usage statistics."""
+
+    def __init__(self, name, loader, warmup=None, nbytes=None):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.nbytes = nbytes
+        self.model = None
+        self.lock = threading.RLock()  # models such as SamGeo keep per-image state, so one request at a time
+        self.users = 0
+        self.loads = 0
+        self.hits = 0
+        self.load_time = 0.0
+
+
+class ModelRegistry:
+    """
+    Thread-safe registry that keeps loaded models resident between requests.
+
+    Args:
+        memory_budget (int, optional): Maximum total size in bytes of resident models. When exceeded, the least
+            recently used idle models are evicted. None disables eviction.
+
+    Methods:
+        register(name, loader, warmup=None, nbytes=None, preload=False): Declare a model and how to build it.
+        acquire(name): Context manager yielding the loaded model, holding it exclusively for the block.
+        get(name): Return the loaded model without holding it (for callers that do their own locking).
+        evict(name): Drop a model from memory; it is reloaded on next use.
+        stats(): Per-model load/hit counters and sizes.
+    """
+
+    def __init__(self, memory_budget=None):
+        self.memory_budget = memory_budget
+        self._entries = OrderedDict()  # LRU order, most recently used last
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, warmup=None, nbytes=None, preload=False):
+        """
+        Register a model under `name`.
+
+        Args:
+            name (str): Registry key, e.g. 'FastSAM-x'.
+            loader (callable): Zero-argument callable returning the model.
+            warmup (callable, optional): Called once with the freshly loaded model.
+            nbytes (int, optional): Known model size; estimated with `model_nbytes` after loading if omitted.
+            preload (bool): Load (and warm up) immediately instead of on first use.
+        """
+        with self._lock:
+            self._entries[name] = _Entry(name, loader, warmup, nbytes)
+        if preload:
+            self.get(name)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    @contextmanager
+    def acquire(self, name):
+        """Yield the model registered as `name`, loading it if needed, and keep other requests off it until exit."""
+        entry = self._entry(name)
+        with entry.lock:
+            entry.users += 1
+            try:
+                yield self._load(entry)
+            finally:
+                entry.users -= 1
+
+    def get(self, name):
+        """Return the model registered as `name`, loading it if needed."""
+        entry = self._entry(name)
+        with entry.lock:
+            return self._load(entry)
+
+    def evict(self, name):
+        """Release the model registered as `name`. Returns True if it was resident."""
+        entry = self._entries[name]
+        with entry.lock:
+            if entry.model is None:
+                return False
+            entry.model = None
+        LOGGER.info(f'ModelRegistry: evicted {name} ({entry.nbytes / 1E6:.1f} MB)')
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return True
+
+    def resident_bytes(self):
+        """Total size in bytes of the currently loaded models."""
+        return sum(e.nbytes or 0 for e in self._entries.values() if e.model is not None)
+
+    def stats(self):
+        """Return a dict of per-model statistics."""
+        return {
+            e.name: {
+                'loaded': e.model is not None,
+                'nbytes': e.nbytes,
+                'loads': e.loads,
+                'hits': e.hits,
+                'load_time': e.load_time,
+                'in_use': e.users > 0}
+            for e in self._entries.values()}
+
+    def _entry(self, name):
+        with self._lock:
+            if name not in self._entries:
+                raise KeyError(f"Model '{name}' is not registered. Registered models: {list(self._entries)}")
+            self._entries.move_to_end(name)
+            return self._entries[name]
+
+    def _load(self, entry):
+        """Return `entry.model`, loading and warming it up first if necessary. Caller holds `entry.lock`."""
+        if entry.model is not None:
+            entry.hits += 1
+            return entry.model
+        self._enforce_budget(keep=entry, incoming=entry.nbytes or 0)  # make room first when the size is known
+        t = time.time()
+        model = entry.loader()
+        if entry.warmup is not None:
+            entry.warmup(model)
+        entry.load_time = time.time() - t
+        entry.nbytes = entry.nbytes or model_nbytes(model)
+        entry.model = model
+        entry.loads += 1
+        LOGGER.info(f'ModelRegistry: loaded {entry.name} ({entry.nbytes / 1E6:.1f} MB) in {entry.load_time:.2f}s')
+        self._enforce_budget(keep=entry)
+        return model
+
+    def _enforce_budget(self, keep, incoming=0):
+        """Evict least recently used idle models until the resident set plus `incoming` bytes fits the budget."""
+        if self.memory_budget is None:
+            return
+        with self._lock:
+            candidates = [e for e in self._entries.values() if e is not keep and e.model is not None]
+        for e in candidates:
+            if self.resident_bytes() + incoming <= self.memory_budget:
+                return
+            if e.users == 0 and e.lock.acquire(blocking=False):  # never evict a model that is being used
+                try:
+                    if e.users == 0:
+                        self.evict(e.name)
+                finally:
+                    e.lock.release()
+        if self.resident_bytes() + incoming > self.memory_budget:
+            LOGGER.warning(f'WARNING ⚠️ ModelRegistry: resident models use {self.resident_bytes() / 1E6:.1f} MB, '
+                           f'above the {self.memory_budget / 1E6:.1f} MB budget.')
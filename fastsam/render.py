@@ -0,0 +1,222 @@
+"""
+Mask overlay rendering with NumPy and OpenCV.
+
+Produces the same picture as the original matplotlib path of `FastSAMPrompt.plot_to_result` (masks blended at 60%
+opacity with the smallest mask on top, blue outlines, blue prompt boxes, yellow/magenta prompt points) but composes it
+directly in uint8. No figure or pyplot global state is involved, so it can be called from several threads at once.
+
+Usage:
+    from fastsam.render import render_masks
+
+    overlay = render_masks(image, masks, bboxes=[[10, 10, 200, 200]], better_quality=False)
+"""
+
+from multiprocessing.pool import ThreadPool
+
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from ultralytics.yolo.utils import NUM_THREADS, ops
+from .masks import CompactMasks, LabelMap, LazyMasks
+
+MASK_COLOR = (30, 144, 255)  # the single colour used when masks are not randomly coloured
+CONTOUR_COLOR = (0, 0, 255)
+BOX_COLOR = (0, 0, 255)
+POSITIVE_COLOR = (191, 191, 0)  # matplotlib 'y'
+NEGATIVE_COLOR = (191, 0, 191)  # matplotlib 'm'
+
+
+def render_masks(image,
+                 masks,
+                 bboxes=None,
+                 points=None,
+                 point_label=None,
+                 random_color=True,
+                 better_quality=True,
+                 retina=False,
+                 contours=True,
+                 alpha=0.6):
+    """
+    Overlay masks, their outlines and the prompt boxes and points on an image.
+
+    Colours are given in RGB order and written into `image` as-is, so pass an RGB image (or convert the result).
+
+    Args:
+        image (np.ndarray): (H, W, 3) uint8 image.
+        masks (np.ndarray | torch.Tensor | List[np.ndarray] | LabelMap | CompactMasks | LazyMasks): The masks. Dense
+            masks at a different resolution than the image are scaled with nearest-neighbour unless `retina`. A
+            `LabelMap` only keeps the visible part of each mask, so it is drawn as given, without `better_quality`.
+        bboxes (List[List[int]], optional): Prompt boxes xyxy in image pixels.
+        points (List[List[int]], optional): Prompt points (x, y) in image pixels.
+        point_label (List[int], optional): 1 for positive and 0 for negative points.
+        random_color (bool): One random colour per mask instead of a single blue.
+        better_quality (bool): Smooth the masks with a morphological close and open first.
+        retina (bool): Masks are already at image resolution.
+        contours (bool): Draw mask outlines.
+        alpha (float): Mask opacity.
+
+    Returns:
+        (np.ndarray): The (H, W, 3) uint8 overlay.
+    """
+    h, w = image.shape[:2]
+    if isinstance(masks, LazyMasks):
+        masks = masks.compact()
+    if isinstance(masks, CompactMasks):
+        masks = LabelMap.from_masks(smooth_compact(masks) if better_quality else masks)
+    if isinstance(masks, LabelMap):
+        labels, n = masks.labels.astype(np.int32), len(masks)
+    else:
+        if isinstance(masks, list):
+            masks = np.array(masks)
+        if better_quality:
+            masks = smooth_masks(masks)
+        labels, n = _paint(masks), len(masks)
+    if labels.shape != (h, w):
+        labels = cv2.resize(labels, (w, h), interpolation=cv2.INTER_NEAREST)
+
+    colors = np.random.random((n, 3)) * 255 if random_color else np.tile(MASK_COLOR, (n, 1))
+    lut = np.zeros((n + 1, 3), dtype=np.uint8)
+    lut[1:] = np.round(colors)
+    out = np.ascontiguousarray(image, dtype=np.uint8).copy()
+    _blend(out, labels > 0, lut[labels], alpha)
+
+    if contours:
+        _blend(out, _outlines(masks, labels, (h, w)), np.array(CONTOUR_COLOR, dtype=np.uint8), 0.8)
+    if bboxes is not None:
+        for x1, y1, x2, y2 in bboxes:
+            cv2.rectangle(out, (int(x1), int(y1)), (int(x2), int(y2)), BOX_COLOR, 1)
+    if points is not None:
+        for point, label in zip(points, point_label):
+            color = POSITIVE_COLOR if label == 1 else NEGATIVE_COLOR
+            cv2.circle(out, (int(point[0]), int(point[1])), 3, color, -1, cv2.LINE_AA)
+    return out
+
+
+def _blend(out, where, color, alpha):
+    """Blend `color` (an image or a single colour) into `out` in place at the pixels selected by `where`."""
+    if isinstance(where, np.ndarray) and where.any():
+        src = out[where].astype(np.float32)
+        color = color[where] if color.ndim == 3 else color
+        out[where] = np.round(src * (1 - alpha) + color.astype(np.float32) * alpha).astype(np.uint8)
+
+
+def smooth_masks(masks, close=3, open=8, chunk=16):
+    """
+    Morphological close then open of a whole mask stack with square kernels.
+
+    Gives the same result as `cv2.morphologyEx` per mask (including OpenCV's anchor for even kernel sizes and its
+    border handling). CUDA tensors are processed `chunk` masks at a time as separable max-pools on the device, without
+    a round trip to the host. Everything else goes through OpenCV, restricted to each mask's bounding box plus a
+    margin: closing and opening with a square kernel never leave the box, so the rest of the frame is not touched.
+
+    Args:
+        masks (torch.Tensor | np.ndarray | List[np.ndarray]): (n, h, w) binary masks.
+        close (int): Kernel size of the closing.
+        open (int): Kernel size of the opening.
+        chunk (int): Masks per batch on CUDA, bounds the temporary float memory.
+
+    Returns:
+        (torch.Tensor | np.ndarray): The smoothed masks, of the input's type and dtype (and device for tensors).
+    """
+    if isinstance(masks, torch.Tensor) and masks.is_cuda:
+        out = torch.empty_like(masks)
+        for i in range(0, len(masks), chunk):
+            m = (masks[i:i + chunk] != 0).half()[:, None]
+            m = _erode(_dilate(m, close), close)
+            m = _dilate(_erode(m, open), open)
+            out[i:i + chunk] = m[:, 0].to(out.dtype)
+        return out
+    is_tensor = isinstance(masks, torch.Tensor)
+    x = masks.cpu().numpy() if is_tensor else np.asarray(masks)
+    out = np.zeros_like(x)
+    h, w = x.shape[1:]
+    margin = close + open
+    k_close, k_open = np.ones((close, close), np.uint8), np.ones((open, open), np.uint8)
+    for i, mask in enumerate(x):
+        mask = (mask != 0).view(np.uint8)
+        rows = np.flatnonzero(mask.max(1))
+        if not len(rows):
+            continue
+        cols = np.flatnonzero(mask[rows[0]:rows[-1] + 1].max(0))
+        y1, y2 = max(rows[0] - margin, 0), min(rows[-1] + 1 + margin, h)
+        x1, x2 = max(cols[0] - margin, 0), min(cols[-1] + 1 + margin, w)
+        m = cv2.morphologyEx(np.ascontiguousarray(mask[y1:y2, x1:x2]), cv2.MORPH_CLOSE, k_close)
+        out[i, y1:y2, x1:x2] = cv2.morphologyEx(m, cv2.MORPH_OPEN, k_open)
+    return torch.from_numpy(out) if is_tensor else out
+
+
+def smooth_compact(masks, close=3, open=8):
+    """
+    `smooth_masks` for `CompactMasks`, one mask at a time inside its box plus the same margin.
+
+    Returns:
+        (CompactMasks): The smoothed masks; no full-size array is built.
+    """
+    h, w = masks.orig_shape
+    margin = close + open
+    crops, rois = [], []
+    for i, (x1, y1, x2, y2) in enumerate(masks.rois):
+        wx1, wy1, wx2, wy2 = max(x1 - margin, 0), max(y1 - margin, 0), min(x2 + margin, w), min(y2 + margin, h)
+        window = np.zeros((1, wy2 - wy1, wx2 - wx1), dtype=np.uint8)
+        window[0, y1 - wy1:y2 - wy1, x1 - wx1:x2 - wx1] = masks.crop(i)
+        crops.append(smooth_masks(window, close, open)[0])
+        rois.append((wx1, wy1, wx2, wy2))
+    return CompactMasks.from_crops(crops, rois, masks.orig_shape)
+
+
+def _dilate(x, k):
+    """Max over a k x k window anchored like OpenCV (k // 2), pixels outside the image are ignored."""
+    before, after = k // 2, k - 1 - k // 2
+    x = F.max_pool2d(F.pad(x, (before, after, 0, 0), value=-1.0), (1, k), stride=1)
+    return F.max_pool2d(F.pad(x, (0, 0, before, after), value=-1.0), (k, 1), stride=1)
+
+
+def _erode(x, k):
+    return -_dilate(-x, k)
+
+
+def _paint(masks):
+    """
+    Paint (n, h, w) masks into one int32 label raster (1-based, 0 is background).
+
+    Masks are painted largest first so that the smallest mask ends up on top where they overlap. Tensors are painted
+    on their own device and only the label raster is copied back.
+    """
+    if isinstance(masks, torch.Tensor):
+        masks = masks != 0
+        labels = torch.zeros(masks.shape[1:], dtype=torch.int32, device=masks.device)
+        for i in torch.argsort(masks.sum((1, 2)), descending=True, stable=True).tolist():
+            labels[masks[i]] = i + 1
+        return labels.cpu().numpy()
+    masks = np.asarray(masks) != 0
+    labels = np.zeros(masks.shape[1:], dtype=np.int32)
+    for i in np.argsort(-masks.sum((1, 2)), kind='stable'):
+        labels[masks[i]] = i + 1
+    return labels
+
+
+def _outlines(masks, labels, shape):
+    """Bool (H, W) raster of the 2-pixel wide mask outlines."""
+    h, w = shape
+    temp = np.zeros((h, w), dtype=np.uint8)
+    if isinstance(masks, LabelMap):
+        # one pass over the label raster instead of one findContours per mask
+        edges = labels[:, 1:] != labels[:, :-1], labels[1:, :] != labels[:-1, :]
+        temp[:, 1:][edges[0]] = temp[:, :-1][edges[0]] = 1
+        temp[1:, :][edges[1]] = temp[:-1, :][edges[1]] = 1
+        return temp.astype(bool)
+    if isinstance(masks, torch.Tensor):
+        masks = masks.cpu().numpy()
+
+    def trace(mask):
+        mask = mask.astype(np.uint8)
+        if mask.shape != (h, w):
+            mask = cv2.resize(mask, (w, h), interpolation=cv2.INTER_NEAREST)
+        return ops.find_contours(mask[None], cv2.RETR_TREE, workers=1)[0][0]
+
+    with ThreadPool(max(1, min(NUM_THREADS, len(masks)))) as pool:
+        contour_all = [c for contours in pool.map(trace, masks) for c in contours]
+    cv2.drawContours(temp, contour_all, -1, 1, 2)
+    return temp.astype(bool)
@@ -0,0 +1,621 @@
+"""
+Tiled sliding-window inference for rasters larger than the network input.
+
+A whole orthomosaic letterboxed down to `imgsz` loses small objects, and `retina_masks` on the full raster needs
+memory proportional to its size times the number of masks. Instead, the raster is read window by window with
+rasterio, tiles are predicted in batches at native resolution, and each tile's masks are kept bit-packed
+(`CompactMasks`) in global pixel coordinates. Objects seen by two overlapping tiles are matched on the part of the
+raster both tiles saw, and merged into one mask, so objects cut by a seam come out whole and duplicates disappear.
+Memory grows with the number and extent of the objects, not with the raster. Reading, inference and mask
+post-processing overlap in a bounded `TilePipeline`.
+
+Usage:
+    from fastsam import FastSAM
+
+    model = FastSAM('FastSAM-x.pt', cache_predictor=True)
+    result = model.predict_tiled('orthomosaic.tif', tile_size=1024, overlap=128, conf=0.4, iou=0.9)
+    result.to_raster('masks.tif')
+    print(result.stats['infer'].busy)  # per-stage busy time, also logged as utilization
+"""
+
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from ultralytics.yolo.utils import LOGGER
+from .cog import write_cog
+from .masks import CompactMasks, LazyMasks
+
+
+def tile_windows(width, height, tile_size=1024, overlap=128):
+    """
+    Cover a raster with square windows of `tile_size` overlapping by at least `overlap` pixels.
+
+    Windows on the right and bottom edge are shifted inwards so that every tile has the same size (tiles are only
+    smaller when the raster itself is).
+
+    Returns:
+        (List[Window]): The windows, row by row.
+    """
+    stride = tile_size - overlap
+    if stride <= 0:
+        raise ValueError(f'overlap={overlap} must be smaller than tile_size={tile_size}.')
+
+    def starts(n):
+        return [0] if n <= tile_size else list(range(0, n - tile_size, stride)) + [n - tile_size]
+
+    return [Window(x, y, min(tile_size, width), min(tile_size, height)) for y in starts(height) for x in starts(width)]
+
+
+class TileReader:
+    """
+    Read raster windows as 3-channel uint8 BGR images, the layout FastSAM expects for numpy input.
+
+    Rasters that are not uint8 are stretched linearly between the 2nd and 98th percentile of a decimated read of the
+    whole raster, so all tiles share one scaling.
+
+    Args:
+        src (rasterio.DatasetReader): The open raster.
+        bands (List[int], optional): 1-based band indexes, defaults to the first three (or the first one, repeated).
+        value_range (tuple, optional): (low, high) input values mapped to 0 and 255, instead of the percentiles.
+    """
+
+    def __init__(self, src, bands=None, value_range=None):
+        self.src = src
+        self.bands = list(bands or ([1, 2, 3] if src.count >= 3 else [1]))
+        self.value_range = value_range
+        if value_range is None and src.dtypes[self.bands[0] - 1] != 'uint8':
+            self.value_range = self._value_range()
+
+    def _value_range(self, size=1024):
+        scale = max(self.src.width, self.src.height) / size
+        shape = (len(self.bands), max(1, int(self.src.height / scale)), max(1, int(self.src.width / scale)))
+        sample = self.src.read(self.bands, out_shape=shape, masked=True).compressed()
+        if not sample.size:
+            return 0.0, 1.0
+        lo, hi = np.percentile(sample, (2, 98))
+        return float(lo), float(max(hi, lo + 1))
+
+    def read(self, window):
+        data = self.src.read(self.bands, window=window)  # (c, h, w)
+        if self.value_range is not None:
+            lo, hi = self.value_range
+            data = np.clip((data.astype(np.float32) - lo) * (255 / (hi - lo)), 0, 255).astype(np.uint8)
+        image = np.repeat(data, 3, axis=0) if len(data) == 1 else data[:3]
+        return np.ascontiguousarray(image.transpose(1, 2, 0)[:, :, ::-1])  # CHW RGB -> HWC BGR
+
+    def valid(self, window):
+        """Bool (h, w) mask of the pixels holding data, from the nodata value, alpha band or internal mask."""
+        return self.src.dataset_mask(window=window) > 0
+
+
+class TileScreen:
+    """
+    Cheap pre-screen that rejects tiles which cannot contain objects before they reach the network.
+
+    A tile is skipped when too little of it holds data (nodata borders of orthomosaics), or when its valid pixels are
+    nearly uniform: the grey-level standard deviation or the histogram entropy is below a threshold (open water,
+    bare fields, saturated areas). Statistics are taken on every `stride`-th pixel.
+
+    Args:
+        min_valid (float): Minimum fraction of valid pixels.
+        min_std (float): Minimum grey-level standard deviation, in 0-255 units.
+        min_entropy (float): Minimum grey-level histogram entropy in bits (8 is the maximum).
+        stride (int): Pixel subsampling of the statistics.
+    """
+
+    def __init__(self, min_valid=0.02, min_std=2.0, min_entropy=1.0, stride=4):
+        self.min_valid = min_valid
+        self.min_std = min_std
+        self.min_entropy = min_entropy
+        self.stride = stride
+
+    def check_valid(self, valid):
+        """Return 'nodata' if the tile has too few valid pixels, else None."""
+        return 'nodata' if valid is not None and valid.mean() < self.min_valid else None
+
+    def check_content(self, image, valid=None):
+        """Return 'uniform' if the valid pixels of the BGR `image` show no structure, else None."""
+        s = self.stride
+        gray = cv2.cvtColor(np.ascontiguousarray(image[::s, ::s]), cv2.COLOR_BGR2GRAY)
+        pixels = gray[valid[::s, ::s]] if valid is not None else gray.ravel()
+        if not pixels.size or pixels.std() < self.min_std:
+            return 'uniform'
+        p = np.bincount(pixels, minlength=256) / pixels.size
+        p = p[p > 0]
+        return 'uniform' if -(p * np.log2(p)).sum() < self.min_entropy else None
+
+
+class TiledResult:
+    """
+    Global result of a tiled prediction.
+
+    Attributes:
+        masks (CompactMasks): Merged masks in raster pixel coordinates.
+        boxes (np.ndarray): (n, 6) array of xyxy (x2/y2 exclusive), confidence and class, in raster pixels.
+        shape (tuple): Raster size (height, width).
+        transform (affine.Affine): Pixel to CRS transform of the source raster.
+        crs (rasterio.crs.CRS): CRS of the source raster.
+        tiles (int): Number of tiles predicted.
+        stats (Dict[str, StageStats]): Per-stage busy time of the pipeline that produced the result.
+        skipped (Dict[str, int]): Tiles the pre-screen kept from the network, per reason ('nodata', 'uniform').
+        cached (int): Tiles served from the tile cache.
+    """
+
+    def __init__(self, masks, boxes, shape, transform=None, crs=None, tiles=0):
+        self.masks = masks
+        self.boxes = boxes
+        self.shape = tuple(shape)
+        self.transform = transform
+        self.crs = crs
+        self.tiles = tiles
+        self.stats = {}
+        self.skipped = {}
+        self.cached = 0
+
+    def __len__(self):
+        return len(self.masks)
+
+    def label_block(self, window, dtype=None):
+        """
+        Paint the instances inside `window` into a label block (1-based, 0 is background).
+
+        Masks are painted largest first, so the smallest mask is on top where they overlap, as in `LabelMap`.
+        """
+        col, row, w, h = int(window.col_off), int(window.row_off), int(window.width), int(window.height)
+        dtype = dtype or (np.uint16 if len(self) < np.iinfo(np.uint16).max else np.uint32)
+        block = np.zeros((h, w), dtype=dtype)
+        r = self.masks.rois
+        hit = np.nonzero((r[:, 0] < col + w) & (r[:, 2] > col) & (r[:, 1] < row + h) & (r[:, 3] > row))[0]
+        for i in hit[np.argsort(-self.masks.areas().numpy()[hit], kind='stable')]:
+            x1, y1, x2, y2 = r[i]
+            crop = self.masks.crop(i)[max(row - y1, 0):min(row + h, y2) - y1, max(col - x1, 0):min(col + w, x2) - x1]
+            block[max(y1 - row, 0):min(y2, row + h) - row, max(x1 - col, 0):min(x2, col + w) - col][crop] = i + 1
+        return block
+
+    def to_raster(self, path, block_size=1024, **options):
+        """
+        Write the instance labels as a single-band Cloud-Optimized GeoTIFF, one block at a time.
+
+        Args:
+            path (str): Output file.
+            block_size (int): Height and width of the blocks painted and written per step.
+            **options: Overrides of the COG creation options (compress, level, ...), see `fastsam.cog.write_cog`.
+        """
+        dtype = 'uint16' if len(self) < np.iinfo(np.uint16).max else 'uint32'
+        return write_cog(path,
+                         self.shape,
+                         lambda window: self.label_block(window, dtype),
+                         transform=self.transform,
+                         crs=self.crs,
+                         dtype=dtype,
+                         block_size=block_size,
+                         **options)
+
+
+class StageStats:
+    """Busy time of one pipeline stage, summed over its workers."""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.busy = 0.0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds, items=1):
+        with self._lock:
+            self.busy += seconds
+            self.items += items
+
+    def utilization(self, wall):
+        """Fraction of the wall time the stage's workers spent working (the rest was spent waiting on queues)."""
+        return self.busy / max(wall * self.workers, 1e-9)
+
+
+class TilePipeline:
+    """
+    Bounded producer/consumer pipeline for tiled inference: read -> infer -> post-process.
+
+    Reader threads prefetch windows, each through its own rasterio handle (datasets are not thread-safe). The calling
+    thread groups the tiles into batches and runs the predictor, so the model is only ever used from one thread.
+    Post-processing workers build each tile's masks from the prototypes and coefficients and shift them to raster
+    coordinates. Queues hold at most `prefetch` items, so a slow stage blocks the one before it instead of piling up
+    tiles in memory. rasterio, OpenCV and torch release the GIL, so the stages overlap.
+
+    Args:
+        path (str): Path of the raster.
+        bands (List[int], optional): Raster bands to use as RGB, see `TileReader`.
+        readers (int): Reader threads.
+        workers (int): Post-processing threads.
+        prefetch (int): Capacity of each queue between stages.
+        screen (TileScreen, optional): Pre-screen run by the readers; rejected tiles bypass inference.
+        cache (fastsam.cache.TileCache, optional): Per-tile result cache; tiles found in it bypass inference and
+            post-processing, the others are stored once post-processed.
+        key (callable, optional): `key(image) -> str`, the cache key of a tile; required with `cache`.
+
+    Attributes:
+        stats (Dict[str, StageStats]): Busy time of the 'read', 'infer' and 'post' stages of the last `run`.
+        skipped (Dict[str, int]): Tiles rejected by the screen in the last `run`, per reason.
+        cached (int): Tiles served from the cache in the last `run`.
+        wall (float): Wall time of the last `run` in seconds.
+    """
+
+    def __init__(self, path, bands=None, readers=2, workers=2, prefetch=8, screen=None, cache=None, key=None):
+        self.path = path
+        self.bands = bands
+        self.readers = max(1, readers)
+        self.workers = max(1, workers)
+        self.prefetch = max(1, prefetch)
+        self.screen = screen
+        self.cache = cache
+        self.key = key
+        self.stats = {}
+        self.skipped = {}
+        self.cached = 0
+        self.wall = 0.0
+
+    def run(self, windows, predict, post, batch=4):
+        """
+        Push `windows` through the pipeline.
+
+        Args:
+            windows (List[Window]): Tiles to process.
+            predict (callable): `predict(images) -> List[Results]`, called from the calling thread. An empty list
+                means no tile of the batch has a detection; errors (and any other result count) abort the run, so
+                a failed batch is never taken for empty tiles or cached.
+            post (callable): `post(result) -> tile`, called from the post-processing threads; a result is None for
+                tiles without detections. Tiles are what the cache stores.
+            batch (int): Tiles per `predict` call.
+
+        Returns:
+            (list): Tiles, in the order of `windows`.
+        """
+        self.stats = {k: StageStats(k, n) for k, n in (('read', self.readers), ('infer', 1), ('post', self.workers))}
+        todo, read_q, post_q = queue.Queue(), queue.Queue(self.prefetch), queue.Queue(self.prefetch)
+        for item in enumerate(windows):
+            todo.put(item)
+        outputs, errors, stop, lock = [None] * len(windows), [], threading.Event(), threading.Lock()
+        self.skipped, self.cached = {}, 0
+
+        def guard(fn):
+            def run(*args):
+                try:
+                    fn(*args)
+                except Exception as e:  # surface in the calling thread, unblock everyone else
+                    errors.append(e)
+                    stop.set()
+            return run
+
+        @guard
+        def read():
+            with rasterio.open(self.path) as src:
+                reader = TileReader(src, self.bands, value_range)
+                while not stop.is_set():
+                    try:
+                        i, window = todo.get_nowait()
+                    except queue.Empty:
+                        break
+                    t = time.perf_counter()
+                    image, reason = self._read(reader, window)
+                    key = tile = None
+                    if image is not None and self.cache is not None:
+                        key = self.key(image)
+                        tile = self.cache.get(key)
+                        image = None if tile is not None else image
+                    self.stats['read'].add(time.perf_counter() - t)
+                    with lock:
+                        if reason:
+                            self.skipped[reason] = self.skipped.get(reason, 0) + 1
+                        self.cached += tile is not None
+                    _put(read_q, (i, image, key, tile), stop)
+            _put(read_q, None, stop)
+
+        @guard
+        def postprocess():
+            while not stop.is_set():
+                item = _get(post_q, stop)
+                if item is None:
+                    break
+                i, result, key, tile = item
+                if tile is None:
+                    t = time.perf_counter()
+                    tile = post(result)
+                    if key is not None:
+                        self.cache.put(key, tile)
+                    self.stats['post'].add(time.perf_counter() - t)
+                outputs[i] = tile
+
+        with rasterio.open(self.path) as src:
+            value_range = TileReader(src, self.bands).value_range  # one scaling for all tiles
+        threads = [threading.Thread(target=read, daemon=True) for _ in range(self.readers)]
+        threads += [threading.Thread(target=postprocess, daemon=True) for _ in range(self.workers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            done, group = 0, []
+            while done < self.readers and not stop.is_set():
+                item = _get(read_q, stop)
+                if item is None:
+                    done += 1
+                elif item[1] is None:  # rejected by the screen or found in the cache, nothing to predict
+                    _put(post_q, (item[0], None, None, item[3]), stop)
+                else:
+                    group.append(item)
+                if group and (len(group) == batch or done == self.readers):
+                    t = time.perf_counter()
+                    results = predict([image for _, image, _, _ in group])
+                    self.stats['infer'].add(time.perf_counter() - t, len(group))
+                    if results is not None and not len(results):  # nothing detected in the whole batch
+                        results = [None] * len(group)
+                    if results is None or len(results) != len(group):
+                        count = 'no results' if results is None else f'{len(results)} results'
+                        raise RuntimeError(f'Tile inference returned {count} for a batch of {len(group)} tiles.')
+                    for (i, _, key, _), r in zip(group, results):
+                        _put(post_q, (i, r, key, None), stop)
+                    group = []
+        except Exception:
+            stop.set()
+            raise
+        finally:
+            for _ in range(self.workers):
+                _put(post_q, None, stop)
+            for thread in threads:
+                thread.join()
+            self.wall = time.perf_counter() - start
+        if errors:
+            raise errors[0]
+        return outputs
+
+    def _read(self, reader, window):
+        """Read one tile, returns (image, None) or (None, reason) if the screen rejects it."""
+        if self.screen is None:
+            return reader.read(window), None
+        valid = reader.valid(window)
+        reason = self.screen.check_valid(valid)
+        if reason:
+            return None, reason  # not even worth reading the bands
+        image = reader.read(window)
+        reason = self.screen.check_content(image, None if valid.all() else valid)
+        return (None, reason) if reason else (image, None)
+
+    def saved(self):
+        """Estimated inference seconds saved by the screen and the cache: tiles times mean inference time per tile."""
+        infer = self.stats.get('infer')
+        tiles = sum(self.skipped.values()) + self.cached
+        return tiles * infer.busy / infer.items if infer and infer.items else 0.0
+
+    def report(self):
+        """One-line summary of per-stage utilization, skipped and cached tiles, to size readers/workers/batch."""
+        line = ', '.join(f'{s.name} {s.workers}x {s.utilization(self.wall):.0%} ({s.items} tiles, {s.busy:.1f}s)'
+                         for s in self.stats.values()) + f', wall {self.wall:.1f}s'
+        if self.skipped:
+            reasons = ', '.join(f'{k} {v}' for k, v in self.skipped.items())
+            line += f'; skipped {sum(self.skipped.values())} tiles ({reasons})'
+        if self.cached:
+            line += f'; {self.cached} tiles from cache'
+        if (self.skipped or self.cached) and self.stats['infer'].items:  # no estimate without a timed tile
+            line += f', ~{self.saved():.1f}s inference saved'
+        return line
+
+
+def _put(q, item, stop):
+    """Blocking put that gives up once `stop` is set, so a failed stage cannot deadlock the others."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+
+
+def tiled_predict(model,
+                  source,
+                  tile_size=1024,
+                  overlap=128,
+                  batch=4,
+                  merge_iou=0.5,
+                  bands=None,
+                  readers=2,
+                  workers=2,
+                  prefetch=None,
+                  screen=True,
+                  cache=None,
+                  **kwargs):
+    """
+    Predict a large raster tile by tile and merge the tiles into one `TiledResult`.
+
+    Reading, inference and mask post-processing run concurrently in a `TilePipeline`; its per-stage utilization is
+    logged and kept on the result as `stats`.
+
+    Args:
+        model (fastsam.FastSAM): The model; `predict` is called once per batch of tiles.
+        source (str | os.PathLike | rasterio.DatasetReader): Path of the raster, or an open dataset.
+        tile_size (int): Tile height and width in raster pixels.
+        overlap (int): Minimum overlap between neighbouring tiles in pixels; objects up to this size that are cut by
+            one tile are seen whole by its neighbour.
+        batch (int): Tiles per forward pass.
+        merge_iou (float): Two masks from overlapping tiles are merged when their IoU, measured on the area both
+            tiles cover, exceeds this.
+        bands (List[int], optional): Raster bands to use as RGB, see `TileReader`.
+        readers (int): Threads reading tiles ahead of inference.
+        workers (int): Threads building and packing the masks of predicted tiles.
+        prefetch (int, optional): Queue capacity between stages, defaults to two batches.
+        screen (bool | TileScreen): Skip nodata and uniform tiles without running the network; True uses the
+            default `TileScreen` thresholds.
+        cache (fastsam.cache.TileCache, optional): Reuse tile results computed by earlier jobs with the same model
+            and arguments. Defaults to the model's `tile_cache`.
+        **kwargs: Inference arguments for `model.predict` (conf, iou, max_det, device, ...). `imgsz` defaults to
+            `tile_size`; masks are always built at tile resolution.
+
+    Returns:
+        (TiledResult): Merged masks and boxes in raster pixel coordinates.
+    """
+    kwargs.setdefault('imgsz', tile_size)
+    kwargs.update(retina_masks=True, verbose=kwargs.get('verbose', False))
+    path = source.name if isinstance(source, rasterio.io.DatasetReader) else os.fspath(source)
+    with rasterio.open(path) as src:
+        shape, transform, crs = (src.height, src.width), src.transform, src.crs
+    windows = tile_windows(shape[1], shape[0], tile_size, overlap)
+    screen = TileScreen() if screen is True else screen or None
+    cache = cache if cache is not None else getattr(model, 'tile_cache', None)
+    weights = str(getattr(model, 'ckpt_path', None) or getattr(model, 'cfg', None))
+    pipeline = TilePipeline(path, bands, readers, workers, prefetch or 2 * batch, screen, cache,
+                            key=lambda image: cache.key(image, weights, kwargs))
+    # masks are left as prototypes + coefficients by the predictor and built by the post-processing workers
+    tiles = pipeline.run(windows,
+                         lambda images: model.predict(images, lazy_masks=True, raise_errors=True, **kwargs),
+                         _tile_masks,
+                         batch)
+    tiles = [(w, *_shift(t, w)) for w, t in zip(windows, tiles)]  # per tile: (window, packed, rois, (k, 6) boxes)
+    masks, boxes = _merge_tiles(tiles, merge_iou)
+    LOGGER.info(f'Tiled prediction: {len(windows)} tiles, {sum(len(t[3]) for t in tiles)} tile masks merged '
+                f'into {len(masks[0])}. {pipeline.report()}')
+    result = TiledResult(CompactMasks(masks[0], masks[1], shape), boxes, shape, transform, crs, tiles=len(windows))
+    result.stats = pipeline.stats
+    result.skipped = pipeline.skipped
+    result.cached = pipeline.cached
+    return result
+
+
+def _tile_masks(result):
+    """Extract the packed masks, their rois and the boxes of one tile result, in tile coordinates."""
+    if result is None or result.masks is None or not len(result.masks):
+        return [], np.zeros((0, 4), dtype=np.int64), np.zeros((0, 6), dtype=np.float32)
+    masks = result.masks
+    if isinstance(masks, LazyMasks):
+        masks = masks.compact()
+    elif not isinstance(masks, CompactMasks):
+        masks = CompactMasks.from_dense(masks.data)
+    boxes = result.boxes.data.cpu().numpy().astype(np.float32)
+    boxes[:, :4] = masks.rois  # tight mask boxes, consistent with the merged boxes
+    return list(masks.packed), masks.rois, boxes
+
+
+def _shift(tile, window):
+    """Move a tile's rois and boxes to raster coordinates."""
+    packed, rois, boxes = tile
+    offset = np.array([window.col_off, window.row_off] * 2, dtype=np.int64)
+    boxes = boxes.copy()
+    boxes[:, :4] += offset
+    return packed, rois + offset, boxes
+
+
+def _merge_tiles(tiles, merge_iou):
+    """Union masks that two overlapping tiles both predicted; returns ((packed, rois), boxes) of the merged set."""
+    packed, rois, boxes, offsets = [], [], [], [0]
+    for _, p, r, b in tiles:
+        packed += p
+        rois.append(r)
+        boxes.append(b)
+        offsets.append(len(packed))  # masks of tile t are offsets[t]:offsets[t + 1]
+    if not packed:
+        return ([], np.zeros((0, 4), dtype=np.int64)), np.zeros((0, 6), dtype=np.float32)
+    rois, boxes = np.concatenate(rois), np.concatenate(boxes)
+    masks = CompactMasks(packed, rois, (int(rois[:, 3].max()), int(rois[:, 2].max())))
+    parent = np.arange(len(packed))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    rects = np.array([[w.col_off, w.row_off, w.col_off + w.width, w.row_off + w.height] for w, *_ in tiles])
+    for a, b in _overlapping_tiles([w for w, *_ in tiles]):
+        x1, y1 = max(rects[a, 0], rects[b, 0]), max(rects[a, 1], rects[b, 1])
+        x2, y2 = min(rects[a, 2], rects[b, 2]), min(rects[a, 3], rects[b, 3])
+        shared = (x1, y1, x2, y2)
+        ia, ib = np.arange(offsets[a], offsets[a + 1]), np.arange(offsets[b], offsets[b + 1])
+        ia, ib = ia[_touches(rois[ia], shared)], ib[_touches(rois[ib], shared)]
+        if not len(ia) or not len(ib):
+            continue
+        ra, rb = rois[ia][:, None], rois[ib][None]
+        pairs = np.nonzero((np.minimum(ra[..., 2], rb[..., 2]) > np.maximum(ra[..., 0], rb[..., 0])) &
+                           (np.minimum(ra[..., 3], rb[..., 3]) > np.maximum(ra[..., 1], rb[..., 1])))
+        inside = {}
+        for i, j in zip(ia[pairs[0]], ib[pairs[1]]):
+            for k in (i, j):
+                if k not in inside:
+                    inside[k] = _clip_crop(masks, k, shared)
+            inter = masks.intersection(i, j)
+            union = inside[i] + inside[j] - inter
+            if union and inter / union > merge_iou:
+                parent[find(i)] = find(j)
+
+    groups = {}
+    for i in range(len(packed)):
+        groups.setdefault(find(i), []).append(i)
+    out_packed, out_rois, out_boxes = [], [], []
+    for members in groups.values():
+        best = members[int(np.argmax(boxes[members, 4]))]
+        if len(members) == 1:
+            out_packed.append(packed[best])
+            out_rois.append(rois[best])
+        else:
+            x1, y1 = rois[members, 0].min(), rois[members, 1].min()
+            x2, y2 = rois[members, 2].max(), rois[members, 3].max()
+            union = np.zeros((y2 - y1, x2 - x1), dtype=bool)
+            for k in members:
+                kx1, ky1, kx2, ky2 = rois[k]
+                union[ky1 - y1:ky2 - y1, kx1 - x1:kx2 - x1] |= masks.crop(k)
+            merged = CompactMasks.from_crops([union], [(x1, y1, x2, y2)], masks.orig_shape)
+            out_packed.append(merged.packed[0])
+            out_rois.append(merged.rois[0])
+        out_boxes.append(np.concatenate([out_rois[-1], boxes[best, 4:]]).astype(np.float32))
+    return (out_packed, np.array(out_rois, dtype=np.int64).reshape(-1, 4)), np.array(out_boxes).reshape(-1, 6)
+
+
+def _overlapping_tiles(windows):
+    """
+    Index pairs (a, b), a < b, of the windows that overlap.
+
+    Windows are bucketed by their distinct column and row spans, the grid `tile_windows` lays out. Only the cells whose
+    spans overlap on both axes are compared, a handful of neighbours per tile instead of every other tile.
+    """
+    cols = sorted({(w.col_off, w.width) for w in windows})
+    rows = sorted({(w.row_off, w.height) for w in windows})
+
+    def near(spans):
+        return [[j for j, (s, n) in enumerate(spans) if s < start + size and start < s + n] for start, size in spans]
+
+    col_near, row_near = near(cols), near(rows)
+    col_index = {span: i for i, span in enumerate(cols)}
+    row_index = {span: i for i, span in enumerate(rows)}
+    cell = [(row_index[(w.row_off, w.height)], col_index[(w.col_off, w.width)]) for w in windows]
+    cells = {}
+    for t, rc in enumerate(cell):
+        cells.setdefault(rc, []).append(t)
+    pairs = []
+    for a, (r, c) in enumerate(cell):
+        for rr in row_near[r]:
+            for cc in col_near[c]:
+                pairs += [(a, b) for b in cells.get((rr, cc), ()) if b > a]
+    return sorted(pairs)
+
+
+def _touches(rois, rect):
+    x1, y1, x2, y2 = rect
+    return (rois[:, 0] < x2) & (rois[:, 2] > x1) & (rois[:, 1] < y2) & (rois[:, 3] > y1)
+
+
+def _clip_crop(masks, i, rect):
+    """Number of pixels of mask `i` inside `rect` (x1, y1, x2, y2)."""
+    x1, y1, x2, y2 = masks.rois[i]
+    rx1, ry1, rx2, ry2 = rect
+    return int(masks.crop(i)[max(ry1 - y1, 0):max(ry2 - y1, 0), max(rx1 - x1, 0):max(rx2 - x1, 0)].sum())
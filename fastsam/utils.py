@@ -1,7 +1,12 @@
+import threading
+
 import numpy as np
 import torch
 from PIL import Image
 
+_CLIP_MODELS = {}  # (name, device) -> (model, preprocess), shared by every prompt in the process
+_CLIP_LOCK = threading.Lock()
+
 
 def adjust_bboxes_to_image_border(boxes, image_shape, threshold=20):
     '''Adjust bounding boxes to stick to image border if they are within a certain threshold.
@@ -84,3 +89,14 @@ def image_to_np_ndarray(image):
     elif type(image) is np.ndarray:
         return image
     return None
+
+
+def load_clip(name='ViT-B/32', device='cpu'):
+    '''Load a CLIP model once per process and device; later calls return the same (model, preprocess) pair.'''
+    key = (name, str(device))
+    with _CLIP_LOCK:
+        if key not in _CLIP_MODELS:
+            import clip
+            model, preprocess = clip.load(name, device=device)
+            _CLIP_MODELS[key] = model.eval(), preprocess
+        return _CLIP_MODELS[key]
@@ -0,0 +1,370 @@
+"""
+In-memory vectorization of instance masks into GeoJSON features.
+
+Masks are polygonized with `rasterio.features.shapes` directly from memory, each one on its bounding-box crop with
+the crop's affine transform, so no mask GeoTIFF or GeoJSON file is written and read back. Every instance becomes
+one feature (a Polygon, or a MultiPolygon for masks in several pieces, holes included) carrying its score, class
+and area.
+
+Usage:
+    import rasterio
+    from fastsam import FastSAM
+    from fastsam.vector import mask_features
+
+    model = FastSAM('FastSAM-x.pt')
+    result = model('orthophoto.tif', retina_masks=True, compact_masks=True, conf=0.4, iou=0.9)[0]
+    with rasterio.open('orthophoto.tif') as src:
+        features = mask_features(result, transform=src.transform)
+    geojson = {'type': 'FeatureCollection', 'features': features}
+
+Usage - Stream a FeatureCollection while masks are still being polygonized:
+    from fastsam.vector import iter_geojson, iter_mask_features
+
+    for chunk in iter_geojson(iter_mask_features(result, transform=src.transform, precision=2)):
+        response.write(chunk)
+
+Usage - Lighter payloads for a web map at zoom 16, with a report of the savings:
+    from fastsam.vector import ExportStats, export_features
+
+    stats = ExportStats()
+    features = list(export_features(features, zoom=16, precision=2, stats=stats))
+    print(stats)  # vertices and bytes before/after
+"""
+
+import base64
+import json
+import math
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+import torch
+from affine import Affine
+from rasterio.features import shapes
+
+from ultralytics.yolo.engine.results import Masks
+from ultralytics.yolo.utils import NUM_THREADS
+from .masks import CompactMasks, LabelMap, LazyMasks
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def mask_features(masks, transform=None, scores=None, classes=None, precision=None, workers=NUM_THREADS):
+    """
+    Polygonize instance masks into GeoJSON features, one per mask.
+
+    Args:
+        masks (Results | TiledResult | CompactMasks | LazyMasks | Masks | torch.Tensor | np.ndarray): The masks. For
+            `Results` and `fastsam.tiling.TiledResult` scores and classes are taken from their boxes, and the
+            transform of a `TiledResult` is used unless `transform` is given.
+        transform (affine.Affine, optional): Pixel to CRS transform of the image the masks were predicted on. Masks
+            at a different resolution than the image (no retina_masks) are not supported. Defaults to pixel
+            coordinates.
+        scores (array-like, optional): Per-mask confidence, stored as the 'score' property.
+        classes (array-like, optional): Per-mask class, stored as the 'class' property.
+        precision (int, optional): Round coordinates to this many decimals, e.g. 2 for centimetres in a metric CRS.
+        workers (int): Threads polygonizing masks concurrently.
+
+    Returns:
+        (List[dict]): GeoJSON features with properties 'value' (1-based instance id), 'area' (in CRS units, pixels
+            without a transform) and, when known, 'score' and 'class'. Empty masks are dropped.
+    """
+    return list(iter_mask_features(masks, transform, scores, classes, precision, workers))
+
+
+def iter_mask_features(masks, transform=None, scores=None, classes=None, precision=None, workers=NUM_THREADS):
+    """Generator version of `mask_features`, yielding features in mask order as they are polygonized."""
+    masks, transform, scores, classes = _instances(masks, transform, scores, classes)
+    transform = transform or Affine.identity()
+    pixel_area = abs(transform.determinant)
+
+    def polygonize(i):
+        x1, y1, x2, y2 = masks.rois[i]
+        crop = masks.crop(i)
+        if not crop.any():
+            return None
+        polygons = [_round(g['coordinates'], precision) for g, _ in
+                    shapes(crop.view(np.uint8), mask=crop, transform=transform * Affine.translation(x1, y1))]
+        return _feature(polygons, i + 1, int(crop.sum()) * pixel_area, scores, classes, i)
+
+    with ThreadPool(max(1, min(workers, len(masks)))) as pool:
+        for feature in pool.imap(polygonize, range(len(masks))):
+            if feature is not None:
+                yield feature
+
+
+def label_features(labels, transform=None, precision=None):
+    """
+    Polygonize a label raster in one pass, one feature per label (the visible part of each instance).
+
+    Args:
+        labels (LabelMap | np.ndarray): Instance raster, 0 is background. A `LabelMap` adds its 'score' and 'cls'
+            columns to the features.
+        transform (affine.Affine, optional): Pixel to CRS transform of the raster. Defaults to pixel coordinates.
+        precision (int, optional): Round coordinates to this many decimals.
+
+    Returns:
+        (List[dict]): GeoJSON features with properties 'value' (the label), 'area' and, when known, 'score' and
+            'class', ordered by label.
+    """
+    instances = labels.instances if isinstance(labels, LabelMap) else {}
+    labels = labels.labels if isinstance(labels, LabelMap) else np.asarray(labels)
+    if labels.dtype not in (np.uint8, np.uint16, np.int16, np.int32):
+        labels = labels.astype(np.int32)
+    transform = transform or Affine.identity()
+    polygons = {}
+    for g, value in shapes(labels, mask=labels != 0, transform=transform):
+        polygons.setdefault(int(value), []).append(_round(g['coordinates'], precision))
+    counts = np.bincount(labels.ravel().astype(np.int64), minlength=max(polygons, default=0) + 1)
+    pixel_area = abs(transform.determinant)
+    return [_feature(polygons[v], v, int(counts[v]) * pixel_area, instances.get('score'), instances.get('cls'), v - 1)
+            for v in sorted(polygons)]
+
+
+def dumps(obj):
+    """Serialize `obj` to JSON bytes, with orjson when it is installed (several times faster on coordinates)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def iter_geojson(features, chunk_size=1 << 16, **members):
+    """
+    Serialize features as one GeoJSON FeatureCollection, in chunks, while `features` is still being produced.
+
+    Args:
+        features (Iterable[dict]): GeoJSON features, e.g. from `iter_mask_features`.
+        chunk_size (int): Bytes buffered before a chunk is yielded.
+        **members: Extra top-level members written before the features (e.g. status=...).
+
+    Yields:
+        (bytes): Consecutive pieces of the document.
+    """
+    head = dumps(dict(members, type='FeatureCollection'))
+    buffer = [head[:-1] + b',"features":[']
+    size, sep = len(buffer[0]), b''
+    for feature in features:
+        buffer.append(sep + dumps(feature))
+        size, sep = size + len(buffer[-1]), b','
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    buffer.append(b']}')
+    yield b''.join(buffer)
+
+
+def iter_ndjson(features, chunk_size=1 << 16):
+    """Serialize features as newline-delimited JSON, one feature per line, in chunks of about `chunk_size` bytes."""
+    buffer, size = [], 0
+    for feature in features:
+        buffer.append(dumps(feature) + b'\n')
+        size += len(buffer[-1])
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+WEB_MERCATOR_RESOLUTION = 156543.03392804097  # metres per 256 px tile pixel at zoom 0 on the equator
+
+
+def zoom_tolerance(zoom, pixels=0.5, latitude=None):
+    """
+    Simplification tolerance matching a web-map zoom level: `pixels` screen pixels at that zoom.
+
+    Args:
+        zoom (float): Web-map zoom level (256 px tiles).
+        pixels (float): Tolerance in screen pixels; half a pixel is visually lossless.
+        latitude (float, optional): Return ground metres at this latitude, for metric CRSs other than Web Mercator.
+            By default the tolerance is in EPSG:3857 units.
+    """
+    resolution = WEB_MERCATOR_RESOLUTION / 2 ** zoom
+    if latitude is not None:
+        resolution *= math.cos(math.radians(latitude))
+    return resolution * pixels
+
+
+class ExportStats:
+    """Vertex and byte counts before and after `export_features`, to tune tolerance and precision."""
+
+    def __init__(self):
+        self.features = 0
+        self.vertices_in = 0
+        self.vertices_out = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def __str__(self):
+        return (f'{self.features} features, vertices {self.vertices_in} -> {self.vertices_out} '
+                f'({_reduction(self.vertices_in, self.vertices_out)}), '
+                f'bytes {self.bytes_in} -> {self.bytes_out} ({_reduction(self.bytes_in, self.bytes_out)})')
+
+
+def export_features(features, tolerance=None, zoom=None, precision=None, encoding=None, stats=None):
+    """
+    Simplify, quantize and optionally binary-encode features on their way out.
+
+    Simplification is Douglas-Peucker with shapely's `preserve_topology=True`: every geometry stays valid (rings
+    keep their orientation and holes, nothing self-intersects or collapses). Neighbouring instances are simplified
+    independently, so a shared edge may move by up to the tolerance on either side. Quantization rounds coordinates
+    to `precision` decimals and drops the vertices that then repeat.
+
+    Args:
+        features (Iterable[dict]): GeoJSON features, e.g. from `iter_mask_features`.
+        tolerance (float, optional): Simplification tolerance in CRS units.
+        zoom (float, optional): Derive the tolerance from a web-map zoom level instead, see `zoom_tolerance`.
+        precision (int, optional): Decimals kept in the coordinates, e.g. 2 for centimetres in a metric CRS.
+        encoding (str, optional): 'twkb' replaces each geometry with its Tiny Well-Known Binary encoding, base64 in
+            the feature's 'twkb' member ('geometry' is set to null); needs `precision`.
+        stats (ExportStats, optional): Accumulates vertex and byte counts; measuring bytes serializes each feature
+            twice, so only pass it when tuning.
+
+    Returns:
+        (Iterator[dict]): The exported features, produced lazily; features whose geometry vanishes are dropped.
+    """
+    if encoding not in (None, 'twkb'):
+        raise ValueError(f"Unsupported geometry encoding '{encoding}', expected None or 'twkb'.")
+    if encoding and precision is None:
+        raise ValueError('TWKB encoding needs a coordinate precision.')
+    if zoom is not None and tolerance is None:
+        tolerance = zoom_tolerance(zoom)
+    return _export(features, tolerance, precision, encoding, stats)  # arguments are checked before the first feature
+
+
+def _export(features, tolerance, precision, encoding, stats):
+    if tolerance:
+        from shapely.geometry import mapping, shape
+    for feature in features:
+        geometry = feature['geometry']
+        if stats is not None:
+            stats.vertices_in += _count_vertices(geometry)
+            stats.bytes_in += len(dumps(feature))
+        if tolerance:
+            geometry = mapping(shape(geometry).simplify(tolerance, preserve_topology=True))
+        polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        if precision is not None:
+            polygons = [p for p in (_quantize(p, precision) for p in polygons) if p]
+        if not polygons:
+            continue
+        feature = dict(feature)
+        if encoding == 'twkb':
+            feature['geometry'] = None
+            feature['twkb'] = base64.b64encode(_twkb(polygons, precision)).decode()
+        elif len(polygons) == 1:
+            feature['geometry'] = {'type': 'Polygon', 'coordinates': polygons[0]}
+        else:
+            feature['geometry'] = {'type': 'MultiPolygon', 'coordinates': polygons}
+        if stats is not None:
+            stats.features += 1
+            stats.vertices_out += sum(len(ring) for p in polygons for ring in p)
+            stats.bytes_out += len(dumps(feature))
+        yield feature
+
+
+def _reduction(before, after):
+    return f'-{1 - after / before:.0%}' if before else 'n/a'
+
+
+def _count_vertices(geometry):
+    polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+    return sum(len(ring) for p in polygons for ring in p)
+
+
+def _quantize(polygon, precision):
+    """Round a polygon's rings and drop repeated vertices; None if the exterior degenerates."""
+    rings = []
+    for ring in polygon:
+        ring = np.round(np.asarray(ring, dtype=np.float64), precision)
+        ring = ring[np.r_[True, (ring[1:] != ring[:-1]).any(1)]]
+        if len(ring) >= 4:  # closed ring with at least three distinct corners
+            rings.append(ring.tolist())
+        elif not rings:
+            return None
+    return rings
+
+
+def _twkb(polygons, precision):
+    """Encode polygons as a TWKB Polygon or MultiPolygon: zigzag varint deltas on a 10^-precision grid."""
+    kind = 3 if len(polygons) == 1 else 6
+    out = [bytes([kind | int(_zigzag([precision])[0]) << 4, 0])]
+    if kind == 6:
+        out.append(_varints([len(polygons)]))
+    last = np.zeros(2, dtype=np.int64)
+    scale = 10.0 ** precision
+    for polygon in polygons:
+        out.append(_varints([len(polygon)]))
+        for ring in polygon:
+            xy = np.round(np.asarray(ring) * scale).astype(np.int64)
+            deltas = np.diff(xy, axis=0, prepend=last[None])
+            last = xy[-1]
+            out.append(_varints([len(xy)]))
+            out.append(_varints(_zigzag(deltas.ravel())))
+    return b''.join(out)
+
+
+def _zigzag(values):
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def _varints(values):
+    """LEB128 unsigned varints of a sequence of non-negative integers, vectorized."""
+    v = np.asarray(values, dtype=np.uint64)
+    shifts = np.arange(10, dtype=np.uint64) * np.uint64(7)
+    groups = (v[:, None] >> shifts) & np.uint64(0x7F)
+    n = 1 + ((v[:, None] >> shifts[1:]) > 0).sum(1)  # bytes per value
+    k = np.arange(10)
+    groups[k < (n - 1)[:, None]] |= np.uint64(0x80)
+    return groups[k < n[:, None]].astype(np.uint8).tobytes()
+
+
+def _round(coordinates, precision):
+    """Round the rings of a polygon's coordinates to `precision` decimals."""
+    if precision is None:
+        return coordinates
+    return [np.round(np.asarray(ring), precision).tolist() for ring in coordinates]
+
+
+def _instances(masks, transform, scores, classes):
+    """Normalize the supported inputs to (CompactMasks, transform, scores, classes)."""
+    boxes = getattr(masks, 'boxes', None)
+    if hasattr(masks, 'transform') and hasattr(masks, 'masks'):  # TiledResult
+        transform = transform or masks.transform
+        scores = boxes[:, 4] if scores is None else scores
+        classes = boxes[:, 5] if classes is None else classes
+        masks = masks.masks
+    elif hasattr(masks, 'masks'):  # Results
+        scores = boxes.conf if scores is None and boxes is not None else scores
+        classes = boxes.cls if classes is None and boxes is not None else classes
+        masks = masks.masks
+    if masks is None:
+        masks = CompactMasks([], np.zeros((0, 4)), (0, 0))
+    elif isinstance(masks, LazyMasks):
+        masks = masks.compact()
+    elif not isinstance(masks, CompactMasks):
+        masks = CompactMasks.from_dense(masks.data if isinstance(masks, Masks) else masks)
+    return masks, transform, _to_list(scores), _to_list(classes)
+
+
+def _feature(polygons, value, area, scores, classes, i):
+    if len(polygons) == 1:
+        geometry = {'type': 'Polygon', 'coordinates': polygons[0]}
+    else:
+        geometry = {'type': 'MultiPolygon', 'coordinates': polygons}
+    properties = {'value': value, 'area': area}
+    if scores is not None:
+        properties['score'] = float(scores[i])
+    if classes is not None:
+        properties['class'] = int(classes[i])
+    return {'type': 'Feature', 'geometry': geometry, 'properties': properties}
+
+
+def _to_list(x):
+    if x is None:
+        return None
+    if isinstance(x, torch.Tensor):
+        x = x.cpu().numpy()
+    return np.asarray(x).tolist()
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, make_response
+from flask import Flask, Response, request, jsonify, make_response
 from flask_cors import CORS
 import requests
 import os
@@ -19,8 +19,17 @@ from pyproj import Transformer
 # for preview
 from rasterio.windows import Window
 
-# for converting geotiff to geojson
-import json
+# for converting masks to geojson features in memory
+from fastsam.mvt import MBTilesStore, write_tiles
+from fastsam.vector import (ExportStats, export_features, iter_geojson, iter_mask_features, iter_ndjson,
+                            label_features)
+
+# resident models shared by all requests
+from fastsam.registry import ModelRegistry, warmup_fastsam
+from fastsam.cache import ResultCache, TileCache
+
+# mask rasters are written as Cloud-Optimized GeoTIFFs (tiled, deflate, mode overviews)
+from fastsam.cog import to_cog
 
 # LOGGING #
 import logging
@@ -34,6 +43,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Load each model once per process instead of once per request. FastSAM-x is loaded and warmed up at startup,
+# FastSAM-s and LangSAM on first use. Idle models are evicted least-recently-used first once the resident set
+# exceeds MODEL_MEMORY_BUDGET_MB (unlimited if unset).
+MODEL_MEMORY_BUDGET_MB = os.environ.get('MODEL_MEMORY_BUDGET_MB')
+MODELS = ModelRegistry(memory_budget=int(MODEL_MEMORY_BUDGET_MB) * 1024 ** 2 if MODEL_MEMORY_BUDGET_MB else None)
+
+# Everything-mode results keyed by image content and inference params, so repeated prompts on the same upload skip
+# the forward pass.
+RESULTS = ResultCache(max_bytes=int(os.environ.get('RESULT_CACHE_MB', 2048)) * 1024 ** 2)
+
+# Vector tiles of the last 'mvt' request, served by /tiles/{z}/{x}/{y}.pbf.
+MVT_PATH = './output/segmentation.mbtiles'
+
+# Per-tile results of tiled jobs, on disk, so re-runs and overlapping uploads only predict tiles not seen before.
+TILES = TileCache(os.environ.get('TILE_CACHE_DIR', './cache/tiles'),
+                  max_bytes=int(os.environ.get('TILE_CACHE_MB', 10240)) * 1024 ** 2)
+
+# Rasters with a side longer than this are segmented in overlapping 1024 px tiles (fastsam.tiling), merged back into one
+# label raster.
+TILED_MIN_SIZE = int(os.environ.get('TILED_MIN_SIZE', 4096))
+
+
+def load_fastsam(weights):
+    sam = SamGeo(model=weights)
+    sam.cache_predictor = True  # keep the warmed-up predictor between requests
+    sam.result_cache = RESULTS
+    sam.tile_cache = TILES
+    return sam
+
+
+MODELS.register('FastSAM-s', lambda: load_fastsam("FastSAM-s.pt"), warmup=warmup_fastsam)
+MODELS.register('FastSAM-x', lambda: load_fastsam("FastSAM-x.pt"), warmup=warmup_fastsam, preload=True)
+MODELS.register('LangSAM', LangSAM)
+
 
 
 app = Flask(__name__)
@@ -45,6 +88,10 @@ CORS(app, resources={
         "origins": ["http://localhost:3000"],
         "methods": ["POST"],
         "allow_headers": ["Content-Type"]
+    },
+    r"/tiles/*": {
+        "origins": ["http://localhost:3000"],
+        "methods": ["GET"]
     }
 })
 
@@ -193,20 +240,61 @@ def polygon_to_bbox(polygon, minlat, maxlat, minlon, maxlon, imagepxwidth, image
             xs, ys = zip(*pixel_coords)
             return [min(xs), min(ys), max(xs), max(ys)]
 
-def get_preview(file_path):
-    sam = SamGeo(model="FastSAM-x.pt")
+def prompt_features(sam, file_path, precision=None):
+    """
+    GeoJSON features of the masks of the last prompt run on `sam`, polygonized in memory.
+
+    The masks are taken while the model is held; the returned generator polygonizes them lazily, so a streamed
+    response can start before the last mask is traced. Everything mode uses `everything_features` instead.
+    """
+    masks = sam.annotations
+    with rasterio.open(file_path) as src:
+        transform = src.transform
+    return iter_mask_features(masks, transform=transform, precision=precision)
+
+
+def everything_features(sam, file_path, precision=None):
+    """
+    GeoJSON features of an everything-mode segmentation of `file_path`, scored with the detection confidences.
+
+    Predicts on the model directly with `lazy_masks=True` instead of going through `sam.everything_prompt`, which
+    builds every mask at full image resolution; each mask is only upsampled within its box while it is traced.
+    Uses the same settings as `SamGeo.set_image`.
+    """
+    results = sam.predict(file_path, retina_masks=True, imgsz=1024, conf=0.25, iou=0.9, lazy_masks=True,
+                          raise_errors=True)
+    with rasterio.open(file_path) as src:
+        transform = src.transform
+    return iter_mask_features(results[0] if results else None, transform=transform, precision=precision)
+
+
+def raster_features(file_path, precision=None):
+    """GeoJSON features of a mask raster, one per value, without writing a vector file."""
+    with rasterio.open(file_path) as src:
+        return label_features(src.read(1), transform=src.transform, precision=precision)
+
+
+def log_export(features, stats):
+    """Pass features through, logging the vertex and byte reduction of the export once all are sent."""
+    yield from features
+    logger.info(f'Vector export: {stats}')
+
+
+def get_preview(file_path, vector=False, precision=None):
     cropped_output_path = './output/preview_before_sam.tif'
     POSITION = 'center'
     extract_patch(file_path, cropped_output_path, POSITION)
 
-    sam.set_image(cropped_output_path)
-
     output_path_after_sam = './output/preview_after_sam3.tif'
-    sam.everything_prompt(output=output_path_after_sam)
+    with MODELS.acquire('FastSAM-x') as sam:
+        if vector:
+            return everything_features(sam, cropped_output_path, precision)
+        sam.set_image(cropped_output_path)
+        sam.everything_prompt(output=output_path_after_sam)
 
-    return output_path_after_sam
+    return to_cog(output_path_after_sam)
 
-def point_prompt(file_path, positivePoints, negativePoints):
+def point_prompt(file_path, positivePoints, negativePoints, vector=False, precision=None):
         # Initialize an empty list for all points
         all_points = []
 
@@ -248,13 +336,15 @@ def point_prompt(file_path, positivePoints, negativePoints):
         points = [geographic_to_pixel(
             lat, lon, minlat, maxlat, minlon, maxlon, imagepxwidth, imagepxheight) for lon, lat in all_points]
 
-        sam = SamGeo(model="FastSAM-x.pt")
-        sam.set_image(file_path)
         output_path = "./output/point_segmentation2.tif"
-        sam.point_prompt(points=points, pointlabel=pointlabel, output = output_path)
-        return output_path
-
-def box_prompt(file_path, listOfPolygons):
+        with MODELS.acquire('FastSAM-x') as sam:
+            sam.set_image(file_path)
+            sam.point_prompt(points=points, pointlabel=pointlabel, output=None if vector else output_path)
+            if vector:
+                return prompt_features(sam, file_path, precision)
+        return to_cog(output_path)
+
+def box_prompt(file_path, listOfPolygons, vector=False, precision=None):
         
     transformer = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
 
@@ -276,25 +366,36 @@ def box_prompt(file_path, listOfPolygons):
     bboxes = [polygon_to_bbox(polygon, minlat, maxlat, minlon, maxlon, imagepxwidth, imagepxheight) for polygon in listOfPolygons]
     print(bboxes)
         # Use the bounding boxes with the box_prompt function
-    sam = SamGeo(model="FastSAM-x.pt")
-    sam.set_image(file_path)
     output_path = './output/box_segmentation3.tif'
-    sam.box_prompt(bboxes=bboxes, output=output_path)
-    return output_path
+    with MODELS.acquire('FastSAM-x') as sam:
+        sam.set_image(file_path)
+        sam.box_prompt(bboxes=bboxes, output=None if vector else output_path)
+        if vector:
+            return prompt_features(sam, file_path, precision)
+    return to_cog(output_path)
 
 
-def text_prompt(file_path, text_prompt):
-    sam = LangSAM()
+def text_prompt(file_path, text_prompt, vector=False, precision=None):
     output_path = './output/text_segmentation5.tif'
-    sam.predict(file_path, text_prompt, box_threshold=0.30, text_threshold=0.30, output = output_path)
-    return output_path
+    with MODELS.acquire('LangSAM') as sam:
+        sam.predict(file_path, text_prompt, box_threshold=0.30, text_threshold=0.30, output = output_path)
+    return raster_features(output_path, precision) if vector else to_cog(output_path)
 
-def everything_prompt(file_path): 
-     sam = SamGeo(model="FastSAM-x.pt")
-     sam.set_image(file_path)
+def everything_prompt(file_path, vector=False, precision=None): 
      output_path = './output/everything_segmentation1.tif'
-     sam.everything_prompt(output=output_path)
-     return output_path
+     with rasterio.open(file_path) as src:
+         tiled = max(src.width, src.height) > TILED_MIN_SIZE
+     with MODELS.acquire('FastSAM-x') as sam:
+         if tiled:
+             # segment at native resolution tile by tile instead of downscaling the whole raster to imgsz
+             result = sam.predict_tiled(file_path, tile_size=1024, overlap=128, conf=0.4, iou=0.9)
+             return iter_mask_features(result, precision=precision) if vector else result.to_raster(output_path)
+         if vector:
+             return everything_features(sam, file_path, precision)
+         sam.set_image(file_path)
+         sam.everything_prompt(output=output_path)
+     # SamGeo writes a striped GeoTIFF; re-lay it out as a COG once the model is released
+     return to_cog(output_path)
 
 def download_file(signed_url, fileName):
       # Download the file from the signed URL
@@ -335,68 +436,82 @@ def test():
 
         
 
+        # vector requests are polygonized in memory; the mode functions then return the features instead of a raster
+        vector = data.get('data_format') in ('vector', 'mvt')
+        precision = data.get('precision')  # decimals kept in the coordinates, all if unset
+        precision = None if precision is None else int(precision)
         mode = data.get('mode')
         match mode:
             case 'text_prompt':
                 textPrompt = data.get('textPrompt')
                 if not textPrompt:
                     raise ValueError("Missing parameter: 'textPrompt' is required for text mode.")
-                output_path = text_prompt(original_file_path, textPrompt)
+                output_path = text_prompt(original_file_path, textPrompt, vector, precision)
 
             case 'point_prompt':
                 positivePoints = data.get('positivePoints')
                 negativePoints = data.get('negativePoints')
                 # if not positivePoints or negativePoints: 
                 #      logger.error('No Points detected.')
-                output_path = point_prompt(original_file_path, positivePoints, negativePoints)
+                output_path = point_prompt(original_file_path, positivePoints, negativePoints, vector, precision)
 
             case 'box_prompt':
                 listOfPolygons = data.get('listOfPolygons')
                 if not listOfPolygons:
                     raise ValueError("Missing parameter: 'listOfPolygons' is required for polygon mode.")
-                output_path = box_prompt(original_file_path, listOfPolygons)
+                output_path = box_prompt(original_file_path, listOfPolygons, vector, precision)
 
             case 'everything_prompt':
-                output_path = everything_prompt(original_file_path)
+                output_path = everything_prompt(original_file_path, vector, precision)
 
             case 'preview':
-                output_path = get_preview(original_file_path)
+                output_path = get_preview(original_file_path, vector, precision)
 
             case _:
                 raise ValueError("Invalid mode provided.")
 
-        data_format = data.get('data_format') 
-        if data_format == 'vector':
+        message = "File processed successfully"
+        if data.get('data_format') == 'mvt':
+            # vector tile pyramid for the web map; tiles are then fetched one by one from /tiles/{z}/{x}/{y}.pbf
+            with rasterio.open(original_file_path) as src:
+                crs = src.crs
+            with MBTilesStore(MVT_PATH) as store:
+                metadata = write_tiles(output_path, store, crs=crs, minzoom=data.get('minzoom'),
+                                       maxzoom=data.get('maxzoom'))
+            response = make_response(jsonify({
+                "status": "success",
+                "message": message,
+                "tiles": "/tiles/{z}/{x}/{y}.pbf",
+                "minzoom": metadata['minzoom'],
+                "maxzoom": metadata['maxzoom'],
+                "bounds": metadata['bounds']
+            }))
+            response.headers['Access-Control-Allow-Origin'] = 'http://localhost:3000'
+            return response
+        if vector and (data.get('zoom') is not None or data.get('tolerance') or data.get('encoding')):
+            # lighter payloads: simplify for the requested zoom/tolerance, quantize, optionally encode as TWKB
+            stats = ExportStats()
+            output_path = log_export(export_features(output_path,
+                                                     tolerance=data.get('tolerance'),
+                                                     zoom=data.get('zoom'),
+                                                     precision=precision,
+                                                     encoding=data.get('encoding'),
+                                                     stats=stats), stats)
+        stream = data.get('stream')  # 'geojson' or 'ndjson': send features as they are polygonized
+        if vector and stream == 'ndjson':
+            response = Response(iter_ndjson(output_path), mimetype='application/x-ndjson')
+        elif vector and stream:
+            response = Response(iter_geojson(output_path, status="success", message=message),
+                                mimetype='application/geo+json')
+        else:
+            listOfFeatures = list(output_path) if vector else []
+
+            response = make_response(jsonify({
+                "status": "success",
+                "message": message,
+                "features": listOfFeatures 
             
-            output_raster = output_path
-            output_vector = './output/output_vector.geojson'
-            sam = SamGeo(model="FastSAM-x.pt")
-            sam.raster_to_vector(output_raster, output_vector)
-
-            listOfFeatures = []
-            
-            # comment this out 
-            # output_vector = './images/sample_image.geojson'
-
-            # Open and read the output_vector GeoJSON file
-            with open(output_vector, 'r') as file:
-                geojson_data = json.load(file)
-
-                # Check if the data is in the correct format
-                if 'features' in geojson_data:
-                    # Iterate through each feature and add it to the list
-                    for feature in geojson_data['features']:
-                        listOfFeatures.append(feature)
-
-
-             
-
-        response = make_response(jsonify({
-            "status": "success",
-            "message": "File processed successfully",
-            "features": listOfFeatures 
-        
-        }))
+            }))
         response.headers['Access-Control-Allow-Origin'] = 'http://localhost:3000'
         return response
 
@@ -408,6 +523,20 @@ def test():
         }), 500
 
 
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.pbf', methods=['GET'])
+def tiles(z, x, y):
+    """Serve one vector tile of the last 'mvt' job; empty tiles are 204 so map clients skip them."""
+    if not os.path.isfile(MVT_PATH):
+        return jsonify({"status": "error", "message": "No vector tiles generated yet."}), 404
+    with MBTilesStore(MVT_PATH) as store:
+        data = store.get(z, x, y)
+    if data is None:
+        return Response(status=204)
+    response = Response(data, mimetype='application/vnd.mapbox-vector-tile')
+    response.headers['Content-Encoding'] = 'gzip'  # MBTiles stores gzipped tiles
+    return response
+
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
 
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from fastsam.cache import ResultCache, TileCache, _rle_decode, _rle_encode
+from ultralytics.yolo.engine.results import Results
+
+
+@pytest.mark.parametrize('mask', [
+    np.zeros((0, 0), dtype=bool),
+    np.zeros((3, 5), dtype=bool),
+    np.ones((4, 4), dtype=bool),
+    np.eye(6, dtype=bool),
+    np.random.default_rng(0).random((17, 23)) < 0.3])
+def test_rle_round_trip(mask):
+    counts = _rle_encode(mask)
+    assert counts.sum() == mask.size
+    assert (_rle_decode(counts, mask.shape) == mask).all()
+
+
+def test_tile_cache_round_trip(tmp_path):
+    rng = np.random.default_rng(0)
+    crops = [rng.random((h, w)) < 0.5 for h, w in [(3, 7), (10, 10), (1, 1)]]
+    rois = np.array([[5, 5, 12, 8], [0, 0, 10, 10], [40, 2, 41, 3]])
+    boxes = np.concatenate([rois, rng.random((3, 2))], 1).astype(np.float32)
+    tile = [np.packbits(c) for c in crops], rois, boxes
+    cache = TileCache(tmp_path)
+    key = cache.key(np.zeros((8, 8, 3), dtype=np.uint8), 'FastSAM-x.pt', {'conf': 0.4})
+    assert cache.get(key) is None
+    cache.put(key, tile)
+    packed, got_rois, got_boxes = TileCache(tmp_path).get(key)  # a new instance reads the same directory
+    assert all((a == b).all() for a, b in zip(packed, tile[0]))
+    assert (got_rois == rois).all() and (got_boxes == boxes).all()
+
+
+def test_tile_cache_key_depends_on_args():
+    cache_key = TileCache.key
+    image = np.zeros((8, 8, 3), dtype=np.uint8)
+    assert cache_key(None, image, 'm', {'conf': 0.4}) == cache_key(None, image.copy(), 'm', {'conf': 0.4})
+    assert cache_key(None, image, 'm', {'conf': 0.4}) != cache_key(None, image, 'm', {'conf': 0.5})
+    assert cache_key(None, image, 'm', {}) != cache_key(None, image + 1, 'm', {})
+
+
+def test_tile_cache_evicts_least_recently_used(tmp_path):
+    tile = [np.packbits(np.ones((50, 50), dtype=bool))], np.array([[0, 0, 50, 50]]), np.zeros((1, 6), np.float32)
+    cache = TileCache(tmp_path, max_bytes=1)
+    cache.put('a' * 32, tile)
+    cache.put('b' * 32, tile)
+    assert len(cache) == 1 and 'b' * 32 in cache and cache.get('a' * 32) is None
+
+
+def _results(nbytes=300):
+    return [Results(np.zeros((nbytes // 3, 1, 3), dtype=np.uint8), path='', names={0: 'object'})]
+
+
+def test_result_cache_evicts_least_recently_used_by_bytes():
+    cache = ResultCache(max_bytes=700)
+    first, second = _results(), _results()
+    cache.put('a', first)
+    cache.put('b', second)
+    assert cache.get('a') is first  # b is now the least recently used
+    cache.put('c', _results())
+    assert 'a' in cache and 'b' not in cache and 'c' in cache
+    assert cache.nbytes == 600
+    cache.put('d', _results(900))  # larger than the whole cache, not stored
+    assert 'd' not in cache and cache.nbytes == 600
+
+
+def test_result_cache_key_depends_on_result_args(tmp_path):
+    cache = ResultCache()
+    image = np.random.default_rng(0).integers(0, 256, (16, 16, 3), dtype=np.uint8)
+    args = {'conf': 0.4, 'iou': 0.9, 'imgsz': 1024, 'retina_masks': True}
+    key = cache.key(image, 'FastSAM-x.pt', args)
+    assert cache.key(image.copy(), 'FastSAM-x.pt', {**args, 'save': True, 'verbose': False}) == key
+    assert cache.key(torch.from_numpy(image), 'FastSAM-x.pt', args) == key  # same pixels, same key
+    assert cache.key(image, 'FastSAM-x.pt', {**args, 'conf': 0.5}) != key
+    assert cache.key(image, 'FastSAM-s.pt', args) != key
+    assert cache.key(str(tmp_path), 'FastSAM-x.pt', args) is None  # directories are not cacheable
+
+    path = tmp_path / 'image.npy'
+    path.write_bytes(b'first')
+    first = cache.key(str(path), 'FastSAM-x.pt', args)
+    assert cache.key(path, 'FastSAM-x.pt', args) == first
+    path.write_bytes(b'second')
+    os.utime(path, ns=(0, 1))  # a rewritten file is hashed again
+    assert cache.key(str(path), 'FastSAM-x.pt', args) != first
+
+
+def test_result_cache_hits_and_misses():
+    cache = ResultCache()
+    results = _results()
+    assert cache.get('a') is None
+    cache.put('a', results)
+    assert cache.get('a') is results
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.clear()
+    assert cache.get('a') is None and cache.nbytes == 0
@@ -0,0 +1,50 @@
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+from fastsam.cog import to_cog, write_cog
+from fastsam.masks import LabelMap
+
+
+def _labels(shape=(1300, 1100)):
+    labels = np.zeros(shape, dtype=np.uint16)
+    rng = np.random.default_rng(0)
+    for i in range(1, 60):
+        y, x = rng.integers(0, shape[0] - 100), rng.integers(0, shape[1] - 100)
+        labels[y:y + 90, x:x + 70] = i
+    return labels
+
+
+def test_write_cog_layout_and_overviews(tmp_path):
+    labels = _labels()
+    transform = from_origin(500000, 4000000, 0.5, 0.5)
+    path = write_cog(str(tmp_path / 'labels.tif'), labels.shape, lambda w: labels[w.toslices()], transform=transform,
+                     crs='EPSG:32633', block_size=1024)
+    with rasterio.open(path) as ds:
+        assert ds.tags(ns='IMAGE_STRUCTURE')['LAYOUT'] == 'COG'
+        assert ds.block_shapes == [(512, 512)] and ds.overviews(1) == [2, 4]
+        assert ds.nodata == 0 and ds.crs.to_epsg() == 32633
+        assert (ds.read(1) == labels).all()
+        overview = ds.read(1, out_shape=(labels.shape[0] // 4, labels.shape[1] // 4))
+        assert set(np.unique(overview)) <= set(np.unique(labels))  # mode resampling never invents ids
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['labels.tif']
+
+
+def test_label_map_to_raster(tmp_path):
+    labels = _labels((300, 200))
+    path = LabelMap(labels, {'index': np.arange(labels.max())}).to_raster(str(tmp_path / 'labels.tif'))
+    with rasterio.open(path) as ds:
+        assert ds.dtypes == ('uint16',) and (ds.read(1) == labels).all()
+
+
+def test_to_cog_in_place(tmp_path):
+    path = str(tmp_path / 'mask.tif')
+    mask = (_labels() > 0).astype(np.uint8)
+    with rasterio.open(path, 'w', driver='GTiff', height=mask.shape[0], width=mask.shape[1], count=1,
+                       dtype='uint8') as dst:  # striped, uncompressed, as SamGeo writes it
+        dst.write(mask, 1)
+    assert to_cog(path) == path
+    with rasterio.open(path) as ds:
+        assert ds.tags(ns='IMAGE_STRUCTURE')['LAYOUT'] == 'COG' and ds.overviews(1) == [2, 4]
+        assert (ds.read(1) == mask).all()
+    assert [p.name for p in tmp_path.iterdir()] == ['mask.tif']
@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+import torch
+
+from fastsam.masks import BoxIndex, CompactMasks, LabelMap, LazyMasks, contained_masks
+
+
+def _random_masks(n=6, shape=(48, 64), seed=0):
+    rng = np.random.default_rng(seed)
+    masks = np.zeros((n, *shape), dtype=bool)
+    for mask in masks:
+        x, y = rng.integers(0, shape[1] - 8), rng.integers(0, shape[0] - 8)
+        mask[y:y + rng.integers(2, 20), x:x + rng.integers(2, 30)] = rng.random((1, 1)) < 2
+        mask &= rng.random(shape) < 0.8  # ragged, with holes
+    masks[-1] = False  # an empty mask
+    return masks
+
+
+def test_compact_masks_match_dense():
+    dense = _random_masks()
+    masks = CompactMasks.from_dense(dense)
+    assert (masks.data.numpy() == dense).all()
+    assert (masks.areas().numpy() == dense.sum((1, 2))).all()
+    assert (masks.decode([3, 1]) == dense[[3, 1]]).all()
+    points = [[5, 5], [20, 30], [63, 47]]
+    expected = np.array([[m[y, x] for x, y in points] for m in dense])
+    assert (masks.contains(points).cpu().numpy() == expected).all()
+
+
+def test_compact_masks_pack_tight_boxes():
+    dense = _random_masks()
+    masks = CompactMasks.from_dense(dense)
+    for (x1, y1, x2, y2), mask in zip(masks.rois, dense[:-1]):
+        ys, xs = np.nonzero(mask)
+        assert (x1, y1, x2, y2) == (xs.min(), ys.min(), xs.max() + 1, ys.max() + 1)
+    assert masks.nbytes < dense.nbytes / 8
+
+
+def test_lazy_masks_compact_matches_materialize():
+    torch.manual_seed(0)
+    protos = torch.randn(32, 40, 40)
+    coeffs = torch.randn(5, 32)
+    boxes = torch.tensor([[0, 0, 80, 80], [10, 5, 50, 60], [30, 30, 31, 79], [60, 0, 80, 20], [5, 5, 5, 5]]).float()
+    masks = LazyMasks(protos, coeffs, boxes, (80, 80))
+    dense = masks.materialize().numpy() > 0.5
+    assert (masks.compact().data.numpy() == dense).all()
+    assert (masks.compact([3, 1]).data.numpy() == dense[[3, 1]]).all()
+
+
+def test_label_map_smallest_mask_on_top():
+    dense = np.zeros((2, 10, 10), dtype=bool)
+    dense[0, :, :] = True
+    dense[1, 2:4, 2:4] = True
+    labels = LabelMap.from_masks(dense)
+    assert labels.labels[3, 3] == 2 and labels.labels[0, 0] == 1
+    assert labels.instances['visible_area'].tolist() == [96, 4]
+
+
+def _dense_box_iou(masks, bbox):
+    """IoU of one box against every mask, computed on the dense masks as the original box prompt did."""
+    h, w = masks.shape[1:]
+    x1, y1 = max(round(bbox[0]), 0), max(round(bbox[1]), 0)
+    x2, y2 = min(round(bbox[2]), w), min(round(bbox[3]), h)
+    inter = masks[:, y1:y2, x1:x2].sum((1, 2))
+    return inter / ((y2 - y1) * (x2 - x1) + masks.sum((1, 2)) - inter)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_box_index_matches_dense_iou(seed):
+    dense = _random_masks(n=8, seed=seed)[:-1]  # the box IoU of an empty mask is 0/0 on both sides
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(-10, 75, (20, 2, 2)) * [64 / 75, 48 / 75]
+    bboxes = np.concatenate([xy.min(1), xy.max(1) + 1], 1)  # fractional, partly outside the image
+    bboxes = np.concatenate([bboxes, [[0, 0, 64, 48], [-5, -5, 100, 100]]])
+    expected = np.stack([_dense_box_iou(dense, bbox) for bbox in bboxes])
+    index = BoxIndex.from_masks(dense)
+    assert np.allclose(index.iou(bboxes), expected)
+    idx, ious = index.match(bboxes)
+    assert (idx == expected.argmax(1)).all() and np.allclose(ious, expected.max(1))
+    assert np.allclose(BoxIndex.from_masks(CompactMasks.from_dense(dense)).iou(bboxes), expected)
+
+
+def _nested_masks(seed=0):
+    """Random masks plus shrunk and shifted copies, so that some are covered by more than 80% and some just below."""
+    masks = _random_masks(n=12, seed=seed)
+    shifted = [np.roll(m, (0, d), axis=(0, 1)) & m for m, d in zip(masks[:6], range(1, 7))]
+    eroded = [m & np.roll(m, 1, axis=0) for m in masks[:6]]
+    return np.concatenate([masks, shifted, eroded])
+
+
+@pytest.mark.parametrize('container', [np.asarray, list, torch.from_numpy, CompactMasks.from_dense])
+@pytest.mark.parametrize('seed', range(5))
+def test_contained_masks_match_pairwise(container, seed):
+    dense = _nested_masks(seed)
+    areas = dense.sum((1, 2))
+    expected = np.zeros(len(dense), dtype=bool)
+    for i in range(len(dense)):
+        for j in range(len(dense)):
+            if areas[i] > areas[j] > 0 and (dense[i] & dense[j]).sum() > 0.8 * areas[j]:
+                expected[j] = True
+    assert expected.any() and not expected.all()
+    assert (contained_masks(container(dense)) == expected).all()
@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+
+import fastsam.predict
+from fastsam import FastSAM
+
+CFG = Path(__file__).parents[1] / 'ultralytics' / 'models' / 'v8' / 'yolov8-seg.yaml'
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Randomly initialized FastSAM whose class scores are raised enough to produce a few detections."""
+    torch.manual_seed(0)
+    model = FastSAM(str(CFG), cache_predictor=True)
+    for conv in model.model.model[-1].cv3:
+        conv[-1].bias.data.fill_(-3.0)
+    # random boxes often have several near-full-image candidates, which `assemble` only supports one of
+    bbox_iou = fastsam.predict.bbox_iou
+    monkeypatch.setattr(fastsam.predict, 'bbox_iou', lambda *args, **kwargs: bbox_iou(*args, **kwargs)[:1])
+    return model
+
+
+@pytest.fixture
+def images():
+    rng = np.random.RandomState(0)
+    return [(rng.rand(256, 320, 3) * 255).astype(np.uint8) for _ in range(2)]
+
+
+def test_predict_without_detections_returns_empty_list(model, images):
+    assert model.predict(images, imgsz=256, conf=0.99, raise_errors=True, verbose=False) == []
+
+
+def test_predictor_reused_for_per_call_args(model, images):
+    model.predict(images[0], imgsz=256, conf=0.5, verbose=False)
+    predictor = model.predictor
+    model.predict(images[0], imgsz=320, conf=0.3, iou=0.5, max_det=10, retina_masks=True, verbose=False)
+    assert model.predictor is predictor
+    assert (predictor.args.conf, predictor.args.iou, predictor.args.max_det) == (0.3, 0.5, 10)
+    model.predict(images[0], verbose=False)  # omitted per-call args fall back to the defaults
+    assert model.predictor is predictor and predictor.args.iou == 0.7 and not predictor.args.retina_masks
+
+
+@pytest.mark.parametrize('change', [{'half': True}, {'device': 'cpu'}])
+def test_predictor_rebuilt_for_other_args(model, images, change):
+    model.predict(images[0], imgsz=256, verbose=False)
+    predictor = model.predictor
+    model.predict(images[0], imgsz=256, verbose=False, **change)
+    assert model.predictor is not predictor
+    rebuilt = model.predictor
+    model.predict(images[0], imgsz=256, conf=0.1, verbose=False, **change)
+    assert model.predictor is rebuilt
+
+
+def test_predictor_not_cached_by_default(images):
+    model = FastSAM(str(CFG))
+    model.predict(images[0], imgsz=256, verbose=False)
+    predictor = model.predictor
+    model.predict(images[0], imgsz=256, verbose=False)
+    assert model.predictor is not predictor
+
+
+def test_result_cache_serves_repeated_predictions(model, images):
+    from fastsam.cache import ResultCache
+
+    model.result_cache = ResultCache()
+    first = model.predict(images[0], imgsz=256, conf=0.02, iou=0.5, retina_masks=True, verbose=False)
+    assert model.predict(images[0].copy(), imgsz=256, conf=0.02, iou=0.5, retina_masks=True, verbose=False) is first
+    other = model.predict(images[0], imgsz=256, conf=0.03, iou=0.5, retina_masks=True, verbose=False)
+    assert other is not first
+    assert (model.result_cache.hits, model.result_cache.misses) == (1, 2)
+
+
+@pytest.mark.parametrize('retina_masks', [True, False])
+def test_rethreshold_matches_fresh_predict(model, images, retina_masks):
+    kwargs = dict(imgsz=256, retina_masks=retina_masks, verbose=False)
+    raw = model.predict(images, conf=0.02, iou=0.9, keep_raw=True, **kwargs)
+    rethresholded = model.rethreshold(raw, conf=0.03, iou=0.5)
+    fresh = model.predict(images, conf=0.03, iou=0.5, **kwargs)
+    assert len(rethresholded) == len(fresh) == len(images)
+    assert sum(len(r.boxes) for r in fresh) > 1
+    assert sum(len(r.boxes) for r in raw) > sum(len(r.boxes) for r in fresh)
+    for a, b in zip(rethresholded, fresh):
+        torch.testing.assert_close(a.boxes.data, b.boxes.data)
+        assert torch.equal(a.masks.data, b.masks.data)
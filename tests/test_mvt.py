@@ -0,0 +1,55 @@
+from shapely.geometry import Polygon, box
+
+from fastsam.mvt import _encode_geometry, _varint
+from fastsam.vector import _varints, _zigzag
+
+
+def test_zigzag():
+    assert _zigzag([0, -1, 1, -2, 2, 2 ** 31 - 1, -2 ** 31]).tolist() == [0, 1, 2, 3, 4, 2 ** 32 - 2, 2 ** 32 - 1]
+
+
+def test_varints():
+    assert _varint(1) == b'\x01' and _varint(300) == b'\xac\x02'
+    values = [0, 1, 127, 128, 300, 2 ** 35]
+    assert _varints(values) == b''.join(_varint(v) for v in values)
+
+
+def test_encode_polygon_spec_example():
+    # the polygon example of the Mapbox Vector Tile specification 2.1, section 4.3.5.1 (tile y points down)
+    polygon = Polygon([(3, -6), (8, -12), (20, -34)])
+    assert _encode_geometry(polygon, 0, 0, 1) == [9, 6, 12, 18, 10, 12, 24, 44, 15]
+
+
+def _decode(commands):
+    """Rings of an MVT polygon command stream, in tile coordinates."""
+    rings, x, y, i = [], 0, 0, 0
+    while i < len(commands):
+        command, count = commands[i] & 7, commands[i] >> 3
+        i += 1
+        if command == 7:
+            continue
+        for _ in range(count):
+            dx, dy = (commands[i] >> 1) ^ -(commands[i] & 1), (commands[i + 1] >> 1) ^ -(commands[i + 1] & 1)
+            x, y, i = x + dx, y + dy, i + 2
+            if command == 1:
+                rings.append([])
+            rings[-1].append((x, y))
+    return rings
+
+
+def _area(ring):
+    return sum(x1 * y2 - x2 * y1 for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]))
+
+
+def test_encode_polygon_winding_and_holes():
+    square = box(0, -10, 10, 0).difference(box(2, -8, 8, -2))  # y up; becomes (0, 0)-(10, 10) in the tile
+    exterior, hole = _decode(_encode_geometry(square, 0, 0, 1))
+    assert sorted(exterior) == [(0, 0), (0, 10), (10, 0), (10, 10)]
+    assert sorted(hole) == [(2, 2), (2, 8), (8, 2), (8, 8)]
+    assert _area(exterior) > 0 > _area(hole)  # exterior clockwise, hole counter-clockwise with y down
+    assert _encode_geometry(box(0, 0, 0.1, 0.1), 0, 0, 1) == []  # collapses to nothing after rounding
+
+
+def test_encode_geometry_scales_and_offsets():
+    (ring,) = _decode(_encode_geometry(box(100, 200, 101, 201), 100, 201, 16))
+    assert sorted(ring) == [(0, 0), (0, 16), (16, 0), (16, 16)]
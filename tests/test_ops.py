@@ -0,0 +1,61 @@
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from fastsam.masks import CompactMasks
+from ultralytics.yolo.utils import ops
+
+
+def _ring_masks(n=10, shape=(64, 96), seed=0):
+    """Random rectangles with holes and stray islands, some touching the image border, plus an empty mask."""
+    rng = np.random.default_rng(seed)
+    masks = np.zeros((n, *shape), dtype=np.uint8)
+    for mask in masks:
+        x, y = rng.integers(-4, shape[1] - 8), rng.integers(-4, shape[0] - 8)
+        mask[max(y, 0):y + rng.integers(6, 40), max(x, 0):x + rng.integers(6, 50)] = 1
+        mask[y + 3:y + 5, x + 3:x + 5] = 0  # a hole
+        mask[rng.integers(0, shape[0]), rng.integers(0, shape[1])] = 1  # an island
+    masks[-1] = 0
+    return masks
+
+
+def _full_frame(masks, mode):
+    return [cv2.findContours(mask, mode, cv2.CHAIN_APPROX_SIMPLE) for mask in masks]
+
+
+@pytest.mark.parametrize('mode', [cv2.RETR_EXTERNAL, cv2.RETR_CCOMP, cv2.RETR_TREE])
+@pytest.mark.parametrize('workers', [1, 4])
+def test_find_contours_match_full_frame(mode, workers):
+    masks = _ring_masks()
+    for (contours, hierarchy), (expected, expected_hierarchy) in zip(ops.find_contours(masks, mode, workers=workers),
+                                                                      _full_frame(masks, mode)):
+        assert len(contours) == len(expected)
+        assert all((c == e).all() for c, e in zip(contours, expected))
+        assert (hierarchy is None) == (expected_hierarchy is None)
+        if hierarchy is not None:
+            assert (hierarchy == expected_hierarchy).all()
+
+
+@pytest.mark.parametrize('strategy', ['largest', 'concat'])
+def test_masks2segments_threads_match_serial(strategy):
+    masks = _ring_masks(seed=1)
+    serial = []
+    for contours, _ in _full_frame(masks, cv2.RETR_EXTERNAL):
+        if not contours:
+            serial.append(np.zeros((0, 2)))
+        elif strategy == 'concat':
+            serial.append(np.concatenate([c.reshape(-1, 2) for c in contours]))
+        else:
+            serial.append(contours[np.argmax([len(c) for c in contours])].reshape(-1, 2))
+    for x in (masks, torch.from_numpy(masks)):
+        segments = ops.masks2segments(x, strategy, workers=4)
+        assert len(segments) == len(serial)
+        assert all(s.shape == e.shape and (s == e).all() for s, e in zip(segments, serial))
+
+
+def test_compact_segments_match_dense():
+    masks = _ring_masks(seed=2)
+    segments = CompactMasks.from_dense(masks).segments_xy(workers=4)
+    expected = ops.masks2segments(masks, workers=1)
+    assert all(s.shape == e.shape and (s == e).all() for s, e in zip(segments, expected))
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+import torch
+
+from fastsam import FastSAMPrompt
+from ultralytics.yolo.engine.results import Results
+
+
+def _prompt(masks):
+    """FastSAMPrompt over a dense (n, h, w) bool stack, with the image at mask resolution."""
+    n, h, w = masks.shape
+    image = np.zeros((h, w, 3), dtype=np.uint8)
+    boxes = torch.zeros((n, 6))
+    boxes[:, 4] = 0.9
+    result = Results(image, path='', names={0: 'object'}, boxes=boxes, masks=torch.from_numpy(masks).float())
+    return FastSAMPrompt(image, [result], device='cpu')
+
+
+def _point_prompt_loop(masks, points, pointlabel):
+    """The original per-mask, per-point loop of `FastSAMPrompt.point_prompt`."""
+    onemask = np.zeros(masks.shape[1:])
+    for i in np.argsort(-masks.sum((1, 2)), kind='stable'):
+        mask = masks[i]
+        for j, point in enumerate(points):
+            if mask[point[1], point[0]] == 1 and pointlabel[j] == 1:
+                onemask[mask] = 1
+            if mask[point[1], point[0]] == 1 and pointlabel[j] == 0:
+                onemask[mask] = 0
+    return onemask >= 1
+
+
+def _rect_masks(rects, shape=(40, 40)):
+    masks = np.zeros((len(rects), *shape), dtype=bool)
+    for mask, (x1, y1, x2, y2) in zip(masks, rects):
+        mask[y1:y2, x1:x2] = True
+    return masks
+
+
+def test_point_prompt_ignores_other_labels():
+    masks = _rect_masks([(0, 0, 13, 13), (4, 4, 9, 9)])  # 169 px with a 25 px mask nested inside
+    prompt = _prompt(masks)
+    out = prompt.point_prompt([[1, 1], [5, 5]], [1, -1])[0]
+    assert out.sum() == 169
+    assert (out == _point_prompt_loop(masks, [[1, 1], [5, 5]], [1, -1])).all()
+    assert not prompt.point_prompt([[5, 5]], [-1])[0].any()
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_point_prompt_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    xy = rng.integers(0, 30, (8, 2))
+    rects = [(x, y, x + rng.integers(3, 10), y + rng.integers(3, 10)) for x, y in xy]
+    masks = _rect_masks(rects)
+    points = [[int(rng.integers(x1, x2)), int(rng.integers(y1, y2))] for x1, y1, x2, y2 in
+              (rects[i] for i in rng.integers(0, len(rects), 6))]  # every point hits at least one mask
+    labels = rng.choice([1, 0, -1], len(points)).tolist()
+    out = _prompt(masks).point_prompt(points, labels)[0]
+    assert (out == _point_prompt_loop(masks, points, labels)).all()
+
+
+def test_text_prompts_without_indexed_masks(monkeypatch):
+    import fastsam.prompt
+
+    class Model:
+
+        def encode_image(self, images):
+            raise AssertionError('no crop should be encoded')
+
+        def encode_text(self, tokens):
+            return torch.ones((len(tokens), 512))
+
+    monkeypatch.setattr(fastsam.prompt, 'load_clip', lambda name, device: (Model(), None))
+    monkeypatch.setattr(fastsam.prompt.clip, 'tokenize', lambda texts: torch.zeros((len(texts), 77), dtype=torch.long))
+    prompt = _prompt(_rect_masks([(0, 0, 10, 10), (20, 20, 25, 25)]))  # 100 px and 25 px, both too small
+    scores, ids = prompt.text_scores(['a roof', 'a tree'])
+    assert scores.shape == (2, 0) and not len(ids)
+    out = prompt.text_prompts(['a roof', 'a tree'], top_k=3)
+    assert len(out) == 2 and all(not m.any() for m in out)
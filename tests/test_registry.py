@@ -0,0 +1,93 @@
+import threading
+import time
+
+from fastsam.registry import ModelRegistry
+
+
+class _Factory:
+    """Model loader stand-in that counts its calls."""
+
+    def __init__(self, name, delay=0.0):
+        self.name = name
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {'name': self.name}
+
+
+def _registry(names, budget, nbytes=100):
+    registry = ModelRegistry(memory_budget=budget)
+    for name in names:
+        registry.register(name, _Factory(name), nbytes=nbytes)
+    return registry
+
+
+def _resident(registry):
+    return {name for name, s in registry.stats().items() if s['loaded']}
+
+
+def test_evicts_least_recently_used_over_budget():
+    registry = _registry('abc', budget=250)
+    for name in 'abc':
+        registry.get(name)
+    assert _resident(registry) == {'b', 'c'}  # loading c evicted a
+    registry.get('b')
+    registry.get('a')  # c is now the least recently used
+    assert _resident(registry) == {'a', 'b'}
+    assert registry.resident_bytes() == 200
+    assert registry.stats()['a']['loads'] == 2 and registry.stats()['b']['hits'] == 1
+
+
+def test_acquired_model_survives_eviction():
+    registry = _registry('ab', budget=150)
+    held, release = threading.Event(), threading.Event()
+
+    def use_a():
+        with registry.acquire('a'):
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=use_a)
+    thread.start()
+    held.wait(5)
+    registry.get('b')  # over budget, but a is in use
+    assert _resident(registry) == {'a', 'b'}
+    assert registry.stats()['a']['in_use']
+    release.set()
+    thread.join()
+    assert registry.evict('b') and not registry.evict('b')
+    registry.get('b')  # a is idle now, so it makes room
+    assert _resident(registry) == {'b'}
+
+
+def test_concurrent_acquire_loads_once():
+    registry = ModelRegistry()
+    factory = _Factory('a', delay=0.05)
+    registry.register('a', factory, nbytes=1)
+    models = []
+
+    def use():
+        with registry.acquire('a') as model:
+            models.append(model)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert factory.calls == 1
+    assert len(models) == 8 and all(m is models[0] for m in models)
+
+
+def test_preload_loads_and_warms_up_once():
+    registry = ModelRegistry()
+    factory, warmed = _Factory('a'), []
+    registry.register('a', factory, warmup=warmed.append, nbytes=1, preload=True)
+    assert factory.calls == 1 and warmed == [{'name': 'a'}]
+    assert registry.stats()['a']['loaded']
+    with registry.acquire('a') as model:
+        assert model is warmed[0]
+    assert factory.calls == 1 and len(warmed) == 1
@@ -0,0 +1,55 @@
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from fastsam.masks import CompactMasks
+from fastsam.render import _dilate, _erode, render_masks, smooth_compact, smooth_masks
+
+
+def _blob_masks(n=8, shape=(60, 80), seed=0):
+    rng = np.random.default_rng(seed)
+    masks = np.zeros((n, *shape), dtype=np.uint8)
+    for mask in masks:
+        x, y = rng.integers(-5, shape[1] - 5), rng.integers(-5, shape[0] - 5)  # some touch the image border
+        mask[max(y, 0):y + rng.integers(3, 30), max(x, 0):x + rng.integers(3, 40)] = 1
+        mask &= (rng.random(shape) < 0.85).view(np.uint8)  # ragged, with holes
+    masks[-1] = 0  # an empty mask
+    return masks
+
+
+def _morphology(masks, close, open):
+    out = []
+    for mask in masks:
+        mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((close, close), np.uint8))
+        out.append(cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((open, open), np.uint8)))
+    return np.stack(out)
+
+
+@pytest.mark.parametrize('close,open', [(3, 8), (4, 5), (1, 2)])
+@pytest.mark.parametrize('seed', range(3))
+def test_smooth_masks_match_morphology(close, open, seed):
+    dense = _blob_masks(seed=seed)
+    expected = _morphology(dense, close, open)
+    assert (smooth_masks(dense, close, open) == expected).all()
+    smoothed = smooth_masks(torch.from_numpy(dense), close, open)
+    assert smoothed.dtype == torch.uint8 and (smoothed.numpy() == expected).all()
+    # the max-pool kernels used for CUDA tensors, run on the CPU
+    m = torch.from_numpy(dense).float()[:, None]
+    pooled = _dilate(_erode(_erode(_dilate(m, close), close), open), open)[:, 0]
+    assert (pooled.numpy() == expected).all()
+
+
+def test_smooth_compact_matches_dense():
+    dense = _blob_masks()
+    expected = smooth_masks(dense)
+    assert (smooth_compact(CompactMasks.from_dense(dense)).decode() == expected.astype(bool)).all()
+
+
+def test_render_compact_masks_smoothed_like_dense():
+    dense = _blob_masks()
+    image = np.random.default_rng(1).integers(0, 255, (*dense.shape[1:], 3), dtype=np.uint8)
+    kwargs = dict(random_color=False, contours=False, better_quality=True)
+    expected = render_masks(image, dense, **kwargs)
+    assert (render_masks(image, CompactMasks.from_dense(dense), **kwargs) == expected).all()
+    assert not (render_masks(image, dense, random_color=False, contours=False, better_quality=False) == expected).all()
@@ -0,0 +1,201 @@
+import pathlib
+import threading
+
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+from rasterio.windows import Window
+
+from fastsam.masks import CompactMasks
+from fastsam.tiling import (StageStats, TilePipeline, TileReader, TileScreen, _merge_tiles, _overlapping_tiles,
+                            tile_windows, tiled_predict)
+
+
+@pytest.mark.parametrize('width,height,tile_size,overlap', [(5000, 4100, 1024, 128), (3000, 3000, 640, 400),
+                                                            (700, 900, 1024, 128), (2100, 1030, 1024, 100)])
+def test_tile_windows_cover_raster(width, height, tile_size, overlap):
+    windows = tile_windows(width, height, tile_size, overlap)
+    covered = np.zeros((height, width), dtype=bool)
+    for w in windows:
+        assert (w.width, w.height) == (min(tile_size, width), min(tile_size, height))
+        assert w.col_off >= 0 and w.row_off >= 0
+        assert w.col_off + w.width <= width and w.row_off + w.height <= height
+        covered[w.toslices()] = True
+    assert covered.all()
+    cols = sorted({w.col_off for w in windows})
+    assert all(b - a <= tile_size - overlap for a, b in zip(cols, cols[1:]))  # neighbours overlap by >= overlap
+
+
+def test_tile_windows_reject_overlap():
+    with pytest.raises(ValueError):
+        tile_windows(2048, 2048, 512, 512)
+
+
+def test_overlapping_tiles_match_brute_force():
+    windows = tile_windows(3000, 2200, 640, 400) + [Window(100, 100, 50, 50)]
+    rects = [(w.col_off, w.row_off, w.col_off + w.width, w.row_off + w.height) for w in windows]
+    expected = [(a, b) for a in range(len(rects)) for b in range(a + 1, len(rects))
+                if min(rects[a][2], rects[b][2]) > max(rects[a][0], rects[b][0]) and
+                min(rects[a][3], rects[b][3]) > max(rects[a][1], rects[b][1])]
+    assert _overlapping_tiles(windows) == expected
+
+
+def _tile(window, rects, scores, shape=(100, 200)):
+    """A tile result (window, packed, rois, boxes) in raster coordinates, one filled rectangle per mask."""
+    crops = [np.ones((y2 - y1, x2 - x1), dtype=bool) for x1, y1, x2, y2 in rects]
+    masks = CompactMasks.from_crops(crops, rects, shape)
+    boxes = np.array([[*r, s, 0] for r, s in zip(masks.rois, scores)], dtype=np.float32)
+    return window, masks.packed, masks.rois, boxes
+
+
+def test_merge_tiles_joins_object_across_overlap():
+    left = _tile(Window(0, 0, 100, 100), [(70, 10, 100, 30), (10, 10, 20, 20)], [0.8, 0.5])
+    right = _tile(Window(80, 0, 100, 100), [(80, 10, 110, 30), (150, 50, 160, 60)], [0.9, 0.7])
+    (packed, rois), boxes = _merge_tiles([left, right], 0.5)
+    assert sorted(map(tuple, rois.tolist())) == [(10, 10, 20, 20), (70, 10, 110, 30), (150, 50, 160, 60)]
+    merged = int(np.nonzero(rois[:, 0] == 70)[0][0])
+    assert boxes[merged].tolist() == pytest.approx([70, 10, 110, 30, 0.9, 0])  # best score of the group
+    masks = CompactMasks(packed, rois, (100, 200))
+    assert masks.crop(merged).all()
+
+
+def test_merge_tiles_keeps_different_objects_in_overlap():
+    left = _tile(Window(0, 0, 100, 100), [(80, 0, 100, 10)], [0.8])
+    right = _tile(Window(80, 0, 100, 100), [(80, 50, 100, 60)], [0.9])
+    (packed, rois), boxes = _merge_tiles([left, right], 0.5)
+    assert len(packed) == 2 and len(boxes) == 2
+
+
+def _raster(path, image, nodata=None):
+    """Write an (h, w, 3) uint8 image as a GeoTIFF."""
+    h, w = image.shape[:2]
+    with rasterio.open(path, 'w', driver='GTiff', height=h, width=w, count=3, dtype='uint8', nodata=nodata,
+                       transform=from_origin(0, h, 1, 1)) as dst:
+        dst.write(image.transpose(2, 0, 1))
+    return str(path)
+
+
+def _noise(h, w, seed=0):
+    return np.random.default_rng(seed).integers(1, 256, (h, w, 3), dtype=np.uint8)
+
+
+class _RecordingCache:
+    """Tile cache stand-in that never hits and records what would be stored."""
+
+    def __init__(self):
+        self.puts = []
+
+    def get(self, key):
+        return None
+
+    def put(self, key, tile):
+        self.puts.append(key)
+
+
+def test_tile_screen():
+    screen = TileScreen()
+    noise = _noise(64, 64)
+    assert screen.check_valid(np.zeros((64, 64), dtype=bool)) == 'nodata'
+    assert screen.check_valid(np.ones((64, 64), dtype=bool)) is None
+    assert screen.check_content(np.full((64, 64, 3), 120, dtype=np.uint8)) == 'uniform'
+    assert screen.check_content(noise) is None
+    valid = np.zeros((64, 64), dtype=bool)
+    valid[:8, :8] = True
+    noise[:8, :8] = 50
+    assert screen.check_content(noise, valid) == 'uniform'  # only the valid pixels count
+
+
+def test_stage_stats():
+    stats = StageStats('post', 2)
+    stats.add(1.0)
+    stats.add(0.5, 3)
+    assert stats.items == 4 and stats.busy == 1.5
+    assert stats.utilization(1.0) == 0.75
+
+
+def test_pipeline_outputs_in_window_order(tmp_path):
+    path = _raster(tmp_path / 'image.tif', _noise(300, 300))
+    windows = tile_windows(300, 300, 128, 16)
+    pipeline = TilePipeline(path, readers=3, workers=2, prefetch=2)
+    outputs = pipeline.run(windows, lambda images: [int(image.sum()) for image in images], lambda r: r, batch=3)
+    with rasterio.open(path) as src:
+        reader = TileReader(src)
+        assert outputs == [int(reader.read(w).sum()) for w in windows]
+    assert [pipeline.stats[k].items for k in ('read', 'infer', 'post')] == [len(windows)] * 3
+
+
+def test_pipeline_empty_batch_means_no_detections(tmp_path):
+    path = _raster(tmp_path / 'image.tif', _noise(256, 256))
+    windows = tile_windows(256, 256, 128, 0)
+    cache = _RecordingCache()
+    pipeline = TilePipeline(path, cache=cache, key=lambda image: str(image.sum()))
+    assert pipeline.run(windows, lambda images: [], lambda r: r, batch=2) == [None] * len(windows)
+    assert len(cache.puts) == len(windows)
+
+
+def _out_of_memory(images):
+    raise RuntimeError('CUDA out of memory')
+
+
+@pytest.mark.parametrize('predict', [
+    pytest.param(_out_of_memory, id='raises'),
+    pytest.param(lambda images: None, id='none'),
+    pytest.param(lambda images: [1], id='short')])
+def test_pipeline_inference_failure_propagates_and_is_not_cached(tmp_path, predict):
+    path = _raster(tmp_path / 'image.tif', _noise(512, 512))
+    cache = _RecordingCache()
+    pipeline = TilePipeline(path, readers=2, workers=2, prefetch=1, cache=cache, key=lambda image: str(image.sum()))
+    threads = set(threading.enumerate())
+    with pytest.raises(RuntimeError):
+        pipeline.run(tile_windows(512, 512, 128, 0), predict, lambda r: r, batch=2)
+    assert cache.puts == []
+    assert set(threading.enumerate()) <= threads  # readers and workers were stopped and joined
+
+
+def test_pipeline_post_failure_propagates(tmp_path):
+    path = _raster(tmp_path / 'image.tif', _noise(512, 512))
+
+    def post(result):
+        raise ValueError('bad tile')
+
+    threads = set(threading.enumerate())
+    with pytest.raises(ValueError, match='bad tile'):
+        TilePipeline(path, prefetch=1).run(tile_windows(512, 512, 128, 0), lambda images: [0] * len(images), post)
+    assert set(threading.enumerate()) <= threads
+
+
+def test_pipeline_screen_skips_nodata_and_uniform_tiles(tmp_path):
+    image = _noise(256, 512)
+    image[:, :128] = 0  # nodata
+    image[:, 128:256] = 100  # uniform
+    path = _raster(tmp_path / 'image.tif', image, nodata=0)
+    predicted = []
+
+    def predict(images):
+        predicted.extend(images)
+        return [1] * len(images)
+
+    pipeline = TilePipeline(path, screen=TileScreen())
+    outputs = pipeline.run(tile_windows(512, 256, 128, 0), predict, lambda r: r, batch=2)
+    assert pipeline.skipped == {'nodata': 2, 'uniform': 2}
+    assert len(predicted) == 4
+    assert outputs == [None, None, 1, 1] * 2
+
+
+def test_tiled_predict_accepts_path_like(tmp_path, monkeypatch):
+    path = pathlib.Path(_raster(tmp_path / 'image.tif', _noise(200, 300)))
+    (tmp_path / 'elsewhere').mkdir()
+    monkeypatch.chdir(tmp_path / 'elsewhere')  # the file name alone does not resolve from here
+    calls = []
+
+    class Model:
+        ckpt_path = 'FastSAM-x.pt'
+
+        def predict(self, images, **kwargs):
+            calls.append(kwargs)
+            return []
+
+    result = tiled_predict(Model(), path, tile_size=128, overlap=16, screen=False)
+    assert len(result) == 0 and result.tiles == len(tile_windows(300, 200, 128, 16))
+    assert all(kwargs['raise_errors'] for kwargs in calls)
@@ -0,0 +1,53 @@
+import base64
+import json
+
+import numpy as np
+import pytest
+
+from fastsam.masks import CompactMasks
+from fastsam.vector import export_features, iter_geojson, mask_features
+
+
+def _square(x1, y1, x2, y2):
+    return {'type': 'Feature', 'properties': {'value': 1},
+            'geometry': {'type': 'Polygon', 'coordinates': [[[x1, y1], [x2, y1], [x2, y2], [x1, y2], [x1, y1]]]}}
+
+
+def test_mask_features_area_matches_pixels():
+    dense = np.zeros((3, 30, 40), dtype=bool)
+    dense[0, 2:10, 3:20] = True
+    dense[1, 15:28, 5:35] = True
+    dense[1, 18:22, 10:14] = False  # a hole
+    features = mask_features(CompactMasks.from_dense(dense), scores=[0.9, 0.8, 0.7])
+    assert len(features) == 2  # the empty mask is dropped
+    assert [f['properties']['area'] for f in features] == dense[:2].sum((1, 2)).tolist()
+    assert [f['properties']['score'] for f in features] == pytest.approx([0.9, 0.8])
+    assert len(features[1]['geometry']['coordinates']) == 2  # exterior and hole
+
+
+def test_export_twkb_polygon():
+    (feature,) = export_features([_square(0, 0, 2, 2)], precision=0, encoding='twkb')
+    assert feature['geometry'] is None
+    # Polygon, precision 0, no metadata; 1 ring of 5 points; zigzag deltas
+    assert base64.b64decode(feature['twkb']) == bytes([0x03, 0x00, 1, 5, 0, 0, 4, 0, 0, 4, 3, 0, 0, 3])
+
+
+def test_export_features_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        export_features([], encoding='wkb')
+    with pytest.raises(ValueError):
+        export_features([], encoding='twkb')
+
+
+def test_export_quantizes_and_simplifies():
+    ring = [[x / 10, 0.001 * (x % 2)] for x in range(0, 101)] + [[10, 5], [0, 5], [0, 0]]
+    feature = {'type': 'Feature', 'properties': {}, 'geometry': {'type': 'Polygon', 'coordinates': [ring]}}
+    (out,) = export_features([feature], tolerance=0.01, precision=1)
+    assert out['geometry']['coordinates'] == [[[0.0, 0.0], [10.0, 0.0], [10.0, 5.0], [0.0, 5.0], [0.0, 0.0]]]
+
+
+def test_iter_geojson_is_one_collection():
+    text = b''.join(iter_geojson([_square(0, 0, 1, 1), _square(1, 1, 2, 2)], chunk_size=1, status='success'))
+    collection = json.loads(text)
+    assert collection['type'] == 'FeatureCollection' and collection['status'] == 'success'
+    assert len(collection['features']) == 2
@@ -250,7 +250,7 @@ class BasePredictor:
 
             # Visualize, save, write results
             n = len(im0s)
-            for i in range(n):
+            for i in range(len(self.results)):  # FastSAM returns no results for a batch without any detection
                 self.results[i].speed = {
                     'preprocess': profilers[0].dt * 1E3 / n,
                     'inference': profilers[1].dt * 1E3 / n,
@@ -472,9 +472,9 @@ class Masks(BaseTensor):
         if masks.ndim == 2:
             masks = masks[None, :]
         super().__init__(masks, orig_shape)
+        self._xy = None  # segments cache, kept on the instance so it is freed with the masks
 
     @property
-    @lru_cache(maxsize=1)
     def segments(self):
         """Return segments (deprecated; normalized)."""
         LOGGER.warning("WARNING ⚠️ 'Masks.segments' is deprecated. Use 'Masks.xyn' for segments (normalized) and "
@@ -482,20 +482,19 @@ class Masks(BaseTensor):
         return self.xyn
 
     @property
-    @lru_cache(maxsize=1)
     def xyn(self):
         """Return segments (normalized)."""
-        return [
-            ops.scale_coords(self.data.shape[1:], x, self.orig_shape, normalize=True)
-            for x in ops.masks2segments(self.data)]
+        h, w = self.orig_shape
+        return [x / np.array([w, h], dtype='float32') for x in self.xy]
 
     @property
-    @lru_cache(maxsize=1)
     def xy(self):
         """Return segments (pixels)."""
-        return [
-            ops.scale_coords(self.data.shape[1:], x, self.orig_shape, normalize=False)
-            for x in ops.masks2segments(self.data)]
+        if self._xy is None:
+            self._xy = [
+                ops.scale_coords(self.data.shape[1:], x, self.orig_shape, normalize=False)
+                for x in ops.masks2segments(self.data)]
+        return self._xy
 
     @property
     def masks(self):
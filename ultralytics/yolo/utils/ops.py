@@ -4,6 +4,7 @@ import contextlib
 import math
 import re
 import time
+from multiprocessing.pool import ThreadPool
 
 import cv2
 import numpy as np
@@ -11,7 +12,7 @@ import torch
 import torch.nn.functional as F
 import torchvision
 
-from ultralytics.yolo.utils import LOGGER
+from ultralytics.yolo.utils import LOGGER, NUM_THREADS
 
 from .metrics import box_iou
 
@@ -614,6 +615,9 @@ def process_mask_native(protos, masks_in, bboxes, shape):
     """
     It takes the output of the mask head, and crops it after upsampling to the bounding boxes.
 
+    Each mask is only upsampled inside its bounding box (see `process_mask_roi`), so no full-size float intermediates
+    are allocated besides the returned masks.
+
     Args:
       protos (torch.Tensor): [mask_dim, mask_h, mask_w]
       masks_in (torch.Tensor): [n, mask_dim], n is number of masks after nms
@@ -623,17 +627,93 @@ def process_mask_native(protos, masks_in, bboxes, shape):
     Returns:
       masks (torch.Tensor): The returned masks with dimensions [h, w, n]
     """
+    crops, rois = process_mask_roi(protos, masks_in, bboxes, shape)
+    return paste_masks(crops, rois, shape, dtype=torch.float32)
+
+
+def _interp_weights(start, end, out_size, in_size, device):
+    """
+    Rows [start, end) of the 1-D bilinear interpolation matrix (out_size x in_size) used by
+    F.interpolate(mode='bilinear', align_corners=False).
+    """
+    o = torch.arange(start, end, device=device, dtype=torch.float32)
+    src = ((o + 0.5) * (in_size / out_size) - 0.5).clamp(min=0)
+    i0 = src.floor().long().clamp(max=in_size - 1)
+    i1 = (i0 + 1).clamp(max=in_size - 1)
+    w1 = src - i0
+    weights = torch.zeros((end - start, in_size), device=device)
+    rows = torch.arange(end - start, device=device)
+    weights.index_put_((rows, i0), 1 - w1, accumulate=True)
+    weights.index_put_((rows, i1), w1, accumulate=True)
+    return weights
+
+
+def process_mask_roi(protos, masks_in, bboxes, shape):
+    """
+    Assemble native-resolution masks inside their bounding boxes only.
+
+    Equivalent to `process_mask_native`, but each mask is upsampled with separable bilinear weights restricted to the
+    pixels of its box, so time and memory scale with the total box area instead of n x image area. Pixels outside a
+    box are zero after `crop_mask` anyway, so the crops hold the complete mask.
+
+    Args:
+      protos (torch.Tensor): [mask_dim, mask_h, mask_w]
+      masks_in (torch.Tensor): [n, mask_dim], n is number of masks after nms
+      bboxes (torch.Tensor): [n, 4] boxes in pixels of `shape`
+      shape (tuple): the size of the input image (h,w)
+
+    Returns:
+      crops (List[torch.Tensor]): n boolean masks, crops[i] covering rois[i]
+      rois (torch.Tensor): [n, 4] integer (x1, y1, x2, y2) pixel window of each crop, x2/y2 exclusive
+    """
     c, mh, mw = protos.shape  # CHW
-    masks = (masks_in @ protos.float().view(c, -1)).view(-1, mh, mw)
-    gain = min(mh / shape[0], mw / shape[1])  # gain  = old / new
-    pad = (mw - shape[1] * gain) / 2, (mh - shape[0] * gain) / 2  # wh padding
+    h, w = shape
+    gain = min(mh / h, mw / w)  # gain  = old / new
+    pad = (mw - w * gain) / 2, (mh - h * gain) / 2  # wh padding
     top, left = int(pad[1]), int(pad[0])  # y, x
     bottom, right = int(mh - pad[1]), int(mw - pad[0])
-    masks = masks[:, top:bottom, left:right]
+    ph, pw = bottom - top, right - left
+    masks = (masks_in @ protos.float().view(c, -1)).view(-1, mh, mw)[:, top:bottom, left:right]
+
+    # integer pixel window satisfying crop_mask's x1 <= x < x2, y1 <= y < y2
+    rois = bboxes[:, :4].float().ceil()
+    rois[:, [0, 2]] = rois[:, [0, 2]].clamp(0, w)
+    rois[:, [1, 3]] = rois[:, [1, 3]].clamp(0, h)
+    rois = rois.long()
+    crops = []
+    for mask, (x1, y1, x2, y2) in zip(masks, rois.tolist()):
+        if x2 <= x1 or y2 <= y1:
+            crops.append(torch.zeros((max(y2 - y1, 0), max(x2 - x1, 0)), dtype=torch.bool, device=masks.device))
+            continue
+        wy = _interp_weights(y1, y2, h, ph, masks.device)
+        wx = _interp_weights(x1, x2, w, pw, masks.device)
+        sy = wy.any(0).nonzero()  # source rows/cols that contribute to this window
+        sx = wx.any(0).nonzero()
+        sy0, sy1, sx0, sx1 = int(sy[0]), int(sy[-1]) + 1, int(sx[0]), int(sx[-1]) + 1
+        crop = wy[:, sy0:sy1] @ mask[sy0:sy1, sx0:sx1] @ wx[:, sx0:sx1].T
+        crops.append(crop > 0)
+    return crops, rois
 
-    masks = F.interpolate(masks[None], shape, mode='bilinear', align_corners=False)[0]  # CHW
-    masks = crop_mask(masks, bboxes)  # CHW
-    return masks.gt_(0)
+
+def paste_masks(crops, rois, shape, dtype=torch.bool):
+    """
+    Paste ROI mask crops from `process_mask_roi` into a dense [n, h, w] tensor.
+
+    Args:
+      crops (List[torch.Tensor]): n boolean masks
+      rois (torch.Tensor): [n, 4] integer (x1, y1, x2, y2) windows
+      shape (tuple): output size (h, w)
+      dtype (torch.dtype): output dtype
+
+    Returns:
+      (torch.Tensor): [n, h, w] masks
+    """
+    device = crops[0].device if len(crops) else rois.device
+    out = torch.zeros((len(crops), *shape), dtype=dtype, device=device)
+    for i, (crop, (x1, y1, x2, y2)) in enumerate(zip(crops, rois.tolist())):
+        if crop.numel():
+            out[i, y1:y2, x1:x2] = crop
+    return out
 
 
 def scale_coords(img1_shape, coords, img0_shape, ratio_pad=None, normalize=False):
@@ -668,20 +748,63 @@ def scale_coords(img1_shape, coords, img0_shape, ratio_pad=None, normalize=False
     return coords
 
 
-def masks2segments(masks, strategy='largest'):
+def find_contours(masks, mode=cv2.RETR_EXTERNAL, method=cv2.CHAIN_APPROX_SIMPLE, workers=NUM_THREADS):
+    """
+    Run cv2.findContours on every mask, in a thread pool and only inside each mask's bounding box.
+
+    Each mask is cropped to its bounding box plus a 1 pixel border and traced with an offset, which gives the same
+    contours as tracing the full-size mask. OpenCV releases the GIL, so the masks are traced in parallel.
+
+    Args:
+      masks (torch.Tensor | np.ndarray): (n, h, w) binary masks
+      mode (int): cv2 contour retrieval mode, e.g. cv2.RETR_EXTERNAL or cv2.RETR_CCOMP to keep holes
+      method (int): cv2 contour approximation method
+      workers (int): number of threads, 1 to trace serially
+
+    Returns:
+      (List[Tuple[tuple, np.ndarray]]): (contours, hierarchy) per mask, hierarchy is None when a mask is empty
+    """
+    if isinstance(masks, torch.Tensor):
+        masks = masks.cpu().numpy()
+
+    def trace(mask):
+        mask = mask.astype('uint8')
+        rows = np.flatnonzero(mask.max(1))
+        if not len(rows):
+            return (), None
+        cols = np.flatnonzero(mask[rows[0]:rows[-1] + 1].max(0))
+        y1, x1 = max(rows[0] - 1, 0), max(cols[0] - 1, 0)
+        y2, x2 = min(rows[-1] + 2, mask.shape[0]), min(cols[-1] + 2, mask.shape[1])
+        return cv2.findContours(np.ascontiguousarray(mask[y1:y2, x1:x2]), mode, method, offset=(int(x1), int(y1)))
+
+    if workers <= 1 or len(masks) < 2:
+        return [trace(x) for x in masks]
+    with ThreadPool(min(workers, len(masks))) as pool:
+        return pool.map(trace, masks)
+
+
+def masks2segments(masks, strategy='largest', epsilon=0.0, holes=False, workers=NUM_THREADS):
     """
     It takes a list of masks(n,h,w) and returns a list of segments(n,xy)
 
     Args:
       masks (torch.Tensor): the output of the model, which is a tensor of shape (batch_size, 160, 160)
       strategy (str): 'concat' or 'largest'. Defaults to largest
+      epsilon (float): Douglas-Peucker simplification tolerance in pixels, 0 keeps every contour point
+      holes (bool): also return the holes; each segment is then a list of rings, an outer ring followed by its holes
+      workers (int): number of threads used for tracing, see find_contours
 
     Returns:
       segments (List): list of segment masks
     """
     segments = []
-    for x in masks.int().cpu().numpy().astype('uint8'):
-        c = cv2.findContours(x, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0]
+    mode = cv2.RETR_CCOMP if holes else cv2.RETR_EXTERNAL
+    for c, hierarchy in find_contours(masks, mode, workers=workers):
+        if epsilon > 0:
+            c = [cv2.approxPolyDP(x, epsilon, True) for x in c]
+        if holes:
+            segments.append(rings_from_contours(c, hierarchy, strategy))
+            continue
         if c:
             if strategy == 'concat':  # concatenate all segments
                 c = np.concatenate([x.reshape(-1, 2) for x in c])
@@ -693,6 +816,21 @@ def masks2segments(masks, strategy='largest'):
     return segments
 
 
+def rings_from_contours(contours, hierarchy, strategy='largest'):
+    """Group RETR_CCOMP contours into [outer, hole, ...] rings, for the largest outer contour or for all of them."""
+    if not contours:
+        return [np.zeros((0, 2), dtype='float32')]
+    hierarchy = hierarchy.reshape(-1, 4)
+    outer = [i for i in range(len(contours)) if hierarchy[i, 3] < 0]
+    if strategy == 'largest':
+        outer = [max(outer, key=lambda i: len(contours[i]))]
+    rings = []
+    for i in outer:
+        rings.append(contours[i])
+        rings.extend(contours[j] for j in range(len(contours)) if hierarchy[j, 3] == i)
+    return [np.asarray(r).reshape(-1, 2).astype('float32') for r in rings]
+
+
 def clean_str(s):
     """
     Cleans a string by replacing special characters with underscore _
@@ -19,20 +19,8 @@ def convert_box_xywh_to_xyxy(box):
 
 
 def segment_image(image, bbox):
-    image_array = np.array(image)
-    segmented_image_array = np.zeros_like(image_array)
-    x1, y1, x2, y2 = bbox
-    segmented_image_array[y1:y2, x1:x2] = image_array[y1:y2, x1:x2]
-    segmented_image = Image.fromarray(segmented_image_array)
-    black_image = Image.new("RGB", image.size, (255, 255, 255))
-    # transparency_mask = np.zeros_like((), dtype=np.uint8)
-    transparency_mask = np.zeros(
-        (image_array.shape[0], image_array.shape[1]), dtype=np.uint8
-    )
-    transparency_mask[y1:y2, x1:x2] = 255
-    transparency_mask_image = Image.fromarray(transparency_mask, mode="L")
-    black_image.paste(segmented_image, mask=transparency_mask_image)
-    return black_image
+    # only the bbox region is needed, CLIP's preprocess resizes the crop anyway
+    return image.crop(tuple(bbox))
 
 
 def format_results(result, filter=0):
@@ -54,20 +42,15 @@ def format_results(result, filter=0):
 
 
 def filter_masks(annotations):  # filter the overlap mask
+    from fastsam.masks import contained_masks
     annotations.sort(key=lambda x: x["area"], reverse=True)
-    to_remove = set()
-    for i in range(0, len(annotations)):
-        a = annotations[i]
-        for j in range(i + 1, len(annotations)):
-            b = annotations[j]
-            if i != j and j not in to_remove:
-                # check if
-                if b["area"] < a["area"]:
-                    if (a["segmentation"] & b["segmentation"]).sum() / b[
-                        "segmentation"
-                    ].sum() > 0.8:
-                        to_remove.add(j)
-
+    if not annotations:
+        return annotations, set()
+    # bbox-pruned pairwise containment test on bit-packed masks, same criterion as the pairwise loop
+    flagged = contained_masks(
+        [a["segmentation"] for a in annotations], [a["area"] for a in annotations]
+    )
+    to_remove = set(np.nonzero(flagged)[0].tolist())
     return [a for i, a in enumerate(annotations) if i not in to_remove], to_remove
 
 
@@ -111,15 +94,9 @@ def fast_process(
     plt.gca().yaxis.set_major_locator(plt.NullLocator())
     plt.imshow(image)
     if args.better_quality == True:
-        if isinstance(annotations[0], torch.Tensor):
-            annotations = np.array(annotations.cpu())
-        for i, mask in enumerate(annotations):
-            mask = cv2.morphologyEx(
-                mask.astype(np.uint8), cv2.MORPH_CLOSE, np.ones((3, 3), np.uint8)
-            )
-            annotations[i] = cv2.morphologyEx(
-                mask.astype(np.uint8), cv2.MORPH_OPEN, np.ones((8, 8), np.uint8)
-            )
+        from fastsam.render import smooth_masks
+        # whole stack at once: max-pools on the GPU, bbox-restricted OpenCV otherwise
+        annotations = smooth_masks(annotations)
     if args.device == "cpu":
         annotations = np.array(annotations)
         fast_show_mask(
@@ -363,7 +340,8 @@ def crop_image(annotations, image_like):
     return cropped_boxes, cropped_images, not_crop, origin_id, annotations
 
 
-def box_prompt(masks, bbox, target_height, target_width):
+def box_prompt(masks, bbox, target_height, target_width, index=None):
+    # index: optional fastsam.masks.BoxIndex of `masks`, built once and reused across calls for O(n) box IoUs
     h = masks.shape[1]
     w = masks.shape[2]
     if h != target_height or w != target_width:
@@ -378,14 +356,16 @@ def box_prompt(masks, bbox, target_height, target_width):
     bbox[2] = round(bbox[2]) if round(bbox[2]) < w else w
     bbox[3] = round(bbox[3]) if round(bbox[3]) < h else h
 
-    # IoUs = torch.zeros(len(masks), dtype=torch.float32)
-    bbox_area = (bbox[3] - bbox[1]) * (bbox[2] - bbox[0])
+    if index is not None:
+        IoUs = torch.from_numpy(index.iou([bbox])[0])
+    else:
+        bbox_area = (bbox[3] - bbox[1]) * (bbox[2] - bbox[0])
 
-    masks_area = torch.sum(masks[:, bbox[1] : bbox[3], bbox[0] : bbox[2]], dim=(1, 2))
-    orig_masks_area = torch.sum(masks, dim=(1, 2))
+        masks_area = torch.sum(masks[:, bbox[1] : bbox[3], bbox[0] : bbox[2]], dim=(1, 2))
+        orig_masks_area = torch.sum(masks, dim=(1, 2))
 
-    union = bbox_area + orig_masks_area - masks_area
-    IoUs = masks_area / union
+        union = bbox_area + orig_masks_area - masks_area
+        IoUs = masks_area / union
     max_iou_index = torch.argmax(IoUs)
 
     return masks[max_iou_index].cpu().numpy(), max_iou_index
@@ -420,8 +400,8 @@ def text_prompt(annotations, text, img_path, device, wider=False, threshold=0.9)
         annotations, img_path
     )
 
-    import clip
-    clip_model, preprocess = clip.load("ViT-B/32", device=device)
+    from fastsam.utils import load_clip
+    clip_model, preprocess = load_clip("ViT-B/32", device=device)
     scores = retriev(
         clip_model, preprocess, cropped_boxes, text, device=device
     )